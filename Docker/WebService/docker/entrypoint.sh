@@ -1,6 +1,6 @@
 #!/bin/sh
 
-cd /site/startup ; php start.php 2>&1 | /usr/bin/rotatelogs -l /var/log/saroj_runner-%Y-%m-%d.log 86400 &
+cd /modules ; /venv/bin/python -m lib.saroj.scheduler --config /data/config.json --workers 2 --case-affinity 2>&1 | /usr/bin/rotatelogs -l /var/log/saroj_runner-%Y-%m-%d.log 86400 &
 
 cd /
 
@@ -14,6 +14,7 @@ from transformers import BatchEncoding, AutoModel
 from sklearn.metrics import classification_report
 sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 from lib.saroj.conllu_utils import CoNLLUFileAnnotator
+from lib.saroj.conllu_document import CoNLLUDocument
 from config import conf_window_length
 
 
@@ -402,13 +403,81 @@ class BERTEntityTagger(object):
     def tag_text(self, text: str) -> list[tuple[int, int, str]]:
         """Main method of this class: takes the input `text` and returns
         a list of (start_offset, end_offset, label) tuples."""
-        
-        tokens_offsets = self._tokenize_with_offsets(text)
+
+        return self.tag_texts(texts=[text], batch_size=1)[0]
+
+    def tag_texts(self, texts: list[str], batch_size: int = 32) -> list[list[tuple[int, int, str]]]:
+        """Same as `tag_text()` for many texts, e.g. the sentences of several documents.
+        The token windows of all texts go through BERT `batch_size` at a time."""
+
+        all_tokens_offsets = [self._tokenize_with_offsets(text) for text in texts]
+        all_windows = [self._token_windows(len(tokens_offsets)) for tokens_offsets in all_tokens_offsets]
+        sequences = []
+
+        for tokens_offsets, windows in zip(all_tokens_offsets, all_windows):
+            for from_index, to_index in windows:
+                sequences.append([wid for wid, _, _ in tokens_offsets[from_index:to_index]])
+            # end for
+        # end for
+
+        sequence_labels = []
+
+        for i in range(0, len(sequences), batch_size):
+            sequence_labels.extend(self._tag_token_sequences(sequences[i:i + batch_size]))
+        # end for
+
+        results = []
+        next_sequence = 0
+
+        for tokens_offsets, windows in zip(all_tokens_offsets, all_windows):
+            window_labels = sequence_labels[next_sequence:next_sequence + len(windows)]
+            next_sequence += len(windows)
+            results.append(self._window_annotations(tokens_offsets, windows, window_labels))
+        # end for
+
+        return results
+
+    def _token_windows(self, token_count: int) -> list[tuple[int, int]]:
+        """The [from, to) token ranges that BERT sees for a text of `token_count` tokens:
+        the whole text if it fits, else windows moving by `conf_window_length` tokens."""
+
+        if token_count <= self._model_max_length:
+            return [(0, token_count)]
+        # end if
+
+        windows = []
+        from_index = 0
+        to_index = from_index + self._model_max_length
+        no_more_tokens = False
+
+        while True:
+            windows.append((from_index, to_index))
+
+            if no_more_tokens:
+                break
+            # end if
+
+            from_index += conf_window_length
+            to_index = from_index + self._model_max_length
+
+            if to_index > token_count:
+                to_index = token_count
+                no_more_tokens = True
+            # end if
+        # end while
+
+        return windows
+
+    def _window_annotations(self, tokens_offsets: list[tuple[int, int, int]],
+                            windows: list[tuple[int, int]],
+                            window_labels: list[list[tuple[str, float]]]) -> list[tuple[int, int, str]]:
+        """Builds the annotations of a text from the labels predicted for each of its windows.
+        Tokens seen in several windows get the label with the best average probability."""
+
         annotations = []
 
         if len(tokens_offsets) <= self._model_max_length:
-            int_tokens = [wid for wid, _, _ in tokens_offsets]
-            predicted_labels = self._tag_token_sequence(int_tokens)
+            predicted_labels = window_labels[0]
 
             for i in range(len(tokens_offsets)):
                 start_offset = tokens_offsets[i][1]
@@ -418,15 +487,7 @@ class BERTEntityTagger(object):
                 annotations.append((start_offset, end_offset, label))
             # end for
         else:
-            from_index = 0
-            to_index = from_index + self._model_max_length
-            no_more_tokens = False
-
-            while True:
-                w_tokens_offsets = tokens_offsets[from_index:to_index]
-                w_int_tokens = [wid for wid, _, _ in w_tokens_offsets]
-                w_predicted_labels = self._tag_token_sequence(w_int_tokens)
-
+            for (from_index, to_index), w_predicted_labels in zip(windows, window_labels):
                 for i in range(from_index, to_index):
                     start_offset = tokens_offsets[i][1]
                     end_offset = tokens_offsets[i][2]
@@ -446,19 +507,7 @@ class BERTEntityTagger(object):
                             (start_offset, end_offset, {label: [label_prob]}))
                     # end if
                 # end for
-                
-                if no_more_tokens:
-                    break
-                # end if
-                        
-                from_index += conf_window_length
-                to_index = from_index + self._model_max_length
-
-                if to_index > len(tokens_offsets):
-                    to_index = len(tokens_offsets)
-                    no_more_tokens = True
-                # end if
-            # end while
+            # end for
 
             annotations = [(so, eo, self._select_label(lbs))
                         for so, eo, lbs in annotations]
@@ -558,20 +607,36 @@ class BERTEntityTagger(object):
 
         return best_label
 
-    def _tag_token_sequence(self, int_tokens: list[int]) -> list[str]:
+    def _tag_token_sequences(self, sequences: list[list[int]]) -> list[list[tuple[str, float]]]:
+        """Runs BERT and the NER layer on a batch of token sequences, in one call, and returns
+        the best (label, probability) for every position of each sequence, padding included."""
+
+        token_ids = []
+        token_msk = []
+
+        for int_tokens in sequences:
+            token_ids.append(list(int_tokens) + [self._tokenizer.pad_token_id] *
+                             (self._model_max_length - len(int_tokens)))
+            token_msk.append([1] * len(int_tokens) + [0] * (self._model_max_length - len(int_tokens)))
+        # end for
+
+        inputs = BatchEncoding(data={
+            'input_ids': token_ids,
+            'token_type_ids': [[0] * self._model_max_length for _ in sequences],
+            'attention_mask': token_msk
+        }, tensor_type='pt').to(device)
+
         with torch.no_grad():
-            inputs_bert = self._run_bert(token_ids=int_tokens)
-            outputs = self._nermodel(x=inputs_bert)
+            outputs = self._nermodel(x=self._bertmodel(**inputs).last_hidden_state)
         # end with
 
-        predicted_labels = torch.argmax(outputs, dim=2).flatten().tolist()
+        # Shape of (batch, self._model_max_length)
+        predicted_labels = torch.argmax(outputs, dim=2)
         predicted_probs = torch.exp(
-            outputs[0, range(self._model_max_length), predicted_labels]).flatten().tolist()
-        predicted_labels = [
-            (self._ner_labels[x], predicted_probs[i])
-            for i, x in enumerate(predicted_labels)]
+            torch.gather(outputs, 2, predicted_labels.unsqueeze(2)).squeeze(2))
 
-        return predicted_labels
+        return [[(self._ner_labels[x], p) for x, p in zip(labels, probs)]
+                for labels, probs in zip(predicted_labels.tolist(), predicted_probs.tolist())]
 
     def eval(self, annotated_examples: ExampleDict) -> float:
         tokenized_examples = self.tokenize_examples(examples=annotated_examples)
@@ -803,8 +868,9 @@ class BERTEntityTagger(object):
 
 
 class NeuralAnnotator(CoNLLUFileAnnotator):
-    def __init__(self, input_file: str, tagger: BERTEntityTagger):
-        super().__init__(input_file)
+    def __init__(self, input_file: str, tagger: BERTEntityTagger, document: CoNLLUDocument | None = None,
+                 streaming: bool = False):
+        super().__init__(input_file, document, streaming)
         self._bert_tagger = tagger
 
     def provide_annotations(self, sentence: str) -> list[tuple[int, int, str]]:
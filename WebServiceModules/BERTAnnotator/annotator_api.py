@@ -1,13 +1,18 @@
 import os
 import sys
 import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from lib.saroj.gunicorn import StandaloneApplication, limit_threads_from_argv
+# Before PyTorch and numpy are loaded, see limit_threads_from_argv()
+limit_threads_from_argv()
 from flask import Flask, jsonify
 from annotator import NeuralAnnotator, BERTEntityTagger
 from bert import ReaderbenchSmall
-sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
-from lib.saroj.gunicorn import StandaloneApplication
-from lib.saroj.input_data import get_input_data
-from lib.saroj.conllu_utils import is_file_conllu
+from lib.saroj.input_data import get_input_data, get_conllu_document, process_batch, is_inline, write_conllu_output
+from lib.saroj.stage_cache import open_stage_cache
+from lib.saroj.memory import install_memory_debug, model_size
+from lib.saroj.metrics import install_metrics, timer
+from lib.saroj.profiling import install_profiling
 
 app = Flask(__name__)
 tagger = None
@@ -35,20 +40,174 @@ def annotate_conllu():
 
     input_file = data['input']
     output_file = data['output']
+    # Documents sent in the request are not cached and not streamed
+    inline = is_inline(input_file) or is_inline(output_file)
+    error = check_input_file(input_file)
+
+    if error is not None:
+        return error
+    # end if
+
+    cache_key = None
+
+    if cache is not None and not inline:
+        cache_key = cache.key([input_file])
+
+        if cache.get(cache_key, output_file):
+            return jsonify({'status': 'OK', 'message': output_file})
+        # end if
+    # end if
+
+    if args.STREAMING and not inline:
+        # The input is checked while it is annotated, one sentence at a time
+        document = None
+    else:
+        # Checks and parses the input, in one read
+        status, document, error = get_conllu_document(input_file)
+
+        if not status:
+            return error
+        # end if
+    # end if
+
+    try:
+        if inline:
+            with timer('annotate'):
+                document = NeuralAnnotator('', get_tagger(), document=document).annotate_document()
+            # end with
+
+            output = write_conllu_output(document, output_file)
+
+            return jsonify({'status': 'OK', 'message': '', **output})
+        # end if
+
+        ann = NeuralAnnotator(input_file, get_tagger(), document=document, streaming=args.STREAMING)
+
+        # Writes the output as well
+        with timer('annotate'):
+            ann.annotate(output_file)
+        # end with
+
+        if cache_key is not None:
+            cache.put(cache_key, output_file)
+        # end if
+
+        return jsonify({'status': 'OK', 'message': output_file})
+    except Exception as e:
+        traceback.print_exc(file=sys.stdout)
+        return jsonify({'status': 'ERROR', 'message': str(e)})
+    # end try
+
+
+@app.route('/process_batch', methods=['POST', 'GET'])
+def annotate_conllu_batch():
+    """
+    Route to annotate many files in one call. The sentences of all files
+    go through the BERT model together, in batches of `--BATCH_SIZE` windows.
+
+    Expects a JSON list of jobs, e.g. `[{'input': 'documents/test-1.out', 'output': 'documents/test-1.ner'}, ...]`.
+
+    Returns:
+        JSON: The status of the batch and of each job (e.g., `{'status': 'OK', 'message': '', 'jobs': [...]}`).
+    """
+
+    return process_batch(['input', 'output'], process_jobs=annotate_jobs)
+
+
+def annotate_jobs(jobs: list[dict]) -> list:
+    """Annotates the input files of all `jobs` with one pass of the
+    BERT model over all their sentences and returns the result of each job."""
+
+    results = [None] * len(jobs)
+    # (job index, annotator, cache key) of the jobs to run
+    annotators = []
+
+    for i, data in enumerate(jobs):
+        input_file = data['input']
+        results[i] = check_input_file(input_file)
+
+        if results[i] is not None:
+            continue
+        # end if
+
+        cache_key = None
+
+        if cache is not None and not is_inline(input_file) and not is_inline(data['output']):
+            cache_key = cache.key([input_file])
+
+            if cache.get(cache_key, data['output']):
+                results[i] = {'status': 'OK', 'message': data['output']}
+                continue
+            # end if
+        # end if
+
+        status, document, results[i] = get_conllu_document(input_file)
+
+        if status:
+            annotators.append((i, NeuralAnnotator(input_file, get_tagger(), document=document), cache_key))
+        # end if
+    # end for
+
+    all_texts = [ann.sentence_texts() for _, ann, _ in annotators]
+
+    try:
+        with timer('annotate'):
+            all_annotations = get_tagger().tag_texts(texts=[text for texts in all_texts for text in texts],
+                                                     batch_size=args.BATCH_SIZE)
+        # end with
+    except Exception as e:
+        # The jobs that could not be read keep their own error
+        traceback.print_exc(file=sys.stdout)
+
+        for i, _, _ in annotators:
+            results[i] = {'status': 'ERROR', 'message': str(e)}
+        # end for
+
+        return results
+    # end try
+
+    next_sentence = 0
+
+    for (i, ann, cache_key), texts in zip(annotators, all_texts):
+        output_file = jobs[i]['output']
+
+        try:
+            output = write_conllu_output(
+                ann.annotate_document_with(all_annotations[next_sentence:next_sentence + len(texts)]), output_file)
+
+            if cache_key is not None:
+                cache.put(cache_key, output_file)
+            # end if
+
+            results[i] = {'status': 'OK', 'message': '' if output else output_file, **output}
+        except Exception as e:
+            traceback.print_exc(file=sys.stdout)
+            results[i] = {'status': 'ERROR', 'message': str(e)}
+        # end try
+
+        next_sentence += len(texts)
+    # end for
+
+    return results
+
+
+def check_input_file(input_file: str | dict):
+    """Returns the error response if `input_file` cannot be annotated, else None."""
 
     if not input_file:
         return jsonify({'status': 'ERROR', 'message': 'No file selected.'})
-    elif not os.path.isfile(input_file):
+    elif not is_inline(input_file) and not os.path.isfile(input_file):
         return jsonify({'status': 'ERROR',
                         'message': 'Input file does not exist on the local storage.'})
-    elif not is_file_conllu(input_file):
-        return jsonify({'status': 'ERROR',
-                        'message': 'Input file is not a (valid) CoNLL-U file.'})
     # end if
 
+    return None
+
+
+def get_tagger() -> BERTEntityTagger:
     # Model has to be loaded in worker, otherwise PyTorch freezes.
-    # There is no way to load this in a more principled way, but
-    # it's pretty fast and persisted after the load.
+    # `StandaloneApplication` calls this right after the fork, with the
+    # PyTorch threads of the worker limited, so requests find it loaded.
     global tagger
 
     if tagger is None:
@@ -56,14 +215,7 @@ def annotate_conllu():
         tagger.load(model_folder=args.MODEL)
     # end if
 
-    try:
-        ann = NeuralAnnotator(input_file, tagger)
-        ann.annotate(output_file)
-        return jsonify({'status': 'OK', 'message': output_file})
-    except Exception as e:
-        traceback.print_exc(file=sys.stdout)
-        return jsonify({'status': 'ERROR', 'message': str(e)})
-    # end try
+    return tagger
 
 
 @app.route('/checkHealth', methods=['GET', 'POST'])
@@ -82,11 +234,21 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('PORT', type=int, help='port to listen for requests')
     parser.add_argument('MODEL', type=str, help='folder to read the model from')
+    parser.add_argument('--STREAMING', action='store_true',
+                        help='annotate one sentence at a time, memory does not grow with the document size')
+    parser.add_argument('--BATCH_SIZE', type=int, default=32,
+                        help='token windows that go through BERT at once, with /process_batch')
+    parser.add_argument('--CACHE_DIR', type=str, default=None,
+                        help='folder to cache the annotated files in, by the hash of the input file')
+    parser.add_argument('--CACHE_SIZE', type=int, default=1024, help='maximum size of the cache, in MB')
+    parser.add_argument('--WORKERS', type=int, default=1,
+                        help='worker processes, each one loads the model and handles a document at a time')
+    parser.add_argument('--THREADS', type=int, help='threads of PyTorch and of the BLAS libraries in each worker, default: cores / workers')
     args = parser.parse_args()
 
     options = {
         'bind': f'127.0.0.1:{args.PORT}',
-        'workers': 1
+        'workers': args.WORKERS
     }
 
     if not os.path.isdir(args.MODEL):
@@ -94,6 +256,15 @@ if __name__ == '__main__':
         exit(1)
     # end if
 
-    StandaloneApplication(app, options).run()
+    cache = open_stage_cache(args.CACHE_DIR, 'BERTAnnotator', os.path.dirname(os.path.realpath(__file__)),
+                             [args.MODEL], args.CACHE_SIZE)
+
+    install_metrics(app, 'BERTAnnotator')
+    install_profiling(app)
+    # The model of the worker that answers, None before it is loaded
+    install_memory_debug(app, 'BERTAnnotator',
+                         {'model': lambda: tagger and model_size(tagger._bertmodel, tagger._nermodel)})
+    # The model is loaded in each worker, once forked
+    StandaloneApplication(app, options, worker_init=get_tagger, worker_threads=args.THREADS).run()
     # This is for Windows debug testing only.
     #app.run(host='127.0.0.1', port=args.PORT)
@@ -35,3 +35,14 @@ def test_location():
     assert result[14][2] == 'B-LOC' and result[31][2] == 'I-LOC'
     assert input_text[result[14][0]:result[31][1]] == \
         'sat Belciug, strada Brusturelui nr. 13, com. Ghiminați, jud. Bihor'
+
+
+def test_batch_same_as_one_text():
+    # The long text is seen through several windows, which are batched with the windows of the other texts
+    long_text = ' '.join(['Ion Popescu din București a semnat contractul cu SC Alfa Construct SRL.'] * 40)
+    texts = ['Florin Georgescu este reprezentantul legal al firmei.', long_text, '',
+             'Admite plângerea formulată de petenta PluriBand SRL, cu sediul în jud. Bihor.', long_text[:600]]
+    assert len(ann._token_windows(len(ann._tokenize_with_offsets(long_text)))) > 1
+
+    for batch_size in [1, 3, 32]:
+        assert ann.tag_texts(texts=texts, batch_size=batch_size) == [ann.tag_text(text=text) for text in texts]
@@ -1,25 +1,205 @@
-class TrieNode:
+from array import array
+from bisect import bisect_left
+
+NO_VALUE = -1
+
+
+class Trie:
+    """
+    A trie of token sequences stored in arrays instead of one object and one dict per node.
+
+    Tokens and values are interned: a node is an integer id, its value is an index in `values`.
+    The children of the compacted nodes are in `child_tokens` and `child_nodes`, between
+    `first_child[node]` and `first_child[node + 1]`, sorted by token id and found by bisection.
+    Nodes and edges added since the last `compact_trie()` are in the `edges` dict,
+    keyed by `parent << 32 | token_id`, so that entries can be added at any time.
+    The arrays can also be read-only memoryviews of a dictionary snapshot, see `dictionary_snapshot.py`.
+    """
+    __slots__ = ("token_ids", "tokens", "values", "value_ids", "node_values",
+                 "first_child", "child_tokens", "child_nodes", "edges")
+
     def __init__(self):
-        self.children = {}
-        self.is_end = False
-        self.value = None
+        self.token_ids = {}
+        self.tokens = []
+        self.values = []
+        self.value_ids = {}
+        # The value index of each node, NO_VALUE if no entry ends there; node 0 is the root
+        self.node_values = array("i", [NO_VALUE])
+        self.first_child = array("I", [0])
+        self.child_tokens = array("I")
+        self.child_nodes = array("I")
+        self.edges = {}
+
+
+def custom_sort(item):
+    # Define a function to determine the sorting key for each item
+    if item.isalpha():
+        return 0, item  # Alpha characters come first
+    else:
+        return 1, item  # Non-alpha characters come next
+
+
+def _child(root, node, token_id):
+    if node + 1 < len(root.first_child):
+        start = root.first_child[node]
+        end = root.first_child[node + 1]
+        i = bisect_left(root.child_tokens, token_id, start, end)
+        if i < end and root.child_tokens[i] == token_id:
+            return root.child_nodes[i]
+    return root.edges.get((node << 32) | token_id)
+
+
+def _writable(root):
+    # A trie read from a snapshot is copied to arrays the first time it is changed
+    if not isinstance(root.node_values, array):
+        root.node_values = array("i", root.node_values)
 
 
 def add_to_trie(root, words, value):
-    node = root
+    _writable(root)
+    node = 0
+    compacted = len(root.first_child) - 1
     for word in words:
-        if word not in node.children:
-            node.children[word] = TrieNode()
-        node = node.children[word]
-    node.is_end = True
-    node.value = value
+        token_id = root.token_ids.get(word)
+        if token_id is None:
+            token_id = root.token_ids[word] = len(root.tokens)
+            root.tokens.append(word)
+        child = _child(root, node, token_id) if node < compacted else root.edges.get((node << 32) | token_id)
+        if child is None:
+            child = len(root.node_values)
+            root.node_values.append(NO_VALUE)
+            root.edges[(node << 32) | token_id] = child
+        node = child
+    value_id = root.value_ids.get(value)
+    if value_id is None:
+        value_id = root.value_ids[value] = len(root.values)
+        root.values.append(value)
+    root.node_values[node] = value_id
 
 
 def find_in_trie(root, words):
-    node = root
+    node = 0
+    first_child = root.first_child
+    child_tokens = root.child_tokens
+    compacted = len(first_child) - 1
     for word in words:
-        if word not in node.children:
+        token_id = root.token_ids.get(word)
+        if token_id is None:
             return False, None
-        node = node.children[word]
-    return node.is_end, node.value
+        # Same as _child(), inlined for the lookups of the matcher
+        if node < compacted:
+            end = first_child[node + 1]
+            i = bisect_left(child_tokens, token_id, first_child[node], end)
+            if i < end and child_tokens[i] == token_id:
+                node = root.child_nodes[i]
+                continue
+        node = root.edges.get((node << 32) | token_id)
+        if node is None:
+            return False, None
+    value_id = root.node_values[node]
+    if value_id == NO_VALUE:
+        return False, None
+    return True, root.values[value_id]
+
+
+def remove_from_trie(root, words):
+    """
+    Remove the entry of `words`, keeping its nodes. Returns True if there was one.
+    """
+    node = 0
+    for word in words:
+        token_id = root.token_ids.get(word)
+        node = None if token_id is None else _child(root, node, token_id)
+        if node is None:
+            return False
+    found = root.node_values[node] != NO_VALUE
+    _writable(root)
+    root.node_values[node] = NO_VALUE
+    return found
+
+
+def compact_trie(root):
+    """
+    Move the edges added since the last call from the `edges` dict to the sorted child arrays.
+    """
+    if not root.edges:
+        return
+    node_count = len(root.node_values)
+    old_count = len(root.first_child) - 1
+    counts = array("I", bytes(4 * (node_count + 1)))
+    for node in range(old_count):
+        counts[node + 1] = root.first_child[node + 1] - root.first_child[node]
+    for key in root.edges:
+        counts[(key >> 32) + 1] += 1
+    for node in range(node_count):
+        counts[node + 1] += counts[node]
+    first_child = array("I", counts)
+    child_tokens = array("I", bytes(4 * counts[node_count]))
+    child_nodes = array("I", bytes(4 * counts[node_count]))
+    # Next free slot of each node, after its compacted children
+    free = array("I", counts)
+    for node in range(old_count):
+        start = root.first_child[node]
+        end = root.first_child[node + 1]
+        child_tokens[free[node]:free[node] + end - start] = array("I", root.child_tokens[start:end])
+        child_nodes[free[node]:free[node] + end - start] = array("I", root.child_nodes[start:end])
+        free[node] += end - start
+    sort_nodes = set()
+    for key, child in root.edges.items():
+        node = key >> 32
+        child_tokens[free[node]] = key & 0xFFFFFFFF
+        child_nodes[free[node]] = child
+        free[node] += 1
+        if free[node] - first_child[node] > 1:
+            sort_nodes.add(node)
+    for node in sort_nodes:
+        start = first_child[node]
+        end = first_child[node + 1]
+        pairs = sorted(zip(child_tokens[start:end], child_nodes[start:end]))
+        child_tokens[start:end] = array("I", (token for token, _ in pairs))
+        child_nodes[start:end] = array("I", (child for _, child in pairs))
+    root.first_child = first_child
+    root.child_tokens = child_tokens
+    root.child_nodes = child_nodes
+    root.edges = {}
+
+
+def copy_trie(root):
+    """
+    Return a copy of the trie that can be changed while the original one is read.
+    The sorted child arrays are shared: they are only replaced, by `compact_trie()`, never changed.
+    """
+    copy = Trie()
+    copy.token_ids = dict(root.token_ids)
+    copy.tokens = list(root.tokens)
+    copy.values = list(root.values)
+    copy.value_ids = dict(root.value_ids)
+    copy.node_values = array("i", root.node_values)
+    copy.first_child = root.first_child
+    copy.child_tokens = root.child_tokens
+    copy.child_nodes = root.child_nodes
+    copy.edges = dict(root.edges)
+    return copy
+
+
+def trie_entries(root):
+    """
+    Yield the words and the value of each entry.
+    """
+    added = {}
+    for key, child in root.edges.items():
+        added.setdefault(key >> 32, []).append((key & 0xFFFFFFFF, child))
+    stack = [(0, [])]
+    while stack:
+        node, words = stack.pop()
+        if root.node_values[node] != NO_VALUE:
+            yield words, root.values[root.node_values[node]]
+        if node + 1 < len(root.first_child):
+            for i in range(root.first_child[node], root.first_child[node + 1]):
+                stack.append((root.child_nodes[i], words + [root.tokens[root.child_tokens[i]]]))
+        for token_id, child in added.get(node, ()):
+            stack.append((child, words + [root.tokens[token_id]]))
+
 
+def count_trie_nodes(root):
+    return len(root.node_values)
@@ -3,12 +3,15 @@ from flask import Flask, jsonify
 
 from dictionary_process import *
 from dictionary_config import args
+from dictionary_store import DictionaryStore
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
-from lib.saroj.input_data import get_input_data
-from lib.saroj.conllu_utils import is_file_conllu
-from lib.saroj.dictionary_helper import read_replacement_dictionary, count_instances_in_dict
+from lib.saroj.input_data import get_input_data, get_conllu_document, process_batch, is_inline, write_conllu_output
 from lib.saroj.gunicorn import StandaloneApplication
+from lib.saroj.memory import install_memory_debug
+from lib.saroj.metrics import install_metrics, timer
+from lib.saroj.profiling import install_profiling
+from lib.saroj.stage_cache import open_stage_cache
 
 import sys, traceback
 
@@ -47,27 +50,114 @@ def anonymize_conllup():
     status, data, error = get_input_data(["input", "output"])
     if not status: return error
 
+    return anonymize_job(data)
+
+
+@app.route('/process_batch', methods=['POST', 'GET'])
+def anonymize_conllup_batch():
+    """
+    Route to process many files in one call.
+
+    Expects a JSON list of jobs, each one with the keys of /process.
+
+    Returns:
+        JSON: The status of the batch and of each job (e.g., {'status': 'OK', 'message': '', 'jobs': [...]}).
+    """
+    return process_batch(["input", "output"], anonymize_job)
+
+
+def anonymize_job(data):
+    """Adds the dictionary annotations to one file, `data` being the JSON object given to /process."""
     input_file = data["input"]
     output_file = data["output"]
 
     if input_file == '':
         return jsonify({"status": "ERROR", "message": "No file selected."})
-    if not is_file_conllu(input_file):
-        return jsonify({"status": "ERROR", "message": "Input file is not conllup"})
 
-    if input_file:
+    # Documents sent in the request are not cached and not streamed
+    inline = is_inline(input_file) or is_inline(output_file)
+
+    # The same snapshot for the whole document, a reload swaps in another one
+    snapshot = store.sync()
+    cache_key = None
+    if cache is not None and not inline and os.path.isfile(input_file):
+        cache.fingerprint = dictionary_fingerprint + store.version
+        cache_key = cache.key([input_file])
+        if cache.get(cache_key, output_file):
+            return jsonify({"status": "OK", "message": ""})
+
+    if args.STREAMING and not inline:
+        # The input is checked while it is annotated, one sentence at a time
         try:
-            # Read the replacement dictionary
-            assign_ner(input_file, output_file, trie_root, max_count)
+            with timer("annotate"):
+                assign_ner(input_file, output_file, snapshot.matcher, snapshot.max_count)
+            if cache_key is not None:
+                cache.put(cache_key, output_file)
 
             return jsonify({"status": "OK", "message": ""})
         except Exception as e:
             traceback.print_exc(file=sys.stdout)
             return jsonify({"status": "ERROR", "message": str(e)})
 
+    status, document, error = get_conllu_document(input_file)
+    if not status: return error
+
+    if input_file:
+        try:
+            with timer("annotate"):
+                document = assign_ner_to_document(document, snapshot.matcher, snapshot.max_count)
+            output = write_conllu_output(document, output_file)
+            if cache_key is not None:
+                cache.put(cache_key, output_file)
+
+            return jsonify({"status": "OK", "message": "", **output})
+        except Exception as e:
+            traceback.print_exc(file=sys.stdout)
+            return jsonify({"status": "ERROR", "message": str(e)})
+
     return jsonify({"status": "ERROR", "message": "Invalid file format or other error occurred."})
 
 
+@app.route('/admin/dictionary', methods=['POST', 'GET'])
+def dictionary_admin():
+    """
+    Route to change the dictionary while the service runs, in all the workers.
+
+    Expects a JSON object with an "action" key:
+    - "add": "entries", a list of [entity_type, entity_name] pairs, added to the trie in place.
+    - "remove": "entries", a list of entity names.
+    - "reload": "file", the dictionary file to use instead, by default the current one again. Its snapshot is
+      built in the background; the documents are annotated with the current dictionary until it is ready.
+    - "status": nothing changes.
+
+    Returns:
+        JSON: The status, a message and, in "dictionary", the state of the dictionary in the worker that answered.
+
+    The changes are kept in a journal next to the snapshot, see `dictionary_store.py`, and outlive a restart
+    with the same dictionary file.
+    """
+    status, data, error = get_input_data(["action"])
+    if not status: return error
+
+    action = data["action"]
+    message = ""
+    try:
+        if action == "add":
+            message = f"{store.add(data.get('entries', []))} entries added."
+        elif action == "remove":
+            message = f"{store.remove(data.get('entries', []))} entries removed."
+        elif action == "reload":
+            store.reload(data.get("file") or store.dictionary_path)
+            message = "The dictionary is reloading."
+        elif action != "status":
+            return jsonify({"status": "ERROR", "message": f"Unknown action '{action}'."})
+    except (ValueError, RuntimeError, OSError) as e:
+        return jsonify({"status": "ERROR", "message": str(e)})
+
+    store.sync()
+    return jsonify({"status": "OK", "message": message, "dictionary": store.status()})
+
+
 @app.route('/checkHealth', methods=['GET', 'POST'])
 def check_health():
     """
@@ -79,11 +169,10 @@ def check_health():
     The function checks the health/readiness of the module by performing the following steps:
 
     1. It verifies the existence of the specified dictionary file.
-    2. It reads the replacement dictionary from the file.
-    3. It checks if the replacement dictionary is empty.
+    2. It checks if the dictionary loaded at startup is empty.
 
     If all checks pass successfully, the function returns a JSON response with a 'status' of 'OK' and a message that may
-    include statistics about the replacement dictionary.
+    include statistics about the dictionary, computed when its snapshot was built.
     If any of the checks fail, an appropriate error message is included in the response.
     """
     if not args.DICTIONARY:
@@ -92,27 +181,33 @@ def check_health():
     if not os.path.exists(args.DICTIONARY):
         return jsonify({"status": "OK", "message": f"Dictionary file '{args.DICTIONARY}' does not exist."})
 
-    replacement_dict = read_replacement_dictionary(args.DICTIONARY)
+    snapshot = store.sync()
 
-    if not replacement_dict:
-        return jsonify({"status": "OK", "message": f"Dictionary file '{args.DICTIONARY}' is empty."})
+    if not snapshot.stats:
+        return jsonify({"status": "OK", "message": f"Dictionary file '{store.dictionary_path}' is empty."})
     else:
-        return jsonify({"status": "OK", "message": f"max_count = {max_count} containing "
-                                                   f"{count_instances_in_dict(replacement_dict)}"})
+        return jsonify({"status": "OK", "message": f"max_count = {snapshot.max_count} containing "
+                                                   f"{snapshot.stats_message()}"})
 
 
 if __name__ == '__main__':
 
     options = {
         'bind': '%s:%s' % ('127.0.0.1', args.PORT),
-        'workers': 1,
+        'workers': args.WORKERS,
     }
-    dictionary, max_count = load_dictionary_with_max_token_count(args.DICTIONARY)
-    trie_root = TrieNode()
-    for key, value in dictionary.items():
-        words = sorted(key.split(), key=custom_sort)
-        add_to_trie(trie_root, words, value)
-    del dictionary
-
+    # Memory-mapped, the workers share its pages
+    store = DictionaryStore(args.DICTIONARY, args.SNAPSHOT)
+    cache = open_stage_cache(args.CACHE_DIR, "Dictionary", os.path.dirname(os.path.realpath(__file__)),
+                             [args.DICTIONARY], args.CACHE_SIZE)
+    dictionary_fingerprint = cache.fingerprint if cache is not None else ""
+
+    install_metrics(app, "Dictionary", ("/admin/dictionary",))
+    install_profiling(app)
+    install_memory_debug(app, "Dictionary", {
+        "trie_nodes": lambda: count_trie_nodes(store.snapshot.matcher.trie_root),
+        "max_count": lambda: store.snapshot.max_count,
+        "snapshot_bytes": lambda: store.snapshot.size,
+    })
     #app.run(debug=True, port=args.PORT)
-    StandaloneApplication(app, options).run()
+    StandaloneApplication(app, options, worker_threads=args.THREADS).run()
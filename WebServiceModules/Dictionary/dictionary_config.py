@@ -5,6 +5,12 @@ def parse_command_line_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('PORT', type=int, help='Port to listen for requests')
     parser.add_argument('--DICTIONARY', '-d', type=str, required=True, help='path for dictionary, mandatory')
+    parser.add_argument('--SNAPSHOT', type=str, help='path of the compiled dictionary, rebuilt when the dictionary changes, default: DICTIONARY.snapshot')
+    parser.add_argument('--STREAMING', action='store_true', help='annotate the input files as they are read, memory does not grow with the document size')
+    parser.add_argument('--CACHE_DIR', type=str, help='folder to cache the output files in, by the hash of the input')
+    parser.add_argument('--CACHE_SIZE', type=int, default=1024, help='maximum size of the cache, in MB')
+    parser.add_argument('--WORKERS', type=int, default=1, help='worker processes, each one handles a document at a time')
+    parser.add_argument('--THREADS', type=int, help='threads of the numeric libraries in each worker, default: cores / workers')
 
     return parser.parse_args()
 
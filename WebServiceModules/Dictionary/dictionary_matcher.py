@@ -0,0 +1,163 @@
+import random
+from array import array
+from bisect import bisect_left
+from itertools import chain
+
+from Trie import *
+
+HASH_MASK = (1 << 64) - 1
+MAX_LENGTH = 0xFFFF
+
+
+class DictionaryMatcher:
+    """
+    Finds the longest dictionary entry at each position of a document in a single pass over the window.
+
+    Entries match as bags of lowercase tokens: the trie keys are the words of an entry sorted with
+    `custom_sort`, so "Popescu Ion" also matches the entry "ion popescu". Instead of sorting every
+    prefix of the window and looking it up in the trie, the matcher gives each dictionary word a
+    random 64-bit weight and keeps the sums of the weights of all the entries. The sum of a window
+    prefix grows by one addition per token and is looked up in that set; only the rare prefixes whose
+    sum is found are sorted and checked in the trie.
+
+    A prefix is extended while its words can still be part of an entry: the walk stops at the first
+    word that is in no entry, or once the prefix is longer than the longest entry containing all its
+    words. A very long entry therefore only costs time where its own words appear in the text.
+
+    The weights and lengths are arrays indexed by the token ids of the trie, and the sums a sorted
+    array, with the sums of the entries added since the last `compact()` in a set.
+
+    Attributes:
+        trie_root (Trie): The trie of the entries, which holds their values.
+    """
+
+    def __init__(self, trie_root=None):
+        self.trie_root = trie_root if trie_root is not None else Trie()
+        self._random = random.Random(0)
+        # By token id: the weight of the word and the length of the longest entry with the word
+        self._weights = array("Q")
+        self._lengths = array("H")
+        self._sums = array("Q")
+        self._added_sums = set()
+
+        for words, _ in trie_entries(self.trie_root):
+            self._index(words)
+        self.compact()
+
+    @classmethod
+    def from_index(cls, trie_root, weights, lengths, sums):
+        """
+        Make a matcher from the trie and the arrays of `index_arrays()`, e.g. read from a snapshot,
+        without indexing the entries again.
+        """
+        matcher = cls.__new__(cls)
+        matcher.trie_root = trie_root
+        matcher._random = random.Random(len(weights))
+        matcher._weights = weights
+        matcher._lengths = lengths
+        matcher._sums = sums
+        matcher._added_sums = set()
+        return matcher
+
+    def copy(self):
+        """
+        Return a copy of the matcher that can be changed, with `add()` or `remove()`, while this one is used.
+        """
+        matcher = DictionaryMatcher.from_index(copy_trie(self.trie_root), array("Q", self._weights),
+                                               array("H", self._lengths), self._sums)
+        matcher._random.setstate(self._random.getstate())
+        matcher._added_sums = set(self._added_sums)
+        return matcher
+
+    def index_arrays(self):
+        """
+        Return the weights, the lengths and the sums of the index, after a `compact()`.
+        """
+        return self._weights, self._lengths, self._sums
+
+    def _index(self, words):
+        token_ids = self.trie_root.token_ids
+        # The arrays of a snapshot are read-only, they are copied the first time an entry is added
+        if not isinstance(self._weights, array):
+            self._weights = array("Q", self._weights)
+            self._lengths = array("H", self._lengths)
+        while len(self._weights) < len(self.trie_root.tokens):
+            self._weights.append(self._random.getrandbits(64))
+            self._lengths.append(0)
+        total = 0
+        length = min(len(words), MAX_LENGTH)
+        for word in words:
+            token_id = token_ids[word]
+            if self._lengths[token_id] < length:
+                self._lengths[token_id] = length
+            total = (total + self._weights[token_id]) & HASH_MASK
+        self._added_sums.add(total)
+
+    def add(self, words, value):
+        """
+        Add an entry, given as its words sorted with `custom_sort`, to the trie and to the index.
+        """
+        add_to_trie(self.trie_root, words, value)
+        self._index(words)
+
+    def remove(self, words):
+        """
+        Remove an entry, given as its words sorted with `custom_sort`. Returns True if there was one.
+        Its sum stays in the index, where it only costs a lookup in the trie.
+        """
+        return remove_from_trie(self.trie_root, words)
+
+    def compact(self):
+        """
+        Move the entries added since the last call to the arrays of the trie and of the index.
+        """
+        compact_trie(self.trie_root)
+        if self._added_sums:
+            self._sums = array("Q", sorted(chain(self._sums, self._added_sums)))
+            self._added_sums = set()
+
+    def longest_match(self, tokens, start, end):
+        """
+        Find the longest dictionary entry at the start of tokens[start:end], skipping the "-" tokens.
+
+        Args:
+            tokens (list): The tokens of the document, with their suffixes replaced.
+            start (int): The position of the window in the tokens.
+            end (int): The end of the window, at most the end of the tokens.
+
+        Returns:
+            tuple: The number of tokens of the entry, not counting the skipped "-" tokens, and its value,
+                   or (0, None) if no prefix of the window is in the dictionary.
+        """
+        best = (0, None)
+        token_ids = self.trie_root.token_ids
+        weights = self._weights
+        lengths = self._lengths
+        sums = self._sums
+        total = 0
+        count = 0
+        bound = end - start
+        words = []
+
+        for i in range(start, min(end, len(tokens))):
+            token = tokens[i]
+            if token == "-":
+                continue
+            word = token.lower()
+            token_id = token_ids.get(word)
+            # Words added to the trie directly, not through `add()`, have no weight
+            if token_id is None or token_id >= len(weights):
+                break
+            words.append(word)
+            count += 1
+            bound = min(bound, lengths[token_id])
+            if count > bound:
+                break
+            total = (total + weights[token_id]) & HASH_MASK
+            j = bisect_left(sums, total)
+            if (j < len(sums) and sums[j] == total) or total in self._added_sums:
+                found, value = find_in_trie(self.trie_root, sorted(words, key=custom_sort))
+                if found:
+                    best = (count, value)
+
+        return best
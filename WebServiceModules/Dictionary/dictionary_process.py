@@ -1,15 +1,17 @@
 import os
 import sys
-import io
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
-from collections import deque
-
 from Trie import *
+from dictionary_matcher import DictionaryMatcher
 
 from lib.saroj.suffix_process import suffix_replace
+from lib.saroj.conllu_document import CoNLLUDocument, CoNLLUDocumentWriter
+from lib.saroj.conllu_utils import iter_conllu_sentences
 
 NOT_FOUND = '\tO\n'
+# Lines kept after they are written, then dropped at once, so that dropping them costs one copy per line
+WRITTEN_LINES = 4096
 
 
 def load_dictionary_with_max_token_count(dictionary_path):
@@ -52,73 +54,57 @@ def check_invalid_line(line):
     return True if line.startswith("#") or not line.strip() else False
 
 
-def custom_sort(item):
-    # Define a function to determine the sorting key for each item
-    if item.isalpha():
-        return 0, item  # Alpha characters come first
-    else:
-        return 1, item  # Non-alpha characters come next
-
-
-def test_subsequences(tokens, trie_root):
-    results = ()
-
-    cleaned_tokens = [token for token in tokens if token != "-"]
-    sorted_tokens = sorted((token.lower() for token in cleaned_tokens), key=custom_sort)
-    
-    for _ in range(len(cleaned_tokens), 0, -1):
-        found, ner = find_in_trie(trie_root, sorted_tokens)
-
-        if found:
-            results = (' '.join(cleaned_tokens), ner)
-            break
-        remove_token = cleaned_tokens.pop()
-        sorted_tokens.remove(remove_token.lower())
+def parse_text_document(input_file):
+    # (word form, line) pairs, read and checked one sentence at a time
+    with open(input_file, 'r', encoding='utf-8', errors="ignore") as file:
+        for document in iter_conllu_sentences(file):
+            yield from document.lines_with_forms()
 
-    return results
 
+def parse_document(document):
+    # (word form, line) pairs, the word form is empty for comments and empty lines
+    return list(document.lines_with_forms())
 
-def parse_text_document(input_file):
-    output = []
 
-    with open(input_file, 'r', encoding='utf-8', errors="ignore") as file:
-        for line in file:
-            # Assuming the lines are separated by tabs
-            line_data = line.strip().split('\t')
-            value_to_store = (line_data[1], line) if not check_invalid_line(line) else ("", line)
-            output.append(value_to_store)
+def write_entity(output_buffer, lines, ner):
+    for i, line in enumerate(lines):
+        output_buffer.write(line.strip() + '\t' + f"{'B' if i == 0 else 'I'}-{ner}" + '\n')
 
-    return output
 
+def handle_not_found(output_buffer, line, token):
+    if token != "":
+        output_buffer.write(line.strip() + NOT_FOUND)
+    else:
+        output_buffer.write(line)
 
-def process_and_write_entities(output_buffer, current_line, r,current_entities):
-    subsequence_words = r[0].split()
-    ner = [r[1]] * len(subsequence_words)  # Ensure ner is repeated for each word
-    current_entity_tags = [f"{'B' if i == 0 else 'I'}-{label}" for i, (word, label) in
-                           enumerate(zip(subsequence_words, ner))]
 
-    for tag in current_entity_tags:
-        output_buffer.write(current_line.popleft().strip() + '\t' + tag + '\n')
-        current_entities.popleft()
+def entry_words(entity_name):
+    """
+    Return the trie key of a dictionary entry: its lowercase words, sorted with `custom_sort`.
+    """
+    return sorted(entity_name.lower().split(), key=custom_sort)
 
 
-def process_and_write(output_buffer, current_line, current_entities, trie_root):
-    r = test_subsequences(current_entities, trie_root)
-    if r and r[0][0].isupper():
-        process_and_write_entities(output_buffer, current_line, r, current_entities)
-    else:
-        handle_not_found(output_buffer, current_line, current_entities)
-        current_entities.popleft()
+def load_dictionary_matcher(dictionary_path):
+    """
+    Load a dictionary file into a `DictionaryMatcher`.
 
+    Args:
+        dictionary_path (str): A string representing the file path to the dictionary file.
 
-def handle_not_found(output_buffer, current_line, current_entities):
-    if current_entities[0] != "":
-        output_buffer.write(current_line.popleft().strip() + NOT_FOUND)
-    else:
-        output_buffer.write(current_line.popleft())
+    Returns:
+        tuple: The matcher, whose trie holds the entries, and the maximum token count of the entries.
+    """
+    dictionary, max_count = load_dictionary_with_max_token_count(dictionary_path)
+    matcher = DictionaryMatcher()
+    for key, value in dictionary.items():
+        matcher.add(entry_words(key), value)
+    del dictionary
+    matcher.compact()
+    return matcher, max_count
 
 
-def assign_ner(input_file, output_file, trie_root, max_count):
+def assign_ner(input_file, output_file, matcher, max_count):
     """
     Process an input file, assigning Named Entity Recognition (NER) tags to entities based on a given dictionary.
 
@@ -126,7 +112,7 @@ def assign_ner(input_file, output_file, trie_root, max_count):
         input_file (str): The path to the input file containing lines to be processed.
             This file should have lines in the format "word<TAB>tag" where "word" is a token, and "tag" is the entity type.
         output_file (str): The path to the output file where tagged lines will be written.
-        trie_root (TrieNode): The root of the trie data structure for efficient substring matching.
+        matcher (DictionaryMatcher): The dictionary entries, see `load_dictionary_matcher`.
         max_count (int): The maximum number of tokens allowed in a single entity name.
             Entities with more tokens than this limit will be split or truncated.
 
@@ -137,7 +123,10 @@ def assign_ner(input_file, output_file, trie_root, max_count):
     Entities can be single-word entities or multi-word entities, and the function handles them accordingly.
     Any lines in the input file that are deemed invalid are written to the output file as they are, without NER tagging.
 
-    The function utilizes helper functions 'process_word_entities' and 'process_single_word_entity' to tag entities.
+    The input is read, checked and written one sentence at a time, see `annotate_lines`: memory does not grow with
+    the size of the document. A `CoNLLUError` is raised at the first format error of the input. The lines are
+    written to a temporary file that replaces output_file once the whole document is tagged, so that an error
+    leaves no partial output.
 
     Note:
         - The 'suffix_replace' function is used to transform tokens when needed.
@@ -160,25 +149,75 @@ def assign_ner(input_file, output_file, trie_root, max_count):
 
 
     """
-    output_buffer = io.StringIO()
-    lines = parse_text_document(input_file)
-    current_entities = deque(maxlen=max_count)
-    current_line = deque(maxlen=max_count)
-
-    for line in lines:
-        token, _ = suffix_replace(line[0])
-        current_entities.append(token)
-        current_line.append(line[1])
-
-        if len(current_entities) >= max_count:
-            process_and_write(output_buffer, current_line, current_entities, trie_root)
-    
-    if len(current_entities) >= max_count:
-        current_entities.popleft()
-    while current_entities:
-        process_and_write(output_buffer, current_line, current_entities, trie_root)
-
-    # Write the final output
-    output_buffer.seek(0)
-    with open(output_file, 'w', encoding='utf-8', errors="ignore") as outfile:
-        outfile.write(output_buffer.read())
+    temp_path = f"{output_file}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as output:
+            annotate_lines(parse_text_document(input_file), matcher, max_count, output)
+        os.replace(temp_path, output_file)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def assign_ner_to_document(document, matcher, max_count):
+    """
+    Assign NER tags from the dictionary to a CoNLL-U Plus document that is already in memory.
+
+    Args:
+        document (CoNLLUDocument): The document to be processed.
+        matcher (DictionaryMatcher): The dictionary entries, see `load_dictionary_matcher`.
+        max_count (int): The maximum number of tokens allowed in a single entity name.
+            An entry is found if it fits in the next max_count tokens, "-" tokens included.
+
+    Returns:
+        CoNLLUDocument: The document with the dictionary NER column added, as written by `assign_ner`.
+    """
+    output_buffer = CoNLLUDocumentWriter()
+    annotate_lines(document.lines_with_forms(), matcher, max_count, output_buffer)
+    return output_buffer.close()
+
+
+def annotate_lines(lines, matcher, max_count, output_buffer):
+    """
+    Assign NER tags from the dictionary to CoNLL-U Plus lines as they come, and write the tagged lines.
+
+    Only the window of the next max_count lines and at most WRITTEN_LINES written lines are kept in memory.
+
+    Args:
+        lines (iterable): (word form, line) pairs, the word form being empty for comments and empty lines,
+            as `CoNLLUDocument.lines_with_forms` generates them.
+        matcher (DictionaryMatcher): The dictionary entries, see `load_dictionary_matcher`.
+        max_count (int): The maximum number of tokens allowed in a single entity name.
+            An entry is found if it fits in the next max_count tokens, "-" tokens included.
+        output_buffer: The text stream the tagged lines are written to, a file or a `CoNLLUDocumentWriter`.
+    """
+    lines = iter(lines)
+    tokens = []
+    texts = []
+    position = 0
+
+    while True:
+        # The window at each position holds the next max_count tokens, "-" tokens included
+        while len(tokens) < position + max(max_count, 1):
+            pair = next(lines, None)
+            if pair is None:
+                break
+            tokens.append(suffix_replace(pair[0])[0])
+            texts.append(pair[1])
+        if position == len(tokens):
+            break
+
+        count, ner = matcher.longest_match(tokens, position, position + max_count)
+
+        # A dictionary entry is only tagged when it starts with a capital letter in the text
+        if count and next(tokens[i] for i in range(position, len(tokens)) if tokens[i] != "-")[0].isupper():
+            write_entity(output_buffer, texts[position:position + count], ner)
+            position += count
+        else:
+            handle_not_found(output_buffer, texts[position], tokens[position])
+            position += 1
+
+        if position >= WRITTEN_LINES:
+            del tokens[:position]
+            del texts[:position]
+            position = 0
@@ -0,0 +1,256 @@
+"""
+Precompiled dictionary snapshots.
+
+A snapshot is the trie and the matcher index of a dictionary file, with its max_count and the counts of its
+entries by type, written in one binary file that is memory-mapped instead of parsed: the service starts without
+reading the dictionary again, and the forked workers share the pages of the file.
+
+The file starts with MAGIC, the length of a JSON header and the header, which holds the format version, the
+SHA-256 of the dictionary file it was built from, the stats and the position of each array. The arrays follow,
+aligned to 8 bytes, in the byte order of the machine that built them. A snapshot of another version, byte order
+or dictionary file is built again.
+
+Usage: python dictionary_snapshot.py DICTIONARY [--output SNAPSHOT]
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from Trie import Trie
+from dictionary_matcher import DictionaryMatcher
+from dictionary_process import load_dictionary_matcher
+
+MAGIC = b"SAROJDIC"
+# Change it with the layout of the file, of the trie or of the matcher index
+SNAPSHOT_VERSION = 1
+HEADER = struct.Struct("<8sI")
+ALIGNMENT = 8
+# The arrays of a snapshot, with their type codes
+ARRAYS = (("node_values", "i"), ("first_child", "I"), ("child_tokens", "I"), ("child_nodes", "I"),
+          ("weights", "Q"), ("lengths", "H"), ("sums", "Q"))
+CHUNK_SIZE = 1 << 20
+
+
+class DictionarySnapshot:
+    """
+    A loaded dictionary, from a snapshot file or built from the dictionary file.
+
+    Attributes:
+        matcher (DictionaryMatcher): The dictionary entries.
+        max_count (int): The maximum token count of the entries.
+        stats (dict): The number of lines of the dictionary file by entity type.
+        source_hash (str): The SHA-256 of the dictionary file.
+        path (str): The snapshot file, None if the dictionary was not read from one.
+        size (int): The bytes of the snapshot file, 0 if there is none.
+    """
+
+    def __init__(self, matcher, max_count, stats, source_hash, path=None, size=0, buffer=None):
+        self.matcher = matcher
+        self.max_count = max_count
+        self.stats = stats
+        self.source_hash = source_hash
+        self.path = path
+        self.size = size
+        # The mmap the arrays are views of, kept open as long as the snapshot is used
+        self._buffer = buffer
+
+    def copy(self):
+        """
+        Return a copy of the dictionary whose entries and stats can be changed while this one is used.
+        The arrays of the snapshot file are shared until they are changed.
+        """
+        return DictionarySnapshot(self.matcher.copy(), self.max_count, dict(self.stats), self.source_hash,
+                                  self.path, self.size, self._buffer)
+
+    def stats_message(self):
+        """
+        Return the counts of the entries by type, e.g. "PER:1200, LOC:300", as /checkHealth reports them.
+        """
+        return ", ".join(f"{ner}:{count}" for ner, count in self.stats.items())
+
+
+def default_snapshot_path(dictionary_path):
+    return dictionary_path + ".snapshot"
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def count_dictionary_types(dictionary_path):
+    """
+    Count the lines of a dictionary file by entity type, the same lines `read_replacement_dictionary` reads.
+    """
+    stats = {}
+    with open(dictionary_path, 'r', encoding='utf-8', errors="ignore") as file:
+        for line in file:
+            parts = line.strip().split('\t')
+            if len(parts) == 2:
+                stats[parts[0]] = stats.get(parts[0], 0) + 1
+    return stats
+
+
+def build_snapshot(dictionary_path, source_hash=None):
+    """
+    Load a dictionary file, see `load_dictionary_matcher`, with the stats of a snapshot.
+
+    Returns:
+        DictionarySnapshot: The dictionary, in memory.
+    """
+    matcher, max_count = load_dictionary_matcher(dictionary_path)
+    return DictionarySnapshot(matcher, max_count, count_dictionary_types(dictionary_path),
+                              source_hash or file_hash(dictionary_path))
+
+
+def write_snapshot(snapshot, snapshot_path):
+    """
+    Write a dictionary to a snapshot file. The file is replaced at once, so a service that reads it while
+    it is written sees the old or the new snapshot, never a part of it.
+    """
+    matcher = snapshot.matcher
+    matcher.compact()
+    root = matcher.trie_root
+    weights, lengths, sums = matcher.index_arrays()
+    arrays = dict(node_values=root.node_values, first_child=root.first_child, child_tokens=root.child_tokens,
+                  child_nodes=root.child_nodes, weights=weights, lengths=lengths, sums=sums)
+    # Tokens never contain whitespace, they are the words of the entries
+    sections = [(name, array(typecode, arrays[name]).tobytes()) for name, typecode in ARRAYS]
+    sections.append(("tokens", "\n".join(root.tokens).encode("utf-8")))
+
+    header = {
+        "version": SNAPSHOT_VERSION,
+        "byteorder": sys.byteorder,
+        "itemsizes": {typecode: array(typecode).itemsize for _, typecode in ARRAYS},
+        "source_hash": snapshot.source_hash,
+        "max_count": snapshot.max_count,
+        "stats": snapshot.stats,
+        "values": root.values,
+        "token_count": len(root.tokens),
+        "sections": {},
+    }
+    # The offsets are relative to the end of the header, whose length depends on them
+    offset = 0
+    for name, data in sections:
+        header["sections"][name] = [offset, len(data)]
+        offset += -(-len(data) // ALIGNMENT) * ALIGNMENT
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    header_bytes += b" " * (-(HEADER.size + len(header_bytes)) % ALIGNMENT)
+
+    temp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, len(header_bytes)))
+            file.write(header_bytes)
+            for _, data in sections:
+                file.write(data)
+                file.write(b"\0" * (-len(data) % ALIGNMENT))
+        os.replace(temp_path, snapshot_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def read_snapshot(snapshot_path, source_hash=None):
+    """
+    Memory-map a snapshot file.
+
+    Args:
+        snapshot_path (str): The snapshot file.
+        source_hash (str): The SHA-256 the dictionary file must have, None to accept any.
+
+    Returns:
+        DictionarySnapshot: The dictionary, whose arrays are read-only views of the file, or None if the file
+            does not exist, is not a snapshot of this version and byte order or is out of date.
+    """
+    try:
+        with open(snapshot_path, "rb") as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # ValueError: an empty file cannot be mapped
+        return None
+
+    if len(buffer) < HEADER.size:
+        return None
+    magic, header_size = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        print(f"{snapshot_path} is not a dictionary snapshot")
+        return None
+    header = json.loads(buffer[HEADER.size:HEADER.size + header_size].decode("utf-8"))
+    if header["version"] != SNAPSHOT_VERSION or header["byteorder"] != sys.byteorder or \
+            header["itemsizes"] != {typecode: array(typecode).itemsize for _, typecode in ARRAYS}:
+        print(f"{snapshot_path} was built by another version or on another machine")
+        return None
+    if source_hash is not None and header["source_hash"] != source_hash:
+        print(f"{snapshot_path} was built from another version of the dictionary")
+        return None
+
+    view = memoryview(buffer)
+    start = HEADER.size + header_size
+    sections = {}
+    for name, (offset, size) in header["sections"].items():
+        sections[name] = view[start + offset:start + offset + size]
+
+    root = Trie()
+    root.tokens = bytes(sections["tokens"]).decode("utf-8").split("\n") if header["token_count"] else []
+    root.token_ids = {token: token_id for token_id, token in enumerate(root.tokens)}
+    root.values = header["values"]
+    root.value_ids = {value: value_id for value_id, value in enumerate(root.values)}
+    arrays = {name: sections[name].cast(typecode) for name, typecode in ARRAYS}
+    root.node_values = arrays["node_values"]
+    root.first_child = arrays["first_child"]
+    root.child_tokens = arrays["child_tokens"]
+    root.child_nodes = arrays["child_nodes"]
+    matcher = DictionaryMatcher.from_index(root, arrays["weights"], arrays["lengths"], arrays["sums"])
+
+    return DictionarySnapshot(matcher, header["max_count"], header["stats"], header["source_hash"],
+                              snapshot_path, len(buffer), buffer)
+
+
+def open_dictionary_snapshot(dictionary_path, snapshot_path=None):
+    """
+    Load a dictionary from its snapshot, building the snapshot first if it is missing or if the dictionary
+    file changed since it was built. If the snapshot cannot be written, the dictionary is used from memory.
+
+    Args:
+        dictionary_path (str): The dictionary file, "entity_type<TAB>entity_name" lines.
+        snapshot_path (str): The snapshot file, by default next to the dictionary file.
+
+    Returns:
+        DictionarySnapshot: The dictionary.
+    """
+    snapshot_path = snapshot_path or default_snapshot_path(dictionary_path)
+    source_hash = file_hash(dictionary_path)
+    snapshot = read_snapshot(snapshot_path, source_hash)
+    if snapshot is not None:
+        return snapshot
+
+    print(f"Building the dictionary snapshot {snapshot_path}")
+    built = build_snapshot(dictionary_path, source_hash)
+    try:
+        write_snapshot(built, snapshot_path)
+    except OSError as e:
+        print(f"Could not write the dictionary snapshot {snapshot_path}: {e}")
+        return built
+    del built
+    return read_snapshot(snapshot_path, source_hash)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compile a dictionary file into a snapshot for the Dictionary module.")
+    parser.add_argument('DICTIONARY', type=str, help='path of the dictionary file')
+    parser.add_argument('--output', '-o', type=str, help='path of the snapshot, default: DICTIONARY.snapshot')
+    args = parser.parse_args()
+
+    output = args.output or default_snapshot_path(args.DICTIONARY)
+    snapshot = build_snapshot(args.DICTIONARY)
+    write_snapshot(snapshot, output)
+    print(f"{output}: max_count = {snapshot.max_count} containing {snapshot.stats_message()}")
@@ -0,0 +1,284 @@
+"""
+Changes of the dictionary while the service runs.
+
+The changes are JSON lines appended to a journal next to the snapshot, `SNAPSHOT.journal`, and every process that
+uses the dictionary, e.g. each gunicorn worker, applies the lines it has not seen yet before it annotates its next
+document. Added and removed entries are applied to a copy of the matcher, as pending edges of the trie, without
+building it again, and the copy replaces the current snapshot. A reload builds the snapshot of the new dictionary
+file in a background thread, then replaces the journal with one that starts with the reload, followed by the
+changes made meanwhile; each process then maps the new snapshot and swaps it in. A snapshot is never changed once
+it is in use, so a document that is being annotated keeps the dictionary it started with.
+
+The journal starts with the dictionary it was made for, the --DICTIONARY file or the file of the last reload, and
+its SHA-256. When the service starts, the journal is applied again if the --DICTIONARY file is that same dictionary,
+so the changes outlive a restart; else it is moved to `SNAPSHOT.journal.old` and the --DICTIONARY file is used.
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+
+from Trie import find_in_trie
+from dictionary_process import entry_words
+from dictionary_snapshot import build_snapshot, default_snapshot_path, file_hash, open_dictionary_snapshot, \
+    read_snapshot, write_snapshot
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from lib.saroj.file_lock import file_lock
+
+
+class DictionaryStore:
+    """
+    The dictionary of the service, with the changes of the journal applied.
+
+    Attributes:
+        snapshot (DictionarySnapshot): The current dictionary. Read it once per document, it is replaced by a reload.
+        dictionary_path (str): The dictionary file of the current snapshot.
+        version (str): A hash of the journal lines applied, "" if there are none. It is the same in every process
+            that applied the same changes, e.g. for the key of the stage cache.
+        reload_error (str): The error of the last reload started by this process, None if it succeeded.
+    """
+
+    def __init__(self, dictionary_path, snapshot_path=None):
+        self.dictionary_path = dictionary_path
+        self.snapshot = None
+        self.version = ""
+        self.reload_error = None
+        self._base_dictionary_path = dictionary_path
+        self._snapshot_path = snapshot_path
+        self._journal_path = (snapshot_path or default_snapshot_path(dictionary_path)) + ".journal"
+        # The journal file that was read, by (device, inode), and how far
+        self._journal_id = None
+        self._offset = 0
+        self._digest = None
+        self._lock = threading.RLock()
+        self._reload_thread = None
+        self._base_hash = file_hash(dictionary_path)
+        self._reset_journal()
+        self.sync()
+
+    def _reset_journal(self):
+        # A journal made for another dictionary, or another version of it, is not applied to --DICTIONARY
+        with file_lock(self._journal_path):
+            try:
+                with open(self._journal_path, "rb") as file:
+                    first_line = file.readline()
+            except FileNotFoundError:
+                return
+            if first_line.endswith(b"\n") and json.loads(first_line).get("source_hash") == self._base_hash:
+                return
+            os.replace(self._journal_path, self._journal_path + ".old")
+        print(f"The dictionary journal {self._journal_path} was not made for {self._base_dictionary_path} "
+              f"as it is now, it was moved to {self._journal_path}.old")
+
+    def sync(self):
+        """
+        Apply the changes appended to the journal since the last call, by this process or by another one.
+
+        Returns:
+            DictionarySnapshot: The current dictionary.
+        """
+        journal_id, size = self._journal_state()
+        with self._lock:
+            if self.snapshot is not None and journal_id == self._journal_id and size == self._offset:
+                return self.snapshot
+
+            with file_lock(self._journal_path):
+                journal_id, data = self._read_journal()
+            # Only whole lines, in case a process stopped while writing one
+            data = data[:data.rfind(b"\n") + 1]
+            lines = data.splitlines()
+            dictionary_path = self.dictionary_path
+            snapshot = self.snapshot
+            offset = self._offset
+            digest = self._digest
+            if journal_id != self._journal_id or snapshot is None:
+                # A new journal, e.g. after a reload: it is applied from its start to a new snapshot
+                offset = 0
+                digest = hashlib.sha256()
+                if not lines or json.loads(lines[0])["action"] != "reload":
+                    dictionary_path = self._base_dictionary_path
+                    snapshot = open_dictionary_snapshot(self._base_dictionary_path, self._snapshot_path)
+
+            for line in lines:
+                dictionary_path, snapshot = self._apply(json.loads(line), dictionary_path, snapshot)
+            digest.update(data)
+            offset += len(data)
+
+            # The documents being annotated keep the snapshot they started with, which is never changed
+            self.dictionary_path = dictionary_path
+            self.snapshot = snapshot
+            self._journal_id = journal_id
+            self._offset = offset
+            self._digest = digest
+            self.version = digest.hexdigest() if offset else ""
+            return snapshot
+
+    def _journal_state(self):
+        try:
+            stat = os.stat(self._journal_path)
+        except FileNotFoundError:
+            return None, 0
+        return (stat.st_dev, stat.st_ino), stat.st_size
+
+    def _read_journal(self):
+        # The new lines of the journal if it is the one already read, else all of them
+        try:
+            with open(self._journal_path, "rb") as file:
+                stat = os.fstat(file.fileno())
+                journal_id = (stat.st_dev, stat.st_ino)
+                file.seek(self._offset if journal_id == self._journal_id else 0)
+                return journal_id, file.read()
+        except FileNotFoundError:
+            return None, b""
+
+    def _read_from(self, offset):
+        with open(self._journal_path, "rb") as file:
+            file.seek(offset)
+            return file.read()
+
+    def _apply(self, record, dictionary_path, snapshot):
+        # Returns the dictionary file and the snapshot after the record; the snapshot in use is copied, not changed
+        action = record["action"]
+        if action == "base":
+            # The --DICTIONARY file, opened by sync()
+            return dictionary_path, snapshot
+        if action == "reload":
+            reloaded = read_snapshot(record["snapshot"], record["source_hash"])
+            if reloaded is None:
+                reloaded = open_dictionary_snapshot(record["dictionary"], record["snapshot"])
+            return record["dictionary"], reloaded
+
+        if snapshot is self.snapshot:
+            snapshot = snapshot.copy()
+        if action == "add":
+            for entity_type, entity_name in record["entries"]:
+                words = entry_words(entity_name)
+                found, old_type = find_in_trie(snapshot.matcher.trie_root, words)
+                if found:
+                    _count(snapshot.stats, old_type, -1)
+                snapshot.matcher.add(words, entity_type)
+                _count(snapshot.stats, entity_type, 1)
+                snapshot.max_count = max(snapshot.max_count, len(words))
+        elif action == "remove":
+            for entity_name in record["names"]:
+                words = entry_words(entity_name)
+                found, old_type = find_in_trie(snapshot.matcher.trie_root, words)
+                if found:
+                    _count(snapshot.stats, old_type, -1)
+                    snapshot.matcher.remove(words)
+        return dictionary_path, snapshot
+
+    def _append(self, record):
+        with file_lock(self._journal_path):
+            with open(self._journal_path, "a", encoding="utf-8") as file:
+                if file.tell() == 0:
+                    base = {"action": "base", "dictionary": self._base_dictionary_path, "source_hash": self._base_hash}
+                    file.write(json.dumps(base, ensure_ascii=False) + "\n")
+                file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def add(self, entries):
+        """
+        Add entries, or change the type of existing ones, in every process.
+
+        Args:
+            entries (list): [entity_type, entity_name] pairs, as the lines of a dictionary file.
+
+        Returns:
+            int: The number of entries added.
+        """
+        if not isinstance(entries, list):
+            raise ValueError("Invalid dictionary entries, expected a list of [entity_type, entity_name] pairs")
+        for entry in entries:
+            if not isinstance(entry, (list, tuple)) or len(entry) != 2 or \
+                    not all(isinstance(part, str) for part in entry) or \
+                    not entry[0].strip() or "\t" in entry[0] or not entry[1].split():
+                raise ValueError(f"Invalid dictionary entry {entry}, expected [entity_type, entity_name]")
+        if entries:
+            self._append({"action": "add", "entries": [[entry[0].strip(), entry[1]] for entry in entries]})
+            self.sync()
+        return len(entries)
+
+    def remove(self, names):
+        """
+        Remove entries, by their entity names, in every process.
+
+        Returns:
+            int: The number of entries that were in the dictionary.
+        """
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            raise ValueError("Invalid dictionary entries, expected a list of entity names")
+        snapshot = self.sync()
+        found = sum(find_in_trie(snapshot.matcher.trie_root, entry_words(name))[0] for name in names)
+        if names:
+            self._append({"action": "remove", "names": names})
+            self.sync()
+        return found
+
+    def reload(self, dictionary_path):
+        """
+        Start loading another dictionary file, or the same one after it changed, in a background thread.
+        The documents are annotated with the current dictionary until the new snapshot is ready.
+        """
+        with self._lock:
+            if self._reload_thread is not None and self._reload_thread.is_alive():
+                raise RuntimeError("A reload of the dictionary is already running")
+            if not os.path.isfile(dictionary_path):
+                raise ValueError(f"Dictionary file '{dictionary_path}' does not exist.")
+            with file_lock(self._journal_path):
+                start = self._journal_state()
+            self.reload_error = None
+            self._reload_thread = threading.Thread(target=self._reload, args=(dictionary_path, start), daemon=True)
+            self._reload_thread.start()
+
+    def reloading(self):
+        return self._reload_thread is not None and self._reload_thread.is_alive()
+
+    def _reload(self, dictionary_path, start):
+        try:
+            if dictionary_path == self._base_dictionary_path and self._snapshot_path:
+                snapshot_path = self._snapshot_path
+            else:
+                snapshot_path = default_snapshot_path(dictionary_path)
+            source_hash = file_hash(dictionary_path)
+            if read_snapshot(snapshot_path, source_hash) is None:
+                write_snapshot(build_snapshot(dictionary_path, source_hash), snapshot_path)
+            record = {"action": "reload", "dictionary": dictionary_path, "snapshot": snapshot_path,
+                      "source_hash": source_hash}
+
+            with file_lock(self._journal_path):
+                # The changes made while the snapshot was built are kept after the reload
+                journal_id, size = self._journal_state()
+                later = b""
+                if journal_id is not None:
+                    later = self._read_from(start[1] if journal_id == start[0] else 0)
+                    later = b"".join(line for line in later.splitlines(keepends=True)
+                                     if json.loads(line)["action"] not in ("base", "reload"))
+                temp_path = f"{self._journal_path}.{os.getpid()}.tmp"
+                with open(temp_path, "wb") as file:
+                    file.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+                    file.write(later)
+                os.replace(temp_path, self._journal_path)
+            self.sync()
+        except Exception as e:
+            print(f"Could not reload the dictionary {dictionary_path}: {e}")
+            self.reload_error = str(e)
+
+    def status(self):
+        """
+        Return the state of the dictionary, as the admin endpoint reports it.
+        """
+        snapshot = self.snapshot
+        return {"dictionary": self.dictionary_path, "source_hash": snapshot.source_hash, "version": self.version,
+                "max_count": snapshot.max_count, "stats": snapshot.stats, "reloading": self.reloading(),
+                "reload_error": self.reload_error}
+
+
+def _count(stats, entity_type, delta):
+    # The types without entries are dropped, so that an emptied dictionary is reported as empty
+    count = stats.get(entity_type, 0) + delta
+    if count > 0:
+        stats[entity_type] = count
+    else:
+        stats.pop(entity_type, None)
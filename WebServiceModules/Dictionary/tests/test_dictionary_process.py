@@ -0,0 +1,215 @@
+import io
+import os
+import random
+from collections import deque
+
+import pytest
+
+import dictionary_process
+from dictionary_process import *
+from lib.saroj.conllu_document import CoNLLUDocument
+from lib.saroj.conllu_utils import CoNLLUError
+
+NAMES = ["Ion Popescu", "Maria Ionescu", "Vasile Mihai Georgescu", "Cluj-Napoca", "Bucureşti", "Ion"]
+LONG_ENTRY_WORDS = ["de", "a", "din", "şi", "la", "în", "cererea"]
+
+
+class BaselineTrieNode:
+    def __init__(self):
+        self.children = {}
+        self.is_end = False
+        self.value = None
+
+
+def baseline_assign_ner(input_file, output_file, dictionary_path):
+    """The window scan of the Dictionary module before DictionaryMatcher, copied as it was."""
+
+    def add(root, words, value):
+        node = root
+        for word in words:
+            if word not in node.children:
+                node.children[word] = BaselineTrieNode()
+            node = node.children[word]
+        node.is_end = True
+        node.value = value
+
+    def find(root, words):
+        node = root
+        for word in words:
+            if word not in node.children:
+                return False, None
+            node = node.children[word]
+        return node.is_end, node.value
+
+    def test_subsequences(tokens):
+        results = ()
+        cleaned_tokens = [token for token in tokens if token != "-"]
+        sorted_tokens = sorted((token.lower() for token in cleaned_tokens), key=custom_sort)
+        for _ in range(len(cleaned_tokens), 0, -1):
+            found, ner = find(trie_root, sorted_tokens)
+            if found:
+                results = (' '.join(cleaned_tokens), ner)
+                break
+            remove_token = cleaned_tokens.pop()
+            sorted_tokens.remove(remove_token.lower())
+        return results
+
+    def process_and_write():
+        r = test_subsequences(current_entities)
+        if r and r[0][0].isupper():
+            for i in range(len(r[0].split())):
+                output_buffer.write(current_line.popleft().strip() + '\t' + f"{'B' if i == 0 else 'I'}-{r[1]}" + '\n')
+                current_entities.popleft()
+        else:
+            if current_entities[0] != "":
+                output_buffer.write(current_line.popleft().strip() + NOT_FOUND)
+            else:
+                output_buffer.write(current_line.popleft())
+            current_entities.popleft()
+
+    dictionary, max_count = load_dictionary_with_max_token_count(dictionary_path)
+    trie_root = BaselineTrieNode()
+    for key, value in dictionary.items():
+        add(trie_root, sorted(key.split(), key=custom_sort), value)
+
+    output_buffer = io.StringIO()
+    current_entities = deque(maxlen=max_count)
+    current_line = deque(maxlen=max_count)
+    with open(input_file, 'r', encoding='utf-8', errors="ignore") as file:
+        for line in file:
+            form = line.strip().split('\t')[1] if not check_invalid_line(line) else ""
+            current_entities.append(suffix_replace(form)[0])
+            current_line.append(line)
+            if len(current_entities) >= max_count:
+                process_and_write()
+    if len(current_entities) >= max_count:
+        current_entities.popleft()
+    while current_entities:
+        process_and_write()
+
+    with open(output_file, 'w', encoding='utf-8') as file:
+        file.write(output_buffer.getvalue())
+
+
+def long_entry_words(count):
+    rng = random.Random(count)
+    return [rng.choice(LONG_ENTRY_WORDS) for _ in range(count)]
+
+
+def write_dictionary(path, long_entry=0):
+    with open(path, 'w', encoding='utf-8') as file:
+        for i, name in enumerate(NAMES):
+            file.write(f"{['PER', 'LOC'][i % 2]}\t{name}\n")
+        file.write("# not an entry\nORG\tSC Alfa Construct SRL\n")
+        if long_entry:
+            file.write("ORG\t" + " ".join(long_entry_words(long_entry)) + "\n")
+
+
+def write_document(path, sentences):
+    with open(path, 'w', encoding='utf-8') as file:
+        for n, forms in enumerate(sentences):
+            file.write(f"# sent_id = {n + 1}\n")
+            for i, form in enumerate(forms):
+                file.write(f"{i + 1}\t{form}\t_\t_\n")
+            file.write("\n")
+
+
+def random_sentences(rng, vocabulary):
+    return [[rng.choice(vocabulary) for _ in range(rng.randint(1, 12))] for _ in range(rng.randint(1, 4))]
+
+
+def check_same_as_baseline(tmp_path, sentences, long_entry=0):
+    dictionary_path = str(tmp_path / "d.dic")
+    input_file = str(tmp_path / "in.conllup")
+    write_dictionary(dictionary_path, long_entry)
+    write_document(input_file, sentences)
+
+    baseline_assign_ner(input_file, str(tmp_path / "baseline.conllup"), dictionary_path)
+    matcher, max_count = load_dictionary_matcher(dictionary_path)
+    output = assign_ner_to_document(CoNLLUDocument.read(input_file), matcher, max_count)
+
+    with open(tmp_path / "baseline.conllup", 'r', encoding='utf-8') as file:
+        expected = file.read()
+    assert "".join(output.lines()) == expected, sentences
+    return expected
+
+
+def test_capital_letter(tmp_path):
+    # The words of an entry match in any order and case, as long as the first one has a capital
+    lines = check_same_as_baseline(tmp_path, [["Popescu", "Ion", "din", "Bucureşti"], ["ion", "Popescu"],
+                                              ["Ionescu", "maria"], ["ION", "POPESCU"]]).splitlines()
+    tags = [line.split("\t")[-1] for line in lines if line and not line.startswith("#")]
+    assert tags == ["B-PER", "I-PER", "O", "B-PER", "O", "O", "B-LOC", "I-LOC", "B-PER", "I-PER"]
+
+
+def test_hyphens(tmp_path):
+    lines = check_same_as_baseline(tmp_path, [["Ion", "-", "Popescu", "a", "plecat"], ["-", "Maria", "-", "Ionescu"],
+                                              ["Cluj-Napoca", "-"]]).splitlines()
+    assert lines[1].endswith("B-PER") and lines[2].endswith("I-PER")
+
+
+def test_comments_and_empty_lines_in_the_window(tmp_path):
+    # An entry does not go over the end of a sentence, but the window does
+    check_same_as_baseline(tmp_path, [["Ion"], ["Popescu", "Ion"], ["Vasile", "Mihai"], ["Georgescu"]])
+
+
+def test_random_documents(tmp_path):
+    rng = random.Random(1)
+    vocabulary = [word for name in NAMES for word in name.split()] + \
+        ["-", "din", ",", "SC", "SRL", "Alfa", "Construct", "alfa", "ion", "POPESCU", "maria"]
+    for _ in range(100):
+        check_same_as_baseline(tmp_path, random_sentences(rng, vocabulary))
+
+
+def test_long_entry(tmp_path):
+    # The entry sets max_count, and so the window, to 150 tokens
+    rng = random.Random(2)
+    vocabulary = LONG_ENTRY_WORDS + ["De", "Ion", "Popescu", "-"]
+    for _ in range(20):
+        words = long_entry_words(150)
+        rng.shuffle(words)
+        words[0] = words[0].capitalize()
+        output = check_same_as_baseline(tmp_path, random_sentences(rng, vocabulary) + [words], 150)
+        assert output.count("-ORG\n") == 150
+
+
+def test_window_of_zero(tmp_path):
+    # An empty dictionary: nothing is tagged
+    (tmp_path / "d.dic").write_text("", encoding='utf-8')
+    matcher, max_count = load_dictionary_matcher(str(tmp_path / "d.dic"))
+    assert max_count == 0
+
+    document = CoNLLUDocument.from_lines(["# sent_id = 1\n", "1\tIon\t_\n", "2\tPopescu\t_\n", "\n"])
+    lines = list(assign_ner_to_document(document, matcher, max_count).lines())
+    assert lines == ["# sent_id = 1\n", "1\tIon\t_\tO\n", "2\tPopescu\t_\tO\n", "\n"]
+
+
+def test_streaming_same_as_in_memory(tmp_path, monkeypatch):
+    # Few written lines kept, so that the window is often cut from the lines already written
+    monkeypatch.setattr(dictionary_process, "WRITTEN_LINES", 3)
+    rng = random.Random(3)
+    vocabulary = [word for name in NAMES for word in name.split()] + ["-", "din", "SC", "SRL", "Alfa", "Construct"]
+    write_dictionary(str(tmp_path / "d.dic"), 10)
+    matcher, max_count = load_dictionary_matcher(str(tmp_path / "d.dic"))
+    for _ in range(50):
+        input_file = str(tmp_path / "in.conllup")
+        write_document(input_file, random_sentences(rng, vocabulary) + [long_entry_words(10)])
+        assign_ner(input_file, str(tmp_path / "out.conllup"), matcher, max_count)
+
+        expected = assign_ner_to_document(CoNLLUDocument.read(input_file), matcher, max_count)
+        with open(tmp_path / "out.conllup", 'r', encoding='utf-8') as file:
+            assert file.read() == "".join(expected.lines())
+
+
+def test_no_output_on_error(tmp_path, monkeypatch):
+    monkeypatch.setattr(dictionary_process, "WRITTEN_LINES", 3)
+    write_dictionary(str(tmp_path / "d.dic"))
+    matcher, max_count = load_dictionary_matcher(str(tmp_path / "d.dic"))
+    sentences = [["Ion", "Popescu", "din", "Bucureşti"]] * 5
+    write_document(str(tmp_path / "in.conllup"), sentences)
+    with open(tmp_path / "in.conllup", 'a', encoding='utf-8') as file:
+        file.write("1\tIon\t_\t_\n3\tPopescu\t_\t_\n")
+
+    with pytest.raises(CoNLLUError):
+        assign_ner(str(tmp_path / "in.conllup"), str(tmp_path / "out.conllup"), matcher, max_count)
+    assert sorted(os.listdir(tmp_path)) == ["d.dic", "in.conllup"]
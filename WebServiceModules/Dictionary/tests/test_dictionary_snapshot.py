@@ -0,0 +1,94 @@
+import json
+
+import dictionary_snapshot
+from dictionary_process import *
+from dictionary_snapshot import *
+
+DICTIONARY = "PER\tIon Popescu\nPER\tMaria\nLOC\tCluj-Napoca\n# comment\nORG\tSC Alfa Construct SRL\nPER\tion popescu\n"
+
+
+def write_dictionary(tmp_path, text=DICTIONARY):
+    path = tmp_path / "d.dic"
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def tags(snapshot, forms):
+    lines = ["# sent_id = 1\n"] + [f"{i + 1}\t{form}\t_\n" for i, form in enumerate(forms)] + ["\n"]
+    output = assign_ner_to_document(CoNLLUDocument.from_lines(lines), snapshot.matcher, snapshot.max_count)
+    return [line.rstrip("\n").split("\t")[-1] for line in output.lines() if "\t" in line]
+
+
+def test_round_trip(tmp_path):
+    dictionary_path = write_dictionary(tmp_path)
+    built = build_snapshot(dictionary_path)
+    write_snapshot(built, str(tmp_path / "d.snapshot"))
+    snapshot = read_snapshot(str(tmp_path / "d.snapshot"), file_hash(dictionary_path))
+
+    assert snapshot.path == str(tmp_path / "d.snapshot") and snapshot.size > 0
+    assert isinstance(snapshot.matcher.trie_root.first_child, memoryview)
+    assert snapshot.max_count == 4
+    # Lines by type, as read_replacement_dictionary counts them
+    assert snapshot.stats == {"PER": 3, "LOC": 1, "ORG": 1}
+    assert snapshot.stats_message() == "PER:3, LOC:1, ORG:1"
+    assert sorted(trie_entries(snapshot.matcher.trie_root)) == sorted(trie_entries(built.matcher.trie_root))
+
+    forms = ["Popescu", "Ion", "din", "Cluj-Napoca", ",", "SC", "Alfa", "Construct", "SRL", "maria", "Maria"]
+    assert tags(snapshot, forms) == tags(built, forms) == \
+        ["B-PER", "I-PER", "O", "B-LOC", "O", "B-ORG", "I-ORG", "I-ORG", "I-ORG", "O", "B-PER"]
+
+
+def test_empty_dictionary(tmp_path):
+    dictionary_path = write_dictionary(tmp_path, "# no entries\n")
+    snapshot = open_dictionary_snapshot(dictionary_path)
+
+    assert snapshot.path == default_snapshot_path(dictionary_path)
+    assert snapshot.max_count == 0 and snapshot.stats == {}
+    assert len(snapshot.matcher.trie_root.child_tokens) == 0 and snapshot.matcher.trie_root.tokens == []
+    assert tags(snapshot, ["Ion", "Popescu"]) == ["O", "O"]
+
+
+def test_rebuilt_when_the_dictionary_changes(tmp_path, capsys):
+    dictionary_path = write_dictionary(tmp_path)
+    first = open_dictionary_snapshot(dictionary_path)
+    assert "Building" in capsys.readouterr().out
+
+    # Mapped again, not built
+    assert open_dictionary_snapshot(dictionary_path).source_hash == first.source_hash
+    assert "Building" not in capsys.readouterr().out
+
+    with open(dictionary_path, 'a', encoding='utf-8') as file:
+        file.write("LOC\tBraşov\n")
+    second = open_dictionary_snapshot(dictionary_path)
+    assert "another version of the dictionary" in capsys.readouterr().out
+    assert second.source_hash == file_hash(dictionary_path) != first.source_hash
+    assert second.stats["LOC"] == 2 and tags(second, ["Braşov"]) == ["B-LOC"]
+    # The snapshot mapped before keeps working
+    assert tags(first, ["Braşov", "Maria"]) == ["O", "B-PER"]
+
+
+def test_rejected_snapshots(tmp_path, monkeypatch):
+    dictionary_path = write_dictionary(tmp_path)
+    snapshot_path = str(tmp_path / "d.snapshot")
+    write_snapshot(build_snapshot(dictionary_path), snapshot_path)
+    with open(snapshot_path, 'rb') as file:
+        data = file.read()
+
+    assert read_snapshot(str(tmp_path / "missing.snapshot")) is None
+    assert read_snapshot(snapshot_path, "another hash") is None
+
+    # Another magic, an empty file
+    (tmp_path / "bad.snapshot").write_bytes(b"NOTASNAP" + data[8:])
+    assert read_snapshot(str(tmp_path / "bad.snapshot")) is None
+    (tmp_path / "empty.snapshot").write_bytes(b"")
+    assert read_snapshot(str(tmp_path / "empty.snapshot")) is None
+
+    # Another version of the format
+    monkeypatch.setattr(dictionary_snapshot, "SNAPSHOT_VERSION", SNAPSHOT_VERSION + 1)
+    assert read_snapshot(snapshot_path) is None
+    assert open_dictionary_snapshot(dictionary_path, snapshot_path).path == snapshot_path
+    # Built again, with the new version
+    with open(snapshot_path, 'rb') as file:
+        data = file.read()
+    _, header_size = HEADER.unpack_from(data)
+    assert json.loads(data[HEADER.size:HEADER.size + header_size])["version"] == SNAPSHOT_VERSION + 1
@@ -0,0 +1,152 @@
+import os
+import threading
+
+import pytest
+
+import dictionary_store
+from dictionary_process import *
+from dictionary_store import DictionaryStore
+
+DICTIONARY = "PER\tIon Popescu\nLOC\tCluj\n"
+
+
+@pytest.fixture
+def dictionary_path(tmp_path):
+    path = tmp_path / "d.dic"
+    path.write_text(DICTIONARY, encoding='utf-8')
+    return str(path)
+
+
+def tags(store, forms):
+    snapshot = store.sync()
+    lines = ["# sent_id = 1\n"] + [f"{i + 1}\t{form}\t_\n" for i, form in enumerate(forms)] + ["\n"]
+    output = assign_ner_to_document(CoNLLUDocument.from_lines(lines), snapshot.matcher, snapshot.max_count)
+    return [line.rstrip("\n").split("\t")[-1] for line in output.lines() if "\t" in line]
+
+
+def test_add_and_replay(dictionary_path):
+    store = DictionaryStore(dictionary_path)
+    worker = DictionaryStore(dictionary_path)
+    assert store.version == ""
+
+    assert store.add([["PER", "Vasile Mihai Georgescu"], ["ORG", "cluj"]]) == 2
+    # Seen by the other worker at its next document
+    assert tags(worker, ["Georgescu", "Vasile", "Mihai", "din", "Cluj"]) == ["B-PER", "I-PER", "I-PER", "O", "B-ORG"]
+    assert worker.snapshot.max_count == 3
+    assert worker.snapshot.stats == {"PER": 2, "ORG": 1}
+    assert worker.version == store.version != ""
+
+    # And by a new start, with the same dictionary file
+    restarted = DictionaryStore(dictionary_path)
+    assert tags(restarted, ["Georgescu", "Vasile", "Mihai", "din", "Cluj"]) == ["B-PER", "I-PER", "I-PER", "O", "B-ORG"]
+    assert restarted.version == store.version
+
+
+def test_remove(dictionary_path):
+    store = DictionaryStore(dictionary_path)
+    assert store.remove(["ion popescu", "Nobody"]) == 1
+    assert tags(store, ["Ion", "Popescu", "Cluj"]) == ["O", "O", "B-LOC"]
+    assert store.remove(["Cluj"]) == 1
+    # No zero counts: the dictionary is empty again
+    assert store.snapshot.stats == {}
+
+    with pytest.raises(ValueError):
+        store.remove("Cluj")
+    with pytest.raises(ValueError):
+        store.add(["PER", "Ion"])
+    with pytest.raises(ValueError):
+        store.add([["PER", " "]])
+
+
+def test_snapshot_in_use_is_not_changed(dictionary_path):
+    store = DictionaryStore(dictionary_path)
+    # A document being annotated
+    snapshot = store.sync()
+    matcher = snapshot.matcher
+
+    store.add([["ORG", "Vasile Mihai Georgescu"]])
+    store.remove(["Cluj"])
+    assert snapshot.matcher is matcher
+    assert snapshot.stats == {"PER": 1, "LOC": 1} and snapshot.max_count == 2
+    assert matcher.longest_match(["Vasile", "Mihai", "Georgescu"], 0, 3) == (0, None)
+    assert matcher.longest_match(["Cluj"], 0, 1) == (1, "LOC")
+
+    # The next document gets the changes
+    assert store.snapshot is not snapshot
+    assert store.snapshot.stats == {"PER": 1, "ORG": 1} and store.snapshot.max_count == 3
+    assert tags(store, ["Vasile", "Mihai", "Georgescu", "Cluj"]) == ["B-ORG", "I-ORG", "I-ORG", "O"]
+
+
+def wait_for_reload(store):
+    store._reload_thread.join()
+    assert store.reload_error is None
+
+
+def test_reload(dictionary_path, tmp_path):
+    store = DictionaryStore(dictionary_path)
+    worker = DictionaryStore(dictionary_path)
+    (tmp_path / "new.dic").write_text("LOC\tBraşov\n", encoding='utf-8')
+    before = worker.sync()
+
+    store.reload(str(tmp_path / "new.dic"))
+    wait_for_reload(store)
+    assert store.dictionary_path == str(tmp_path / "new.dic")
+
+    # The other worker swaps the snapshot in; the one of a document in progress is not changed
+    after = worker.sync()
+    assert after is not before and worker.dictionary_path == store.dictionary_path
+    assert tags(worker, ["Braşov", "Cluj"]) == ["B-LOC", "O"]
+    assert before.stats == {"PER": 1, "LOC": 1}
+
+    with pytest.raises(ValueError):
+        store.reload(str(tmp_path / "missing.dic"))
+
+
+def test_changes_during_a_reload_are_kept(dictionary_path, tmp_path, monkeypatch):
+    (tmp_path / "new.dic").write_text("LOC\tBraşov\n", encoding='utf-8')
+    building = threading.Event()
+    added = threading.Event()
+    build_snapshot = dictionary_store.build_snapshot
+
+    def slow_build_snapshot(*args):
+        building.set()
+        added.wait(10)
+        return build_snapshot(*args)
+
+    monkeypatch.setattr(dictionary_store, "build_snapshot", slow_build_snapshot)
+    store = DictionaryStore(dictionary_path)
+    worker = DictionaryStore(dictionary_path)
+    store.reload(str(tmp_path / "new.dic"))
+    assert store.reloading()
+    building.wait(10)
+
+    worker.add([["ORG", "Alfa Beta"]])
+    assert tags(store, ["Alfa", "Beta", "Braşov", "Ion", "Popescu"]) == ["B-ORG", "I-ORG", "O", "B-PER", "I-PER"]
+    added.set()
+    wait_for_reload(store)
+
+    for each in (store, worker):
+        assert tags(each, ["Alfa", "Beta", "Braşov", "Ion", "Popescu"]) == ["B-ORG", "I-ORG", "B-LOC", "O", "O"]
+
+
+def test_journal_of_another_dictionary(dictionary_path, tmp_path, capsys):
+    store = DictionaryStore(dictionary_path)
+    store.add([["ORG", "Alfa Beta"]])
+    (tmp_path / "new.dic").write_text("LOC\tBraşov\n", encoding='utf-8')
+    store.reload(str(tmp_path / "new.dic"))
+    wait_for_reload(store)
+
+    # A restart with -d d.dic after the reload uses d.dic, and sets the journal aside
+    restarted = DictionaryStore(dictionary_path)
+    assert "was moved to" in capsys.readouterr().out
+    assert restarted.dictionary_path == dictionary_path and restarted.version == ""
+    assert tags(restarted, ["Braşov", "Ion", "Popescu", "Alfa", "Beta"]) == ["O", "B-PER", "I-PER", "O", "O"]
+    assert os.path.exists(dictionary_path + ".snapshot.journal.old")
+
+    # Same when the dictionary file changed since the journal was started
+    restarted.add([["ORG", "Alfa Beta"]])
+    assert DictionaryStore(dictionary_path).version == restarted.version
+    with open(dictionary_path, 'a', encoding='utf-8') as file:
+        file.write("LOC\tIaşi\n")
+    changed = DictionaryStore(dictionary_path)
+    assert changed.version == "" and tags(changed, ["Alfa", "Beta", "Iaşi"]) == ["O", "O", "B-LOC"]
@@ -0,0 +1,128 @@
+import random
+
+from Trie import *
+from dictionary_matcher import DictionaryMatcher
+from dictionary_snapshot import DictionarySnapshot, read_snapshot, write_snapshot
+
+ENTRIES = {("ion", "popescu"): "PER", ("ion",): "PER", ("cluj-napoca",): "LOC", ("alfa", "sc", "srl"): "ORG",
+           ("alfa", "sc"): "ORG", ("de", "instanţa", "judecătoria"): "ORG"}
+
+
+def make_trie(entries):
+    root = Trie()
+    for words, value in entries.items():
+        add_to_trie(root, list(words), value)
+    return root
+
+
+def check_entries(root, entries):
+    for words, value in entries.items():
+        assert find_in_trie(root, list(words)) == (True, value)
+    assert {tuple(words): value for words, value in trie_entries(root)} == entries
+
+
+def test_add_before_and_after_compact():
+    root = make_trie(ENTRIES)
+    # Prefixes that are not entries, and unknown words
+    assert find_in_trie(root, ["alfa"]) == (False, None)
+    assert find_in_trie(root, ["de", "instanţa"]) == (False, None)
+    assert find_in_trie(root, ["ion", "maria"]) == (False, None)
+    check_entries(root, ENTRIES)
+
+    compact_trie(root)
+    assert not root.edges
+    check_entries(root, ENTRIES)
+
+    # New children of compacted nodes, of pending nodes and of the root, then a new value of an entry
+    added = {("ion", "maria"): "PER", ("alfa", "sc", "srl", "x"): "ORG", ("zzz",): "LOC", ("ion",): "LOC"}
+    for words, value in added.items():
+        add_to_trie(root, list(words), value)
+    check_entries(root, {**ENTRIES, **added})
+
+    compact_trie(root)
+    check_entries(root, {**ENTRIES, **added})
+    # The root and one node per distinct prefix
+    assert count_trie_nodes(root) == 13
+
+
+def test_random_entries():
+    rng = random.Random(1)
+    vocabulary = [f"w{i}" for i in range(40)]
+    entries = {}
+    root = Trie()
+    for round_ in range(5):
+        for _ in range(200):
+            words = tuple(sorted(rng.sample(vocabulary, rng.randint(1, 4)), key=custom_sort))
+            entries[words] = rng.choice(["PER", "LOC", "ORG"])
+            add_to_trie(root, list(words), entries[words])
+        if round_ % 2 == 0:
+            compact_trie(root)
+        check_entries(root, entries)
+    # The children of each compacted node are sorted by token id, for the bisection
+    for node in range(len(root.first_child) - 1):
+        children = root.child_tokens[root.first_child[node]:root.first_child[node + 1]]
+        assert list(children) == sorted(children)
+
+
+def test_remove():
+    root = make_trie(ENTRIES)
+    compact_trie(root)
+    add_to_trie(root, ["maria"], "PER")
+
+    assert remove_from_trie(root, ["alfa", "sc"])
+    assert remove_from_trie(root, ["maria"])
+    assert not remove_from_trie(root, ["alfa", "sc"])
+    assert not remove_from_trie(root, ["alfa"])
+    assert not remove_from_trie(root, ["nobody"])
+
+    # The entries under a removed one are kept
+    expected = {words: value for words, value in ENTRIES.items() if words != ("alfa", "sc")}
+    check_entries(root, expected)
+    assert find_in_trie(root, ["alfa", "sc"]) == (False, None)
+
+
+def test_add_to_a_trie_from_a_snapshot(tmp_path):
+    matcher = DictionaryMatcher(make_trie(ENTRIES))
+    write_snapshot(DictionarySnapshot(matcher, 3, {"PER": 2}, "hash"), str(tmp_path / "d.snapshot"))
+    snapshot = read_snapshot(str(tmp_path / "d.snapshot"))
+    root = snapshot.matcher.trie_root
+    assert isinstance(root.child_tokens, memoryview) and isinstance(root.node_values, memoryview)
+    check_entries(root, ENTRIES)
+
+    # The node values are copied to an array the first time the trie changes, the other arrays at compaction
+    add_to_trie(root, ["ion", "maria"], "PER")
+    assert isinstance(root.node_values, array) and isinstance(root.child_tokens, memoryview)
+    assert remove_from_trie(root, ["ion"])
+    expected = {**ENTRIES, ("ion", "maria"): "PER"}
+    del expected[("ion",)]
+    check_entries(root, expected)
+
+    compact_trie(root)
+    assert isinstance(root.child_tokens, array)
+    check_entries(root, expected)
+
+
+def test_copy(tmp_path):
+    matcher = DictionaryMatcher(make_trie(ENTRIES))
+    write_snapshot(DictionarySnapshot(matcher, 3, {"PER": 2}, "hash"), str(tmp_path / "d.snapshot"))
+    snapshot = read_snapshot(str(tmp_path / "d.snapshot"))
+    matcher.add(["maria"], "PER")
+
+    # Of a trie with pending edges and of one read from a snapshot
+    for original in [matcher, snapshot.matcher]:
+        entries = {tuple(words): value for words, value in trie_entries(original.trie_root)}
+        copy = original.copy()
+        copy.add(["ion", "vasile"], "PER")
+        copy.add(["ion"], "LOC")
+        copy.remove(["alfa", "sc"])
+
+        check_entries(original.trie_root, entries)
+        assert original.longest_match(["Ion", "Vasile"], 0, 2) == (1, "PER")
+        assert copy.longest_match(["Ion", "Vasile"], 0, 2) == (2, "PER")
+        assert copy.longest_match(["SC", "Alfa"], 0, 2) == (0, None)
+
+        copy.compact()
+        check_entries(original.trie_root, entries)
+        expected = {**entries, ("ion", "vasile"): "PER", ("ion",): "LOC"}
+        del expected[("alfa", "sc")]
+        check_entries(copy.trie_root, expected)
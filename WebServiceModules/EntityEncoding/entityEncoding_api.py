@@ -3,11 +3,16 @@ import os
 import sys, traceback
 
 from flask import Flask, jsonify
-from entityEncoding_process import read_mapping, process_and_update_ner_tags, read_tokens_from_file, update_mapping
+from entityEncoding_process import read_mapping, update_ner_tags, read_tokens_from_document, update_mapping
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
-from lib.saroj.input_data import get_input_data
+from lib.saroj.input_data import get_input_data, get_conllu_document, process_batch, write_conllu_output
 from lib.saroj.gunicorn import StandaloneApplication
+from lib.saroj.file_lock import file_lock
+from lib.saroj.memory import install_memory_debug
+from lib.saroj.metrics import install_metrics, timer
+from lib.saroj.profiling import install_profiling
+from lib.saroj.conllu_document import CoNLLUDocument
 
 app = Flask(__name__)
 
@@ -27,6 +32,24 @@ def anonymize_docx():
     if not status:
         return error
 
+    return encode_job(data)
+
+
+@app.route('/process_batch', methods=['POST', 'GET'])
+def anonymize_docx_batch():
+    """
+    Route to process many files in one call.
+
+    Expects a JSON list of jobs, each one with the keys of /process.
+
+    Returns:
+        JSON: The status of the batch and of each job (e.g., {'status': 'OK', 'message': '', 'jobs': [...]}).
+    """
+    return process_batch(["input", "output", "mapping"], encode_job)
+
+
+def encode_job(data):
+    """Encodes the entities of one file, `data` being the JSON object given to /process."""
     input_path = data["input"]
     output_path = data["output"]
     mapping_path = data["mapping"]
@@ -36,11 +59,22 @@ def anonymize_docx():
 
     if input_path:
         try:
-            mapping = read_mapping(mapping_path)
-            tokens = read_tokens_from_file(input_path)
-            updated_mapping = update_mapping(tokens, mapping, mapping_path)
-            process_and_update_ner_tags(input_path, output_path, updated_mapping, tokens)
-            return jsonify({"status": "OK", "message": ""})
+            if isinstance(input_path, str):
+                with timer("parse"):
+                    document = CoNLLUDocument.read(input_path)
+            else:
+                status, document, error = get_conllu_document(input_path)
+                if not status:
+                    return error
+            with timer("annotate"):
+                tokens = read_tokens_from_document(document)
+                # Other workers may update the same case map
+                with file_lock(mapping_path):
+                    mapping = read_mapping(mapping_path)
+                    updated_mapping = update_mapping(tokens, mapping, mapping_path)
+                document = update_ner_tags(document, updated_mapping, tokens)
+            output = write_conllu_output(document, output_path)
+            return jsonify({"status": "OK", "message": "", **output})
         except Exception as e:
             traceback.print_exc(file=sys.stdout)
             return jsonify({"status": "ERROR", "message": str(e)})
@@ -62,13 +96,18 @@ def check_health():
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('PORT', type=int, help='Port to listen for requests')
+    parser.add_argument('--WORKERS', type=int, default=1, help='worker processes, each one handles a document at a time')
+    parser.add_argument('--THREADS', type=int, help='threads of the numeric libraries in each worker, default: cores / workers')
     args = parser.parse_args()
 
     token_model = None
 
     options = {
         'bind': '%s:%s' % ('127.0.0.1', args.PORT),
-        'workers': 1,
+        'workers': args.WORKERS,
     }
+    install_metrics(app, "EntityEncoding")
+    install_profiling(app)
+    install_memory_debug(app, "EntityEncoding")
     #app.run(debug=True, port=args.PORT)
-    StandaloneApplication(app, options).run()
+    StandaloneApplication(app, options, worker_threads=args.THREADS).run()
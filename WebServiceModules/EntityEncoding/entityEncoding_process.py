@@ -1,9 +1,13 @@
 import os
+import sys
 from itertools import zip_longest
 
 from entityEncoding_NERProcessor import NERProcessor
 from entityEncoding_suffix import suffix_replace, VOID_NER
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from lib.saroj.conllu_document import CoNLLUDocument, CoNLLUDocumentWriter
+
 
 def read_mapping(mapping_path):
     """
@@ -62,22 +66,20 @@ def read_tokens_from_file(input_path):
         corresponding NER tag. Lines starting with "#" and empty lines in the input file are skipped.
 
     """
-    tokens = []
+    return read_tokens_from_document(CoNLLUDocument.read(input_path))
 
-    with open(input_path, "r", encoding="utf-8", errors="ignore") as input_file:
-        for line in input_file:
-            line = line.strip()
-            if not line or line.startswith("#"):
-                # Skip empty lines and lines starting with "#"
-                continue
 
-            # Split the line by tab to get columns
-            columns = line.strip().split("\t")
-            token = columns[1]
-            ner_tag = columns[-1]
-            tokens.append((token, ner_tag))
+def read_tokens_from_document(document):
+    """
+    Read tokens and their NER tags from a CoNLL-U Plus document that is already in memory.
 
-    return tokens
+    Args:
+        document (CoNLLUDocument): The CoNLL-U Plus document.
+
+    Returns:
+        tokens (list): A list of (token, ner_tag) tuples, as returned by `read_tokens_from_file`.
+    """
+    return [(token.form, token[-1]) for token in document.tokens()]
 
 
 def check_invalid_token_and_extract_sfx(token, ner_tag):
@@ -299,19 +301,38 @@ def process_and_update_ner_tags(input_path, output_path, entity_mapping, tokens)
         tokens = [("John", "B-PER"), ("Doe", "I-PER")]
         process_and_update_ner_tags(input_path, output_path, entity_mapping, tokens)
     """
+    output_document = update_ner_tags(CoNLLUDocument.read(input_path), entity_mapping, tokens)
+    output_document.write(output_path)
+
+
+def update_ner_tags(document, entity_mapping, tokens):
+    """
+    Add the entity tags to a CoNLL-U Plus document and return the result as a new document.
+
+    Args:
+        document (CoNLLUDocument): The CoNLL-U Plus document to be processed.
+        entity_mapping (dict): The entity mapping, as for `process_and_update_ner_tags`.
+        tokens (list): A list of tokens used for mapping, as returned by `read_tokens_from_document`.
+
+    Returns:
+        CoNLLUDocument: The processed document.
+    """
     new_ner_id = ""
     mapped_tokens = map_tokens(entity_mapping, tokens)
 
-    with open(input_path, "r", encoding="utf-8", errors="ignore") as input_file, open(output_path, "w", encoding="utf-8") as output_file:
-        ner_processor = NERProcessor(output_file, new_ner_id, mapped_tokens)
-        current_line = None
+    output_file = CoNLLUDocumentWriter()
+    ner_processor = NERProcessor(output_file, new_ner_id, mapped_tokens)
+    current_line = None
+    next_line = None
 
-        for next_line in input_file:
-            if current_line is not None:
-                process_line(current_line, next_line, ner_processor)
-            current_line = next_line
-
-        # Process the last line (if any) after the loop
+    for next_line in document.lines():
         if current_line is not None:
-            ner_processor.last_line = True
             process_line(current_line, next_line, ner_processor)
+        current_line = next_line
+
+    # Process the last line (if any) after the loop
+    if current_line is not None:
+        ner_processor.last_line = True
+        process_line(current_line, next_line, ner_processor)
+
+    return output_file.close()
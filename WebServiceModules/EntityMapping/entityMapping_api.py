@@ -4,10 +4,13 @@ from entityMapping_process import *
 from entityMapping_config import args
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
-from lib.saroj.input_data import get_input_data
-from lib.saroj.conllu_utils import is_file_conllu
+from lib.saroj.input_data import get_input_data, get_conllu_document, process_batch, write_conllu_output
 from lib.saroj.dictionary_helper import read_replacement_dictionary, count_instances_in_dict
 from lib.saroj.gunicorn import StandaloneApplication
+from lib.saroj.file_lock import file_lock
+from lib.saroj.memory import install_memory_debug, container_size
+from lib.saroj.metrics import install_metrics, timer
+from lib.saroj.profiling import install_profiling
 
 import sys, traceback
 
@@ -48,22 +51,44 @@ def anonymize_conllup():
     if not status:
         return error
 
+    return anonymize_job(data)
+
+
+@app.route('/process_batch', methods=['POST', 'GET'])
+def anonymize_conllup_batch():
+    """
+    Route to process many files in one call.
+
+    Expects a JSON list of jobs, each one with the keys of /process.
+
+    Returns:
+        JSON: The status of the batch and of each job (e.g., {'status': 'OK', 'message': '', 'jobs': [...]}).
+    """
+    return process_batch(["input", "output", "mapping"], anonymize_job)
+
+
+def anonymize_job(data):
+    """Replaces the entities of one file, `data` being the JSON object given to /process."""
     input_file = data["input"]
     output_file = data["output"]
     mapping_file = data["mapping"]
 
     if input_file == '':
         return jsonify({"status": "ERROR", "message": "No file selected."})
-    if not is_file_conllu(input_file):
-        return jsonify({"status": "ERROR", "message": "Input file is not conllup"})
+    status, document, error = get_conllu_document(input_file)
+    if not status:
+        return error
 
     if input_file:
         try:
             # Anonymize entities in the input file and write to the output file
             dicts = {"replacement": replacement_dict, "config": config_dict}
-            anonymize_entities(input_file, output_file, mapping_file, dicts)
+            # Other workers may update the same case map
+            with file_lock(mapping_file), timer("annotate"):
+                document = anonymize_document(document, mapping_file, dicts)
+            output = write_conllu_output(document, output_file)
 
-            return jsonify({"status": "OK", "message": ""})
+            return jsonify({"status": "OK", "message": "", **output})
         except Exception as e:
             traceback.print_exc(file=sys.stdout)
             return jsonify({"status": "ERROR", "message": str(e)})
@@ -121,7 +146,7 @@ if __name__ == '__main__':
 
     options = {
         'bind': '%s:%s' % ('127.0.0.1', args.PORT),
-        'workers': 1,
+        'workers': args.WORKERS,
     }
 
     # Read the replacement dictionary
@@ -130,5 +155,12 @@ if __name__ == '__main__':
     if args.CONFIG:
         config_dict = read_config_file(args.CONFIG)
 
+    install_metrics(app, "EntityMapping")
+    install_profiling(app)
+    install_memory_debug(app, "EntityMapping", {
+        "replacement_dict": lambda: {**container_size(replacement_dict),
+                                     "instances": count_instances_in_dict(replacement_dict)},
+        "config_dict": lambda: container_size(config_dict),
+    })
     #app.run(debug=True, port=args.PORT)
-    StandaloneApplication(app, options).run()
+    StandaloneApplication(app, options, worker_threads=args.THREADS).run()
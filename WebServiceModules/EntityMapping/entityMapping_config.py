@@ -7,6 +7,8 @@ def parse_command_line_args():
     parser.add_argument('--DICTIONARY', '-d', type=str, help='path for dictionary, mandatory')
     parser.add_argument('--REPLACEMENT', '-r', type=str, default="X", help='replacement pattern, by default is "X" ')
     parser.add_argument('--CONFIG', '-c', type=str, help='path for config file, mandatory')
+    parser.add_argument('--WORKERS', type=int, default=1, help='worker processes, each one handles a document at a time')
+    parser.add_argument('--THREADS', type=int, help='threads of the numeric libraries in each worker, default: cores / workers')
     return parser.parse_args()
 
 
@@ -6,6 +6,7 @@ from entityMapping_helpers import *
 sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 
 from lib.saroj.suffix_process import suffix_replace, VOID_NER
+from lib.saroj.conllu_document import CoNLLUDocument, CoNLLUDocumentWriter
 
 old_rep = ""
 extra_initials = False
@@ -38,23 +39,31 @@ def count_inst_entities(filename):
     - Entities labeled as 'O' (outside) are not counted.
     - If the file is empty or does not contain relevant content, an empty list is returned.
     """
+    return count_inst_entities_in_document(CoNLLUDocument.read(filename))
+
+
+def count_inst_entities_in_document(document):
+    """
+    Count instances of NER entities in a CoNLL-U Plus document that is already in memory.
+
+    Args:
+        document (CoNLLUDocument): The document containing NER entity annotations.
+
+    Returns:
+        list: The instance counts, as returned by `count_inst_entities`.
+    """
     result = []
     current_value = 0
 
-    with open(filename, 'r', encoding="utf-8", errors="ignore") as file:
-        lines = file.readlines()
-
-    for line in reversed(lines):
-        if line.startswith("#") or not line.strip():
-            continue
-        columns = line.strip().split('\t')
-        if columns[LAST_TOKEN] in VOID_NER:
+    for token_index in reversed(range(len(document))):
+        token = document.token(token_index)
+        if token[LAST_TOKEN] in VOID_NER:
             current_value = 0
             continue
-        if columns[-2].startswith("I-"):
+        if token[NER].startswith("I-"):
             current_value += 1
             result.append(current_value)
-        elif columns[-2].startswith("B-"):
+        elif token[NER].startswith("B-"):
             result.append(current_value + 1)
             current_value = 0
         else:
@@ -392,41 +401,57 @@ def anonymize_entities(input_file, output_file, mapping_file, dicts):
     - The `mapping_file` contains predefined entity-to-replacement mappings.
     - The `dicts['replacement']` is a dictionary of replacement options for entities not found already in the mapping file.
     """
+    output_document = anonymize_document(CoNLLUDocument.read(input_file), mapping_file, dicts)
+    output_document.write(output_file)
+
+
+def anonymize_document(document, mapping_file, dicts):
+    """
+    Anonymize NER entities in a CoNLL-U Plus document that is already in memory.
+
+    Args:
+        document (CoNLLUDocument): The document containing NER entities.
+        mapping_file (str): The path to the file containing entity-to-replacement mappings.
+        dicts (dict): A dictionary containing additional configuration and replacement options.
+
+    Returns:
+        CoNLLUDocument: The anonymized document, with the replacement column added.
+    """
     global counter_inst
     global initials_mappings
-    # Count the instances of each entity in the input file
-    counter_inst_list = count_inst_entities(input_file)
-
-    # Open the input and output files
-    with open(input_file, 'r', encoding="utf-8", errors="ignore") as input_f, open(output_file, 'w',
-                                                                                   encoding="utf-8") as output_f:
-        # Process each line in the input file
-        for line in input_f:
-            # Preprocess the line to extract the columns and token information
-            columns, token_info = preprocess_line(line)
-
-            # If there is no token information, write the line to the output file as is
-            if token_info is None:
-                output_f.write(line)
-                continue
-
-            # Get the next counter instance from the list
-            counter_inst = counter_inst_list.pop()
-
-            # Extract the NER ID and potential suffix, and the NER instance from the token information
-            ner_id_and_potential_suffix, token_tpl = token_info
-            ner_inst = token_tpl[FIRST_TOKEN]
-
-            # Search for a replacement for the NER ID in the mapping file
-            replacement = search_mapping_file(mapping_file, hashtag_ner(ner_id_and_potential_suffix))
-
-            # If a replacement was found, process it and write it to the output file
-            if replacement and not extra_initials:
-                replacement = process_already_mapped_replacement(replacement, ner_inst, ner_id_and_potential_suffix,
-                                                                 dicts["config"])
-            else:
-                replacement = process_entity(token_tpl, ner_id_and_potential_suffix, mapping_file, dicts)
-
-            columns.append(replacement)
-            write_output_columns(output_f, columns)
-            initials_mappings.clear()
+    # Count the instances of each entity in the input document
+    counter_inst_list = count_inst_entities_in_document(document)
+    output_f = CoNLLUDocumentWriter()
+
+    # Process each line in the input
+    for line in document.lines():
+        # Preprocess the line to extract the columns and token information
+        columns, token_info = preprocess_line(line)
+
+        # If there is no token information, write the line to the output file as is
+        if token_info is None:
+            output_f.write(line)
+            continue
+
+        # Get the next counter instance from the list
+        counter_inst = counter_inst_list.pop()
+
+        # Extract the NER ID and potential suffix, and the NER instance from the token information
+        ner_id_and_potential_suffix, token_tpl = token_info
+        ner_inst = token_tpl[FIRST_TOKEN]
+
+        # Search for a replacement for the NER ID in the mapping file
+        replacement = search_mapping_file(mapping_file, hashtag_ner(ner_id_and_potential_suffix))
+
+        # If a replacement was found, process it and write it to the output file
+        if replacement and not extra_initials:
+            replacement = process_already_mapped_replacement(replacement, ner_inst, ner_id_and_potential_suffix,
+                                                             dicts["config"])
+        else:
+            replacement = process_entity(token_tpl, ner_id_and_potential_suffix, mapping_file, dicts)
+
+        columns.append(replacement)
+        write_output_columns(output_f, columns)
+        initials_mappings.clear()
+
+    return output_f.close()
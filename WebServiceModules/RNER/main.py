@@ -10,6 +10,7 @@ import logging
 import os
 import random
 import sys
+import traceback
 
 import numpy as np
 import torch
@@ -313,6 +314,16 @@ def main():
     if args.server:
         from flask import Flask,request,jsonify
 
+        sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+        from lib.saroj.stage_cache import open_stage_cache
+        from lib.saroj.input_data import process_batch, is_inline, FileTransport, get_conllu_document, get_job_status
+        from lib.saroj.memory import install_memory_debug, model_size
+        from lib.saroj.metrics import install_metrics, timer
+        from lib.saroj.profiling import install_profiling
+
+        stage_cache = open_stage_cache(args.stage_cache_dir, "RNER", os.path.dirname(os.path.realpath(__file__)),
+                                       [args.output_dir], args.stage_cache_size)
+
         app = Flask(__name__)
 
         @app.route("/api/v1.0/ner", methods=["GET","POST"])
@@ -400,22 +411,7 @@ def main():
             """
             return jsonify({"status": "OK", "message": ""})
 
-        @app.route("/process", methods=["GET","POST"])
-        def ner_process():
-            status, data, error = get_input_data(["input","output"])
-            if not status: return error
-
-            input_file = data["input"]
-            output_file = data["output"]
-
-            r = create_features_from_conllup(input_file, label_list, args.max_seq_length, model.encode_word)
-            eval_features=r['features']
-            conllup=r['conllup']
-            eval_data = create_dataset(eval_features)
-            prediction = predict_model(model, eval_data, label_list, args.predict_batch_size, device, True)
-            
-            #print(prediction)
-
+        def write_prediction(conllup, prediction, output_file):
             with open(output_file,"w") as fout:
                 lastTokenId=0
                 forceStop=False
@@ -439,9 +435,98 @@ def main():
                         fout.write("{}\t{}\n".format(conllup[lastTokenId],label))
                         lastTokenId+=1
 
-            return jsonify({'status':'OK','message':''})
+        def check_input_file(input_file):
+            """Returns the error response if `input_file` cannot be annotated, else None."""
+            if not input_file:
+                return jsonify({"status": "ERROR", "message": "No file selected."})
+            if not is_inline(input_file) and not os.path.isfile(input_file):
+                return jsonify({"status": "ERROR", "message": "Input file does not exist on the local storage."})
+            return None
+
+        def ner_jobs(jobs):
+            """Annotates the documents of several jobs with a single pass of the model over
+            their features, so the last batch of a document is filled with the next one.
+            Documents sent in the request go through temporary files. The inputs are checked
+            before the batch is made, an invalid or failing job does not fail the others."""
+            results = [None] * len(jobs)
+            pending = []
+
+            with FileTransport() as transport:
+                for i, data in enumerate(jobs):
+                    try:
+                        error = check_input_file(data["input"])
+                        if error is None:
+                            status, _, error = get_conllu_document(data["input"])
+                        if error is not None:
+                            results[i] = get_job_status(error)
+                            continue
+
+                        inline = is_inline(data["input"]) or is_inline(data["output"])
+                        input_file = transport.input(data["input"], "input-{}.conllu".format(i), conllu=True)
+                        output_file = transport.output(data["output"], "output-{}.conllu".format(i))
+
+                        cache_key = None
+                        if stage_cache is not None and not inline:
+                            cache_key = stage_cache.key([input_file], {"max_seq_length": args.max_seq_length, "labels": args.labels})
+                            if stage_cache.get(cache_key, output_file):
+                                results[i] = {'status':'OK','message':''}
+                                continue
+
+                        with timer("parse"):
+                            r = create_features_from_conllup(input_file, label_list, args.max_seq_length, model.encode_word)
+                        pending.append((i, output_file, cache_key, r['features'], r['conllup']))
+                    except Exception as e:
+                        traceback.print_exc(file=sys.stdout)
+                        results[i] = {'status':'ERROR','message':str(e)}
+
+                eval_features = [f for p in pending for f in p[3]]
+                prediction = []
+                if len(eval_features) > 0:
+                    with timer("annotate"):
+                        eval_data = create_dataset(eval_features)
+                        prediction = predict_model(model, eval_data, label_list, args.predict_batch_size, device, True)
+
+                # One prediction per feature, in order
+                offset = 0
+                for i, output_file, cache_key, features, conllup in pending:
+                    try:
+                        with timer("write"):
+                            write_prediction(conllup, prediction[offset:offset + len(features)], output_file)
+
+                        if cache_key is not None:
+                            stage_cache.put(cache_key, output_file)
+
+                        results[i] = {'status':'OK','message':''}
+                        results[i].update(transport.output_fields(jobs[i]["output"], output_file, conllu=True))
+                    except Exception as e:
+                        traceback.print_exc(file=sys.stdout)
+                        results[i] = {'status':'ERROR','message':str(e)}
+                    offset += len(features)
+
+            return results
+
+        @app.route("/process", methods=["GET","POST"])
+        def ner_process():
+            status, data, error = get_input_data(["input","output"])
+            if not status: return error
+
+            return jsonify(ner_jobs([data])[0])
+
+        @app.route("/process_batch", methods=["GET","POST"])
+        def ner_process_batch():
+            """
+            Route to process many files in one call, expects a JSON list of jobs,
+            each one with the keys of /process.
+
+            Returns:
+                JSON: The status of the batch and of each job (e.g., {'status': 'OK', 'message': '', 'jobs': [...]}).
+            """
+            return process_batch(["input","output"], process_jobs=ner_jobs)
 
 
+        install_metrics(app, "RNER")
+        install_profiling(app)
+        install_memory_debug(app, "RNER", {"model": lambda: model_size(model)})
         app.run(threaded=False, debug=False, host="127.0.0.1", port=args.server_port)
         #options = {
         #    'bind': '%s:%s' % ('127.0.0.1', args.server_port),
@@ -172,6 +172,14 @@ def add_xlmr_args(parser):
                          type=int, default=5111,
                          help="Port for running the server")
 
+     parser.add_argument('--stage_cache_dir',
+                         type=str, default=None,
+                         help="Folder to cache the /process output files in, by the hash of the input file")
+
+     parser.add_argument('--stage_cache_size',
+                         type=int, default=1024,
+                         help="Maximum size of the stage cache, in MB")
+
      parser.add_argument('--lang',
                          default="ro",
                          help="Language used for parsing raw text (only if tokenized input is not available)")
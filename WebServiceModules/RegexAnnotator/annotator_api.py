@@ -3,10 +3,14 @@ import sys, traceback
 import argparse
 from flask import Flask, jsonify
 from annotator import RegExAnnotator
+from nerregex import ro_cities
 sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 from lib.saroj.gunicorn import StandaloneApplication
-from lib.saroj.input_data import get_input_data
-from lib.saroj.conllu_utils import is_file_conllu
+from lib.saroj.input_data import get_input_data, get_conllu_document, process_batch, is_inline, write_conllu_output
+from lib.saroj.stage_cache import open_stage_cache
+from lib.saroj.memory import install_memory_debug, container_size
+from lib.saroj.metrics import install_metrics, timer
+from lib.saroj.profiling import install_profiling
 
 
 app = Flask(__name__)
@@ -31,22 +35,86 @@ def annotate_conllu():
         return error
     # end if
 
+    return annotate_job(data)
+
+
+@app.route('/process_batch', methods=['POST', 'GET'])
+def annotate_conllu_batch():
+    """
+    Route to annotate many files in one call.
+
+    Expects a JSON list of jobs, e.g. `[{'input': 'documents/test-1.out', 'output': 'documents/test-1.ner'}, ...]`.
+
+    Returns:
+        JSON: The status of the batch and of each job (e.g., `{'status': 'OK', 'message': '', 'jobs': [...]}`).
+    """
+
+    return process_batch(['input', 'output'], annotate_job)
+
+
+def annotate_job(data: dict):
+    """Annotates one file, `data` being the JSON object given to `/process`."""
+
     input_file = data['input']
     output_file = data['output']
 
+    # Documents sent in the request are not cached and not streamed
+    inline = is_inline(input_file) or is_inline(output_file)
+
     if not input_file:
         return jsonify({'status': 'ERROR', 'message': 'No file selected.'})
-    elif not os.path.isfile(input_file):
+    elif not is_inline(input_file) and not os.path.isfile(input_file):
         return jsonify({'status': 'ERROR',
                         'message': 'Input file does not exist on the local storage.'})
-    elif not is_file_conllu(input_file):
-        return jsonify({'status': 'ERROR',
-                        'message': 'Input file is not a (valid) CoNLL-U file.'})
+    # end if
+
+    cache_key = None
+
+    if cache is not None and not inline:
+        cache_key = cache.key([input_file])
+
+        if cache.get(cache_key, output_file):
+            return jsonify({'status': 'OK', 'message': output_file})
+        # end if
+    # end if
+
+    if args.STREAMING and not inline:
+        # The input is checked while it is annotated, one sentence at a time
+        document = None
+    else:
+        # Checks and parses the input, in one read
+        status, document, error = get_conllu_document(input_file)
+
+        if not status:
+            return error
+        # end if
     # end if
 
     try:
-        ann = RegExAnnotator(input_file)
-        ann.annotate(output_file)
+        if inline:
+            ann = RegExAnnotator(document=document, workers=args.PROCESSES)
+
+            with timer('annotate'):
+                document = ann.annotate_document()
+            # end with
+
+            output = write_conllu_output(document, output_file)
+
+            return jsonify({'status': 'OK', 'message': '', **output})
+        # end if
+
+        ann = RegExAnnotator(input_file, document=document, streaming=args.STREAMING,
+                             workers=args.PROCESSES)
+
+        # Writes the output as well
+        with timer('annotate'):
+            ann.annotate(output_file)
+        # end with
+
+        if cache_key is not None:
+            cache.put(cache_key, output_file)
+        # end if
+
         return jsonify({'status': 'OK', 'message': output_file})
     except Exception as e:
         traceback.print_exc(file=sys.stdout)
@@ -69,13 +137,28 @@ def check_health():
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('PORT', type=int, help='port to listen for requests')
+    parser.add_argument('--STREAMING', action='store_true',
+                        help='annotate one sentence at a time, memory does not grow with the document size')
+    parser.add_argument('--PROCESSES', type=int, default=1,
+                        help='annotate large documents with this many processes, in chunks of sentences')
+    parser.add_argument('--CACHE_DIR', type=str, default=None,
+                        help='folder to cache the annotated files in, by the hash of the input file')
+    parser.add_argument('--CACHE_SIZE', type=int, default=1024, help='maximum size of the cache, in MB')
+    parser.add_argument('--WORKERS', type=int, default=1, help='worker processes, each one handles a document at a time')
+    parser.add_argument('--THREADS', type=int, help='threads of the numeric libraries in each worker, default: cores / workers')
     args = parser.parse_args()
+    module_dir = os.path.dirname(os.path.realpath(__file__))
+    cache = open_stage_cache(args.CACHE_DIR, 'RegexAnnotator', module_dir,
+                             [os.path.join(module_dir, 'data')], args.CACHE_SIZE)
 
     options = {
         'bind': f'127.0.0.1:{args.PORT}',
-        'workers': 1,
+        'workers': args.WORKERS,
     }
 
-    StandaloneApplication(app, options).run()
+    install_metrics(app, 'RegexAnnotator')
+    install_profiling(app)
+    install_memory_debug(app, 'RegexAnnotator', {'ro_cities': lambda: container_size(ro_cities)})
+    StandaloneApplication(app, options, worker_threads=args.THREADS).run()
     # This is for Windows debug testing only.
     #app.run(host='127.0.0.1', port=args.PORT)
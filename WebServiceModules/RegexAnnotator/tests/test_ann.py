@@ -1,6 +1,8 @@
 import os
+import pytest
 from annotator import RegExAnnotator
-from lib.saroj.conllu_utils import read_conllu_file
+from lib.saroj.conllu_utils import read_conllu_file, parse_conllu_lines, CoNLLUError, SentenceOffsets
+from lib.saroj.conllu_document import CoNLLUDocument
 
 def test_one():
     in_file = os.path.join('documents', 'test-1.out')
@@ -35,3 +37,107 @@ def test_one():
     assert out_lines[8][55][-1] == 'B-LOC'
     assert out_lines[13][0][-1] == 'B-INITIALS'
     assert out_lines[14][0][-1] == 'B-INITIALS'
+
+
+def test_invalid_conllu():
+    lines = ['# sent_id = 1\n', '1\tCod\t_\n', '3\tECLI\t_\n', '\n']
+
+    with pytest.raises(CoNLLUError) as e:
+        parse_conllu_lines(lines)
+    # end with
+
+    assert e.value.line_number == 3
+    assert str(e.value) == 'ids not consecutive in line 3'
+
+
+def test_streaming(tmp_path):
+    in_file = os.path.join('documents', 'test-1.out')
+    out_file = str(tmp_path / 'test-1.stream.ner')
+
+    RegExAnnotator(input_file=in_file, streaming=True).annotate(output_file=out_file)
+
+    with open(os.path.join('documents', 'test-1.ner'), mode='r', encoding='utf-8') as f:
+        expected = f.read()
+    # end with
+
+    with open(out_file, mode='r', encoding='utf-8') as f:
+        assert f.read() == expected
+    # end with
+
+
+def test_token_range():
+    # 'Str. Mihai Eminescu nr. 12, Craiova'
+    offsets = SentenceOffsets(['Str. ', 'Mihai ', 'Eminescu ', 'nr. ', '12', ', ', 'Craiova '])
+
+    assert offsets.token_range((5, 19)) == (1, 3)
+    assert offsets.token_range((7, 8)) == (1, 2)
+    assert offsets.token_range((0, 26)) == (0, 5)
+    assert offsets.token_range((26, 27)) == (5, 6)
+    assert offsets.token_range((40, 45)) is None
+
+
+def test_text_from_offsets():
+    # S.C. „Alfa” (SRL), with START and END offsets in columns 11 and 12
+    tokens = [('S.C.', 0, 4), ('„', 5, 6), ('Alfa', 6, 10), ('”', 10, 11), ('(', 12, 13), ('SRL', 13, 16), (')', 16, 17)]
+    lines = [f'{i + 1}\t{form}\t_\t_\t_\t_\t_\t_\t_\t_\t{start}\t{end}\n'
+             for i, (form, start, end) in enumerate(tokens)]
+    ann = RegExAnnotator(document=parse_conllu_lines(lines))
+    words = ann._get_text_from_conllu_sentence(ann.document.sentence(0))
+
+    assert ''.join(words) == 'S.C. „Alfa” (SRL) '
+    assert len(words) == len(tokens)
+
+    # Without the offset columns, the heuristics are used
+    lines = [f'{i + 1}\t{form}\t_\n' for i, (form, _, _) in enumerate(tokens)]
+    ann = RegExAnnotator(document=parse_conllu_lines(lines))
+    words = ann._get_text_from_conllu_sentence(ann.document.sentence(0))
+
+    assert ''.join(words) == 'S.C. „ Alfa ” (SRL) '
+
+
+def test_parallel(tmp_path):
+    in_file = os.path.join('documents', 'test-1.out')
+    out_file = str(tmp_path / 'test-1.parallel.ner')
+
+    ann = RegExAnnotator(input_file=in_file, workers=2)
+    # Small chunks, so that the look-back context crosses chunk boundaries
+    ann.chunk_size = 4
+    ann.annotate(output_file=out_file)
+
+    with open(os.path.join('documents', 'test-1.ner'), mode='r', encoding='utf-8') as f:
+        expected = f.read()
+    # end with
+
+    with open(out_file, mode='r', encoding='utf-8') as f:
+        assert f.read() == expected
+    # end with
+
+
+def test_annotations_computed_beforehand():
+    in_file = os.path.join('documents', 'test-1.out')
+    expected = list(RegExAnnotator(input_file=in_file).annotate_document().lines())
+
+    # As a batch annotator would do it, for all the sentences at once
+    ann = RegExAnnotator(input_file=in_file)
+    annotations = []
+
+    for text in ann.sentence_texts():
+        annotations.append(ann.provide_annotations(text))
+        ann._previous_sentences.append(text)
+    # end for
+
+    assert list(ann.annotate_document_with(annotations).lines()) == expected
+
+
+def test_binary_document():
+    in_file = os.path.join('documents', 'test-1.out')
+    document = RegExAnnotator(input_file=in_file).annotate_document()
+    data = document.to_bytes()
+    copy = CoNLLUDocument.from_bytes(data)
+
+    assert list(copy.lines()) == list(document.lines())
+    assert len(data) < os.path.getsize(in_file) // 2
+
+    with pytest.raises(ValueError):
+        CoNLLUDocument.from_bytes(b'CNLU' + data[8:])
+    # end with
@@ -1,16 +1,23 @@
+import os
+import sys, traceback
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from lib.saroj.gunicorn import StandaloneApplication, limit_threads_from_argv
+# Before spaCy and numpy are loaded, see limit_threads_from_argv()
+limit_threads_from_argv()
+
 import ufal.udpipe as ud
 from flask import Flask, jsonify
 import spacy
 
-from textExtractor_process import docx_to_conllup
+from textExtractor_process import docx_to_conllup, docx_to_conllup_text
 from textExtractor_helpers import allowed_file, create_replacement_regex
 from textExtractor_config import args
 
-import os
-import sys, traceback
-sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
-from lib.saroj.gunicorn import StandaloneApplication
-from lib.saroj.input_data import get_input_data
+from lib.saroj.memory import install_memory_debug, container_size
+from lib.saroj.metrics import install_metrics
+from lib.saroj.profiling import install_profiling
+from lib.saroj.input_data import get_input_data, process_batch, is_inline, encode_conllu_text, FileTransport
+from lib.saroj.stage_cache import open_stage_cache
 
 app = Flask(__name__)
 
@@ -25,12 +32,30 @@ def convert_docx_to_conllu():
     Returns:
         JSON: A response containing status and message (e.g., {'status': 'OK', 'message': 'output_file.conllup'}).
     """
-    if args.RUN_ANALYSIS and token_model is None:
-        return jsonify({"status": "ERROR", "message": "UDPipe model not loaded."})
-
     status, data, error = get_input_data(["input","output"])
     if not status: return error
 
+    return convert_job(data)
+
+
+@app.route('/process_batch', methods=['POST', 'GET'])
+def convert_docx_to_conllu_batch():
+    """
+    Route to convert many documents in one call.
+
+    Expects a JSON list of jobs, each one with the keys of /process.
+
+    Returns:
+        JSON: The status of the batch and of each job (e.g., {'status': 'OK', 'message': '', 'jobs': [...]}).
+    """
+    return process_batch(["input","output"], convert_job)
+
+
+def convert_job(data):
+    """Converts one document, `data` being the JSON object given to /process."""
+    if args.RUN_ANALYSIS and token_model is None:
+        return jsonify({"status": "ERROR", "message": "UDPipe model not loaded."})
+
     input_file = data["input"]
     output_file = data["output"]
     input_type="docx"
@@ -41,12 +66,25 @@ def convert_docx_to_conllu():
 
     if input_file == '':
         return jsonify({"status": "ERROR", "message": "No file selected."})
-    if input_type == "docx" and not allowed_file(input_file):
+    if input_type == "docx" and not is_inline(input_file) and not allowed_file(input_file):
         return jsonify({"status": "ERROR", "message": "Invalid file format."})
 
     if input_file:
         try:
+            if is_inline(input_file) or is_inline(output_file):
+                return convert_inline(input_file, output_file, input_type)
+
+            cache_key = None
+            if cache is not None:
+                cache_key = cache.key([input_file], {"type": input_type, "analysis": args.RUN_ANALYSIS,
+                                                     "dtw": args.dtw, "align2": args.align2})
+                if cache.get(cache_key, output_file):
+                    return jsonify({"status": "OK", "message": output_file})
+
             docx_to_conllup(token_model, input_file, output_file, regex, replacements, input_type, args.dtw, args.align2)
+
+            if cache_key is not None:
+                cache.put(cache_key, output_file)
             return jsonify({"status": "OK", "message": output_file})
         except Exception as e:
             traceback.print_exc(file=sys.stdout)
@@ -55,6 +93,22 @@ def convert_docx_to_conllu():
     return jsonify({"status": "ERROR", "message": "Invalid file format or other error occurred."})
 
 
+def convert_inline(input_file, output_file, input_type):
+    """Converts a document sent in the request, or returns the CoNLL-U output in the response.
+    The readers need a file, so an inline input goes through a temporary file."""
+    with FileTransport() as transport:
+        docx_file = transport.input(input_file, "input." + input_type)
+
+        if not is_inline(output_file):
+            docx_to_conllup(token_model, docx_file, output_file, regex, replacements, input_type, args.dtw, args.align2)
+            return jsonify({"status": "OK", "message": output_file})
+
+        # The internal files, if saved, go next to the input
+        conllup_text = docx_to_conllup_text(token_model, docx_file, docx_file, regex, replacements, input_type,
+                                            args.dtw, args.align2)
+        return jsonify({"status": "OK", "message": "", **encode_conllu_text(conllup_text, output_file)})
+
+
 @app.route('/checkHealth', methods=['GET','POST'])
 def check_health():
     """
@@ -79,10 +133,15 @@ if __name__ == '__main__':
         token_model = spacy.load("ro_core_news_sm")
 
     regex, replacements = create_replacement_regex()
+    cache = open_stage_cache(args.CACHE_DIR, "TextExtractor", os.path.dirname(os.path.realpath(__file__)),
+                             [args.udpipe_model] if args.udpipe_model else [], args.CACHE_SIZE)
     
     options = {
         'bind': '%s:%s' % ('127.0.0.1', args.PORT),
-        'workers': 1,
+        'workers': args.WORKERS,
     }
-    StandaloneApplication(app, options).run()
+    install_metrics(app, "TextExtractor")
+    install_profiling(app)
+    install_memory_debug(app, "TextExtractor", {"replacements": lambda: container_size(replacements)})
+    StandaloneApplication(app, options, worker_threads=args.THREADS).run()
     #app.run(debug=True, port=args.PORT)
@@ -11,6 +11,10 @@ def parse_command_line_args():
     parser.add_argument("--udpipe_model", type=str, help="Path to the UDPipe model file.")
     parser.add_argument("--dtw", '-d', action='store_true', help="Use DTW for token matching.")
     parser.add_argument("--align2", '-a2', action='store_true', help="Use text alignment 2 for token matching.")
+    parser.add_argument("--CACHE_DIR", type=str, help="Folder to cache the outputs in, by the hash of the input file.")
+    parser.add_argument("--CACHE_SIZE", type=int, default=1024, help="Maximum size of the cache, in MB.")
+    parser.add_argument("--WORKERS", type=int, default=1, help="Worker processes, each one handles a document at a time.")
+    parser.add_argument("--THREADS", type=int, help="Threads of the numeric libraries in each worker, default: cores / workers.")
     return parser.parse_args()
 
 
@@ -1,4 +1,5 @@
 import os
+import sys
 import zipfile
 
 import ufal.udpipe as ud
@@ -12,6 +13,9 @@ from xml.sax.saxutils import escape
 from fasterdtw import fastdtw
 import Levenshtein
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from lib.saroj.metrics import timer
+
 
 def process_text_with_udpipe(udpipe_model, text):
     """
@@ -454,7 +458,31 @@ def docx_to_conllup(model, docx_file, output_file, regex, replacements, input_ty
         Exception: If an error occurs while processing text with UDPipe (when run_analysis is True).
 
     """
-    words = get_words_with_positions(docx_file, input_type)
+    conllup_text = docx_to_conllup_text(model, docx_file, output_file, regex, replacements, input_type, use_dtw,
+                                        use_align2)
+
+    # Save the CONLL-U formatted text to the output file
+    with timer("write"), open(output_file, "w", encoding="utf-8") as f:
+        f.write(conllup_text)
+    return output_file
+
+
+def docx_to_conllup_text(model, docx_file, output_file, regex, replacements, input_type, use_dtw, use_align2):
+    """
+    Convert a .docx file to CONLL-U formatted text, without writing it to disk.
+
+    Args:
+        model (str/spacy): The UDPipe or spaCy model, as for `docx_to_conllup`.
+        docx_file (str): The path to the input .docx file.
+        output_file (str): The path of the CONLL-U output; only used to name the internal files.
+        regex (str): The regular expression pattern for text normalization.
+        replacements (dict): A dictionary of replacement patterns for text normalization.
+
+    Returns:
+        str: The CONLL-U formatted text.
+    """
+    with timer("read"):
+        words = get_words_with_positions(docx_file, input_type)
     # normalize words
     normalized_words = [(normalize_text(word[0], regex, replacements), word[1], word[2]) for word in words]
     normalized_text = "".join(str(word[0]) for word in normalized_words)
@@ -464,16 +492,17 @@ def docx_to_conllup(model, docx_file, output_file, regex, replacements, input_ty
         save_log(words, filename)
     if args.RUN_ANALYSIS:
         # Process the text using UDPipe
-        token_list, error = process_text_with_udpipe(model, normalized_text)
+        with timer("analysis"):
+            token_list, error = process_text_with_udpipe(model, normalized_text)
         if error:
             raise Exception("Error occurred while processing text with UDPipe.")
-        conllup_text = udpipe_token_to_conllup(token_list, normalized_words, use_dtw, use_align2)
+        with timer("align"):
+            conllup_text = udpipe_token_to_conllup(token_list, normalized_words, use_dtw, use_align2)
     else:
          # Process the text using Spacy
-        spacy_model_output = model(normalized_text)
-        conllup_text = spacy_token_to_conllup(spacy_model_output, normalized_words, use_dtw, use_align2)
+        with timer("analysis"):
+            spacy_model_output = model(normalized_text)
+        with timer("align"):
+            conllup_text = spacy_token_to_conllup(spacy_model_output, normalized_words, use_dtw, use_align2)
 
-    # Save the CONLL-U formatted text to the output file
-    with open(output_file, "w", encoding="utf-8") as f:
-        f.write(conllup_text)
-    return output_file
+    return conllup_text
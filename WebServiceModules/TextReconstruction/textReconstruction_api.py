@@ -3,11 +3,14 @@ import os
 import sys, traceback
 
 from flask import Flask, jsonify
-from textReconstruction_process import anonymize, read_conllup
+from textReconstruction_process import anonymize, read_conllup, check_conllup
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
-from lib.saroj.input_data import get_input_data
+from lib.saroj.input_data import get_input_data, process_batch, is_inline, read_conllu_content, FileTransport
 from lib.saroj.gunicorn import StandaloneApplication
+from lib.saroj.memory import install_memory_debug
+from lib.saroj.metrics import install_metrics, timer
+from lib.saroj.profiling import install_profiling
 
 app = Flask(__name__)
 
@@ -26,6 +29,24 @@ def anonymize_docx():
     status, data, error = get_input_data(["input", "output", "original"])
     if not status: return error
 
+    return reconstruct_job(data)
+
+
+@app.route('/process_batch', methods=['POST', 'GET'])
+def anonymize_docx_batch():
+    """
+    Route to process many files in one call.
+
+    Expects a JSON list of jobs, each one with the keys of /process.
+
+    Returns:
+        JSON: The status of the batch and of each job (e.g., {'status': 'OK', 'message': '', 'jobs': [...]}).
+    """
+    return process_batch(["input", "output", "original"], reconstruct_job)
+
+
+def reconstruct_job(data):
+    """Writes one anonymized document, `data` being the JSON object given to /process."""
     input_file = data["input"]
     output_docx_path = data["output"]
     original_docx_path = data["original"]
@@ -41,9 +62,22 @@ def anonymize_docx():
 
     if input_file:
         try:
-            conllup_data = read_conllup(input_file)
-            anonymize(conllup_data, original_docx_path, output_docx_path, args.SAVE_INTERNAL_FILES, input_type)
-            return jsonify({"status": "OK", "message": ""})
+            with timer("parse"):
+                if is_inline(input_file):
+                    conllup_data = check_conllup(read_conllu_content(input_file))
+                else:
+                    conllup_data = read_conllup(input_file)
+
+            # The original document is unzipped, so an inline one goes through a temporary file
+            with FileTransport() as transport:
+                original_path = transport.input(original_docx_path, "original." + input_type)
+                output_path = transport.output(output_docx_path, "output." + input_type)
+                # Writes the output as well
+                with timer("annotate"):
+                    anonymize(conllup_data, original_path, output_path, args.SAVE_INTERNAL_FILES, input_type)
+                output = transport.output_fields(output_docx_path, output_path)
+
+            return jsonify({"status": "OK", "message": "", **output})
         except Exception as e:
             traceback.print_exc(file=sys.stdout)
             return jsonify({"status": "ERROR", "message": str(e)})
@@ -67,13 +101,18 @@ if __name__ == '__main__':
     parser.add_argument('PORT', type=int, help='Port to listen for requests')
     parser.add_argument('--SAVE_INTERNAL_FILES', '-s', action='store_true',
                         help='if present, will save internal files, useful for debugging')
+    parser.add_argument('--WORKERS', type=int, default=1, help='worker processes, each one handles a document at a time')
+    parser.add_argument('--THREADS', type=int, help='threads of the numeric libraries in each worker, default: cores / workers')
     args = parser.parse_args()
 
     token_model = None
 
     options = {
         'bind': '%s:%s' % ('127.0.0.1', args.PORT),
-        'workers': 1,
+        'workers': args.WORKERS,
     }
+    install_metrics(app, "TextReconstruction")
+    install_profiling(app)
+    install_memory_debug(app, "TextReconstruction")
     #app.run(debug=True, port=args.PORT)
-    StandaloneApplication(app, options).run()
+    StandaloneApplication(app, options, worker_threads=args.THREADS).run()
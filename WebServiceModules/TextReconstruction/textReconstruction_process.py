@@ -3,52 +3,30 @@ import re
 import shutil
 import tempfile
 import zipfile
+import sys
 from xml.sax.saxutils import escape
 import traceback
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from lib.saroj.conllu_document import CoNLLUDocument, START, END
+
+ANONYMIZED = -1
+
 def read_conllup(conllup_file):
-    # Initialize an empty list to store the CONLLUP data as dictionaries
-    conllup_data = []
-
-    # Open the CONLLUP file for reading
-    with open(conllup_file, "r", encoding="utf-8", errors="ignore") as file:
-        for line in file:
-            # Skip empty lines and lines starting with "#" (comments)
-            if not line.strip() or line.startswith("#"):
-                continue
+    # Read the CONLLUP file as a compact document, one row per token
+    return check_conllup(CoNLLUDocument.read(conllup_file))
+
+
+def check_conllup(conllup_doc):
+    # Ensure that every token has at least 14 fields (assuming NER and ANONYMIZED are present)
+    for token in conllup_doc.tokens():
+        if len(token) < 14:
+            raise ValueError("ConLLU-P missing a column")
+
+    return conllup_doc
+
 
-            # Split the line into fields
-            fields = [token.strip() for token in re.split(r'(\t|  {2})', line) if token.strip()]
-
-            # Ensure that the line contains at least 14 fields (assuming NER and ANONYMIZED are present)
-            if len(fields) < 14:
-                raise ValueError("ConLLU-P missing a column")
-
-            # Create a dictionary for the token's features
-            token_data = {
-                "ID": fields[0],
-                "FORM": fields[1],
-                "LEMMA": fields[2],
-                "UPOS": fields[3],
-                "XPOS": fields[4],
-                "FEATS": fields[5],
-                "HEAD": fields[6],
-                "DEPREL": fields[7],
-                "DEPS": fields[8],
-                "MISC": fields[9],
-                "START": fields[10],
-                "END": fields[11],
-                "NER": fields[12],
-                "ANONYMIZED": fields[-1]  # always last column
-            }
-
-            # Append the token's dictionary to the list
-            conllup_data.append(token_data)
-
-    return conllup_data
-
-
-def anonymize(conllup_list, input_path, output_path, save_internal_files=False, input_type="docx"):
+def anonymize(conllup_doc, input_path, output_path, save_internal_files=False, input_type="docx"):
     # Create a unique temporary file to extract the DOCX content
     temp_file_path = tempfile.mkdtemp(dir='.')
     delta_t = 0
@@ -75,10 +53,11 @@ def anonymize(conllup_list, input_path, output_path, save_internal_files=False,
             docx_content+="</d>"
             docx_content=docx_content.encode("utf-8")
 
-        filtered_conllup_list = [row for row in conllup_list if row["ANONYMIZED"] != "_"]
+        # ANONYMIZED is always the last column
+        filtered_conllup_list = [row for row in conllup_doc.tokens() if row[ANONYMIZED] != "_"]
         for row in filtered_conllup_list:
-            start = int(row["START"])
-            end = int(row["END"])
+            start = int(row[START])
+            end = int(row[END])
 
             # Skip the current row if its start offset is not bigger than the previous one
             # keep the previous anonymization for this position
@@ -90,7 +69,7 @@ def anonymize(conllup_list, input_path, output_path, save_internal_files=False,
             #    start-=1
             #    end-=1
 
-            anonym = row["ANONYMIZED"].encode("utf-8")
+            anonym = row[ANONYMIZED].encode("utf-8")
 
             if anonym == "!DELETE!".encode("utf-8"):
                 docx_content = docx_content[:start + delta_t] + docx_content[end + delta_t:]
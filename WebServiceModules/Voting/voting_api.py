@@ -3,11 +3,14 @@ import sys, traceback
 from flask import Flask, jsonify
 
 from voting_config import *
-from voting_process import vote
+from voting_process import vote_rows, vote_documents, write_conll_file
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
-from lib.saroj.input_data import get_input_data, are_files_conllu
+from lib.saroj.input_data import get_input_data, get_conllu_documents, process_batch, is_inline, write_conllu_output
 from lib.saroj.gunicorn import StandaloneApplication
+from lib.saroj.memory import install_memory_debug
+from lib.saroj.metrics import install_metrics, timer
+from lib.saroj.profiling import install_profiling
 
 app = Flask(__name__)
 
@@ -45,19 +48,46 @@ def anonymize_conllup():
     status, data, error = get_input_data(["input", "output"])
     if not status: return error
 
+    return vote_job(data)
+
+
+@app.route('/process_batch', methods=['POST', 'GET'])
+def anonymize_conllup_batch():
+    """
+    Route to process many files in one call.
+
+    Expects a JSON list of jobs, each one with the keys of /process.
+
+    Returns:
+        JSON: The status of the batch and of each job (e.g., {'status': 'OK', 'message': '', 'jobs': [...]}).
+    """
+    return process_batch(["input", "output"], vote_job)
+
+
+def vote_job(data):
+    """Votes the annotations of one list of files, `data` being the JSON object given to /process."""
     input_files = data["input"]
     output_file = data["output"]
 
     if input_files == '':
         return jsonify({"status": "ERROR", "message": "No file selected."})
-    if not are_files_conllu(input_files):
-        return jsonify({"status": "ERROR", "message": "Input file is not conllup"})
+    status, documents, error = get_conllu_documents(input_files)
+    if not status: return error
 
     if input_files:
         try:
-            vote(args.ALGORITHM, input_files, output_file)
-
-            return jsonify({"status": "OK", "message": ""})
+            output = {}
+            if is_inline(output_file):
+                with timer("annotate"):
+                    document = vote_documents(args.ALGORITHM, documents)
+                output = write_conllu_output(document, output_file)
+            else:
+                with timer("annotate"):
+                    rows = vote_rows(args.ALGORITHM, documents)
+                with timer("write"):
+                    write_conll_file(output_file, rows)
+
+            return jsonify({"status": "OK", "message": "", **output})
         except Exception as e:
             traceback.print_exc(file=sys.stdout)
             return jsonify({"status": "ERROR", "message": str(e)})
@@ -91,7 +121,10 @@ if __name__ == '__main__':
 
     options = {
         'bind': '%s:%s' % ('127.0.0.1', args.PORT),
-        'workers': 1,
+        'workers': args.WORKERS,
     }
+    install_metrics(app, "Voting")
+    install_profiling(app)
+    install_memory_debug(app, "Voting")
     #app.run(debug=True, port=args.PORT)
-    StandaloneApplication(app, options).run()
+    StandaloneApplication(app, options, worker_threads=args.THREADS).run()
@@ -8,6 +8,8 @@ def parse_command_line_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('PORT', type=int, help='Port to listen for requests')
     parser.add_argument('--ALGORITHM', '-a', choices=ALGORITHMS, default='DIFF', help='algorithm to use, mandatory')
+    parser.add_argument('--WORKERS', type=int, default=1, help='worker processes, each one handles a document at a time')
+    parser.add_argument('--THREADS', type=int, help='threads of the numeric libraries in each worker, default: cores / workers')
 
     return parser.parse_args()
 
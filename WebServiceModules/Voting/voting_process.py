@@ -1,5 +1,10 @@
+import os
+import sys
 from collections import Counter, OrderedDict
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from lib.saroj.conllu_document import CoNLLUDocument
+
 
 def is_empty(data):
     return not data or all(not any(lin[0] for lin in line) for line in data)
@@ -9,8 +14,9 @@ def startswith_hashtag(data):
     return any(str(lin[0]).startswith("#") for line in data for lin in line)
 
 
-def check_orthogonality(files):
-    if not all(len(file) == len(files[0]) for file in files):
+def check_orthogonality(documents):
+    if not all(document.sentence_count == documents[0].sentence_count and len(document) == len(documents[0])
+               for document in documents):
         raise ValueError("Input files do not have the same number of sentences.")
 
 
@@ -48,22 +54,15 @@ def most_frequent_item(lst):
 
 # Function to read CoNLL-U Plus file
 def read_conll_file(file_path):
-    data = []
-    with open(file_path, 'r', encoding='utf-8', errors="ignore") as file:
-        lastEmpty=False
-        for line in file:
-            tokens = line.strip().split('\t')
-            if len(tokens)>1:
-                if lastEmpty:
-                    data.append([])
-                    lastEmpty=False
-                data.append(tokens)
-            else:
-                lastEmpty=True
+    return CoNLLUDocument.read(file_path)
 
-    data.append([])
 
-    return data
+def document_rows(document):
+    """Generates the token rows of a document as lists of fields, with an empty row after each sentence."""
+    for conllu_sentence in document.sentences():
+        for token in conllu_sentence:
+            yield token.fields
+        yield []
 
 
 def diff_algorithm(files):
@@ -183,17 +182,38 @@ def write_conll_file(file_path, data):
 
 
 def vote(algo, input_files, output_file):
-    files = [read_conll_file(file) for file in input_files]
-    check_orthogonality(files)
+    result = vote_rows(algo, [read_conll_file(file) for file in input_files])
+    if result is None:
+        return
+
+    write_conll_file(output_file, result)
+
+
+def vote_rows(algo, documents):
+    check_orthogonality(documents)
+    files = [document_rows(document) for document in documents]
     if "DIFF" == algo:
-        result = diff_algorithm(files)
+        return diff_algorithm(files)
     elif "ADD" == algo:
-        result = add_algorithm(files)
+        return add_algorithm(files)
     elif "INTERSECT" == algo:
-        result = intersect_algorithm(files)
+        return intersect_algorithm(files)
     elif "MAJORITY" == algo:
-        result = majority_algorithm(files)
-    else:
-        return
+        return majority_algorithm(files)
+    return None
 
-    write_conll_file(output_file, result)
+
+def vote_documents(algo, documents):
+    """Votes on documents that are already in memory, returns the resulting CoNLLUDocument
+    or None if the algorithm is not known."""
+    result = vote_rows(algo, documents)
+    if result is None:
+        return None
+
+    document = CoNLLUDocument()
+    for row in result:
+        if row:
+            document.add_token(row)
+        else:
+            document.end_sentence()
+    return document
@@ -0,0 +1,485 @@
+from __future__ import annotations
+
+import json
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from typing import Iterable, Iterator, TextIO
+
+# RNER, on Python 3.7, reads and writes the binary form of documents through `input_data`,
+# hence the annotations import above.
+
+# Header of the binary form of a document, see `CoNLLUDocument.to_bytes()`
+BINARY_MAGIC = b'CNLU'
+BINARY_VERSION = 1
+# Version, number of strings, columns, tokens and sentences, bytes of the string table and of the comments
+_BINARY_HEADER = struct.Struct('<BIIIIII')
+
+# Column indexes of the CoNLL-U Plus files produced by TextExtractor.
+# NER and the following columns are added by the other modules.
+ID = 0
+FORM = 1
+LEMMA = 2
+UPOS = 3
+XPOS = 4
+FEATS = 5
+HEAD = 6
+DEPREL = 7
+DEPS = 8
+MISC = 9
+START = 10
+END = 11
+NER = 12
+
+
+class StringTable(object):
+    """Interns the strings of a document. Each distinct field value
+    is stored once and the columns keep its integer ID.
+    ID 0 is the empty string, used for missing fields.
+    The table is shared by the copies of a document, which pipeline steps
+    running in parallel may change, so new strings are added under a lock."""
+
+    __slots__ = ('_strings', '_ids', '_lock')
+
+    def __init__(self):
+        self._strings = ['']
+        self._ids = {'': 0}
+        self._lock = threading.Lock()
+
+    def intern(self, value: str) -> int:
+        sid = self._ids.get(value)
+
+        if sid is None:
+            with self._lock:
+                sid = self._ids.get(value)
+
+                if sid is None:
+                    sid = len(self._strings)
+                    self._strings.append(value)
+                    self._ids[value] = sid
+                # end if
+            # end with
+        # end if
+
+        return sid
+
+    def __getitem__(self, sid: int) -> str:
+        return self._strings[sid]
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+
+class CoNLLUToken(object):
+    """A light view on one token line of a `CoNLLUDocument`.
+    Fields are read and written through the document columns."""
+
+    __slots__ = ('_doc', '_index')
+
+    def __init__(self, doc: 'CoNLLUDocument', index: int):
+        self._doc = doc
+        self._index = index
+
+    @property
+    def index(self) -> int:
+        """The index of the token in the document."""
+        return self._index
+
+    @property
+    def form(self) -> str:
+        return self[FORM]
+
+    @property
+    def fields(self) -> list[str]:
+        return self._doc.get_fields(self._index)
+
+    def __len__(self) -> int:
+        return self._doc._widths[self._index]
+
+    def _column(self, column: int) -> int:
+        width = self._doc._widths[self._index]
+
+        if column < 0:
+            column += width
+        # end if
+
+        if column < 0 or column >= width:
+            raise IndexError(f'Token {self._index} has no column {column}')
+        # end if
+
+        return column
+
+    def __getitem__(self, column: int) -> str:
+        doc = self._doc
+        return doc._strings[doc._columns[self._column(column)][self._index]]
+
+    def __setitem__(self, column: int, value: str):
+        doc = self._doc
+        doc._columns[self._column(column)][self._index] = doc._strings.intern(value)
+
+    def append(self, value: str):
+        """Adds a field after the last field of this token."""
+        self._doc._append_field(self._index, value)
+
+    def __repr__(self) -> str:
+        return 'CoNLLUToken(' + '\t'.join(self.fields) + ')'
+
+
+class CoNLLUDocument(object):
+    """A compact, column-oriented CoNLL-U Plus document, shared by all the modules.
+    Every column is an `array` of IDs into a per-document `StringTable`, so a token
+    costs a few bytes per field instead of a list (or dict) of strings.
+    Sentences are kept as an offset array into the token columns and comments
+    are kept with the sentence that follows them.
+
+    Build it with `read()` or `from_lines()`, or write CoNLL-U text to a
+    `CoNLLUDocumentWriter`. Serialize it with `write()` or `lines()`."""
+
+    __slots__ = ('_strings', '_columns', '_widths', '_sentence_starts', '_comments', '_open_sentence')
+
+    def __init__(self):
+        self._strings = StringTable()
+        # One array of string IDs per column
+        self._columns: list[array] = []
+        # Number of fields of each token line
+        self._widths = array('H')
+        # Token index of the first token of each sentence
+        self._sentence_starts = array('I')
+        # Sentence index -> comment lines before that sentence, no EOL
+        self._comments: dict[int, list[str]] = {}
+        self._open_sentence = False
+
+    @classmethod
+    def read(cls, file: str) -> 'CoNLLUDocument':
+        """Reads a CoNLL-U (Plus) file. It will IGNORE all UTF-8 related encodings errors!"""
+
+        with open(file, mode='r', encoding='utf-8', errors='ignore') as f:
+            return cls.from_lines(f)
+        # end with
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]) -> 'CoNLLUDocument':
+        doc = cls()
+
+        for line in lines:
+            doc.add_line(line)
+        # end for
+
+        doc.end_sentence()
+        return doc
+
+    def add_line(self, line: str):
+        """Adds the next line of CoNLL-U text to the document."""
+
+        line = line.strip()
+
+        if not line:
+            self.end_sentence()
+        elif line.startswith('#'):
+            if self._open_sentence:
+                # A comment inside a sentence goes with the comments of that sentence
+                snt_index = len(self._sentence_starts) - 1
+            else:
+                snt_index = len(self._sentence_starts)
+            # end if
+
+            self._comments.setdefault(snt_index, []).append(line)
+        else:
+            self.add_token(line.split('\t'))
+        # end if
+
+    def add_token(self, fields: list[str]):
+        """Adds a token line to the current sentence, opening one if needed."""
+
+        token_count = len(self._widths)
+
+        if not self._open_sentence:
+            self._sentence_starts.append(token_count)
+            self._open_sentence = True
+        # end if
+
+        while len(self._columns) < len(fields):
+            self._columns.append(array('I', [0]) * token_count)
+        # end while
+
+        intern = self._strings.intern
+
+        for i, column in enumerate(self._columns):
+            column.append(intern(fields[i]) if i < len(fields) else 0)
+        # end for
+
+        self._widths.append(len(fields))
+
+    def end_sentence(self):
+        self._open_sentence = False
+
+    @property
+    def in_sentence(self) -> bool:
+        """True if tokens were added to the last sentence and it was not ended yet."""
+        return self._open_sentence
+
+    def _append_field(self, index: int, value: str):
+        width = self._widths[index]
+
+        if width == len(self._columns):
+            self._columns.append(array('I', [0]) * len(self._widths))
+        # end if
+
+        self._columns[width][index] = self._strings.intern(value)
+        self._widths[index] = width + 1
+
+    def append_column(self, value: str):
+        """Adds the same `value` as a new field at the end of every token line."""
+
+        column_count = len(self._columns)
+
+        if self._widths and min(self._widths) == column_count:
+            self._columns.append(array('I', [self._strings.intern(value)]) * len(self._widths))
+            self._widths = array('H', [column_count + 1]) * len(self._widths)
+        else:
+            for i in range(len(self._widths)):
+                self._append_field(i, value)
+            # end for
+        # end if
+
+    def copy(self) -> 'CoNLLUDocument':
+        """Returns a copy of the document that can be changed independently.
+        The string table is shared, as it only ever grows."""
+
+        doc = CoNLLUDocument()
+        doc._strings = self._strings
+        doc._columns = [array(c.typecode, c) for c in self._columns]
+        doc._widths = array('H', self._widths)
+        doc._sentence_starts = array('I', self._sentence_starts)
+        doc._comments = {k: list(v) for k, v in self._comments.items()}
+        return doc
+
+    def __len__(self) -> int:
+        """The number of tokens in the document."""
+        return len(self._widths)
+
+    @property
+    def sentence_count(self) -> int:
+        return len(self._sentence_starts)
+
+    def sentence_range(self, snt_index: int) -> range:
+        """The token indexes of sentence `snt_index`."""
+
+        start = self._sentence_starts[snt_index]
+
+        if snt_index + 1 < len(self._sentence_starts):
+            end = self._sentence_starts[snt_index + 1]
+        else:
+            end = len(self._widths)
+        # end if
+
+        return range(start, end)
+
+    def sentence(self, snt_index: int) -> list[CoNLLUToken]:
+        return [CoNLLUToken(self, i) for i in self.sentence_range(snt_index)]
+
+    def sentences(self) -> Iterator[list[CoNLLUToken]]:
+        for s in range(len(self._sentence_starts)):
+            yield self.sentence(s)
+        # end for
+
+    def comments(self, snt_index: int) -> list[str]:
+        """The comment lines that come before sentence `snt_index`.
+        Use `sentence_count` as index for the comments at the end of the document."""
+        return self._comments.get(snt_index, [])
+
+    def token(self, index: int) -> CoNLLUToken:
+        return CoNLLUToken(self, index)
+
+    def tokens(self) -> Iterator[CoNLLUToken]:
+        for i in range(len(self._widths)):
+            yield CoNLLUToken(self, i)
+        # end for
+
+    def get_fields(self, index: int) -> list[str]:
+        strings = self._strings
+        return [strings[self._columns[c][index]] for c in range(self._widths[index])]
+
+    def column(self, column: int) -> list[str]:
+        """All values of one column, '' for the tokens that do not have it."""
+
+        strings = self._strings
+        return [strings[sid] for sid in self._columns[column]]
+
+    def sentence_lines(self, snt_index: int) -> Iterator[str]:
+        """Generates the comments and token lines of sentence `snt_index`,
+        followed by the empty line that ends it. EOL is included."""
+
+        for comment in self._comments.get(snt_index, []):
+            yield comment + '\n'
+        # end for
+
+        for i in self.sentence_range(snt_index):
+            yield '\t'.join(self.get_fields(i)) + '\n'
+        # end for
+
+        yield '\n'
+
+    def trailing_lines(self) -> Iterator[str]:
+        """Generates the comment lines after the last sentence, if any."""
+
+        for comment in self._comments.get(len(self._sentence_starts), []):
+            yield comment + '\n'
+        # end for
+
+    def lines(self) -> Iterator[str]:
+        """Generates the CoNLL-U lines of the document, EOL included.
+        Each sentence is followed by an empty line."""
+
+        for s in range(len(self._sentence_starts)):
+            yield from self.sentence_lines(s)
+        # end for
+
+        yield from self.trailing_lines()
+
+    def lines_with_forms(self) -> Iterator[tuple[str, str]]:
+        """Generates (word form, line) for each line of `lines()`.
+        The word form is '' for comments and empty lines."""
+
+        form_column = self._columns[FORM] if len(self._columns) > FORM else None
+        strings = self._strings
+        token_index = 0
+
+        for line in self.lines():
+            if line == '\n' or line.startswith('#'):
+                yield '', line
+            else:
+                yield strings[form_column[token_index]], line
+                token_index += 1
+            # end if
+        # end for
+
+    def write_to(self, f: TextIO):
+        f.writelines(self.lines())
+
+    def write(self, file: str):
+        with open(file, mode='w', encoding='utf-8') as f:
+            self.write_to(f)
+        # end with
+
+    def to_bytes(self, level: int = 1) -> bytes:
+        """Serializes the document in a compact binary form, to send it to another module
+        without writing it to disk: the string table, the column arrays and the comments,
+        compressed with zlib at `level`. Much smaller than the CoNLL-U text and read back
+        by `from_bytes()` without parsing a single line."""
+
+        strings = '\n'.join(self._strings[i] for i in range(len(self._strings))).encode('utf-8')
+        comments = json.dumps({str(k): v for k, v in self._comments.items()}, ensure_ascii=False).encode('utf-8')
+        arrays = self._columns + [self._widths, self._sentence_starts]
+
+        if sys.byteorder == 'big':
+            arrays = [array(a.typecode, a) for a in arrays]
+
+            for a in arrays:
+                a.byteswap()
+            # end for
+        # end if
+
+        header = _BINARY_HEADER.pack(BINARY_VERSION, len(self._strings), len(self._columns), len(self._widths),
+                                     len(self._sentence_starts), len(strings), len(comments))
+        body = b''.join([header, strings, comments] + [a.tobytes() for a in arrays])
+
+        return BINARY_MAGIC + zlib.compress(body, level)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'CoNLLUDocument':
+        """Reads a document serialized by `to_bytes()`.
+        Raises `ValueError` if `data` is not such a document."""
+
+        if not data.startswith(BINARY_MAGIC):
+            raise ValueError('not a binary CoNLL-U document')
+        # end if
+
+        try:
+            body = zlib.decompress(data[len(BINARY_MAGIC):])
+            version, string_count, column_count, token_count, sentence_count, strings_size, comments_size = \
+                _BINARY_HEADER.unpack_from(body)
+        except (zlib.error, struct.error) as e:
+            raise ValueError(f'invalid binary CoNLL-U document: {e}')
+        # end try
+
+        if version != BINARY_VERSION:
+            raise ValueError(f'unsupported binary CoNLL-U document version {version}')
+        # end if
+
+        doc = cls()
+        pos = _BINARY_HEADER.size
+        strings = body[pos:pos + strings_size].decode('utf-8').split('\n')
+        pos += strings_size
+        comments = json.loads(body[pos:pos + comments_size].decode('utf-8'))
+        pos += comments_size
+
+        if len(strings) != string_count or strings[0] != '':
+            raise ValueError('invalid binary CoNLL-U document: bad string table')
+        # end if
+
+        doc._strings._strings = strings
+        doc._strings._ids = {value: sid for sid, value in enumerate(strings)}
+        doc._comments = {int(k): v for k, v in comments.items()}
+        sizes = [('I', token_count)] * column_count + [('H', token_count), ('I', sentence_count)]
+        arrays = []
+
+        for typecode, count in sizes:
+            a = array(typecode)
+            end = pos + a.itemsize * count
+
+            if end > len(body):
+                raise ValueError('invalid binary CoNLL-U document: truncated')
+            # end if
+
+            a.frombytes(body[pos:end])
+
+            if sys.byteorder == 'big':
+                a.byteswap()
+            # end if
+
+            arrays.append(a)
+            pos = end
+        # end for
+
+        doc._columns = arrays[:column_count]
+        doc._widths = arrays[-2]
+        doc._sentence_starts = arrays[-1]
+        return doc
+
+
+class CoNLLUDocumentWriter(object):
+    """A text stream that builds a `CoNLLUDocument` from the CoNLL-U text written to it,
+    so that line-oriented code can produce a document without a text copy of it."""
+
+    def __init__(self):
+        self.document = CoNLLUDocument()
+        self._partial_line = ''
+
+    def write(self, text: str) -> int:
+        lines = (self._partial_line + text).split('\n')
+        self._partial_line = lines.pop()
+
+        for line in lines:
+            self.document.add_line(line)
+        # end for
+
+        return len(text)
+
+    def writelines(self, lines: Iterable[str]):
+        for line in lines:
+            self.write(line)
+        # end for
+
+    def close(self) -> CoNLLUDocument:
+        """Flushes the last line and returns the document."""
+
+        if self._partial_line:
+            self.document.add_line(self._partial_line)
+            self._partial_line = ''
+        # end if
+
+        self.document.end_sentence()
+        return self.document
@@ -1,37 +1,44 @@
+from __future__ import annotations
+
 import re
+import multiprocessing
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from typing import Iterable, Iterator, TextIO
+from .conllu_document import CoNLLUDocument, CoNLLUToken, START, END
+
+# RNER, on Python 3.7, checks its input documents with `input_data.get_conllu_document`,
+# hence the annotations import above.
+
 
-def read_conllu_file(file: str, append_column: bool = True) -> list[list[str | list[str]]]:
+def read_conllu_file(file: str, append_column: bool = True) -> list[list[list[str]]]:
     """Reads a whole CoNLL-U file and stores lines as comments or
     or tuples of fields if the line contains annotations. When an empty
     line is found, a sentence boundary is inserted. Returns the list of
     such sentences from the file."""
 
+    document = CoNLLUDocument.read(file)
     file_sentences = []
-    crt_sentence = []
-
-    with open(file, mode='r', encoding='utf-8', errors="ignore") as f:
-        for line in f:
-            if CoNLLUFileAnnotator._int_rx.match(line):
-                fields = line.strip().split('\t')
-
-                if append_column:
-                    # That's for NER info
-                    # All tokens are 'O'utside any annotation,
-                    # to begin with
-                    fields.append('O')
-                # end if
 
-                crt_sentence.append(fields)
-            elif not line.strip() and crt_sentence:
-                file_sentences.append(crt_sentence)
-                crt_sentence = []
+    for conllu_sentence in document.sentences():
+        crt_sentence = []
+
+        for token in conllu_sentence:
+            fields = token.fields
+
+            if append_column:
+                # That's for NER info
+                # All tokens are 'O'utside any annotation,
+                # to begin with
+                fields.append('O')
             # end if
+
+            crt_sentence.append(fields)
         # end for
-    # end with
-                
-    if crt_sentence:
+
         file_sentences.append(crt_sentence)
-    # end if
+    # end for
 
     return file_sentences
 
@@ -39,86 +46,281 @@ def read_conllu_file(file: str, append_column: bool = True) -> list[list[str | l
 _token_id_rx = re.compile(r'\d+')
 
 
-def is_file_conllu(input_file: str) -> bool:
-    """Takes an input file path and verifies if it is a CoNLL-U file.
-    File is CoNLL-U if:
+class CoNLLUError(ValueError):
+    """The CoNLL-U format error found at line `line_number` of the input."""
+
+    def __init__(self, message: str, line_number: int):
+        super().__init__(f'{message} in line {line_number}')
+        self.line_number = line_number
+
+
+class CoNLLUParser(object):
+    """Builds a `CoNLLUDocument` from CoNLL-U lines and checks the format as it goes,
+    so that the input is read only once. Input is CoNLL-U if:
     - there are multiple tokens beginning with an int;
     - IDs are consecutive in a sentence;
     - all lines which are not comments have the same number of fields.
+    `add_line()` raises `CoNLLUError` at the first line that breaks these rules.
+    With `build=False`, only the checks are done and no document is built."""
+
+    __slots__ = ('document', '_number_of_fields', '_previous_id', '_line_number')
+
+    def __init__(self, build: bool = True):
+        self.document = CoNLLUDocument() if build else None
+        self._number_of_fields = 0
+        self._previous_id = 0
+        self._line_number = 0
+
+    def add_line(self, line: str):
+        """Checks and adds the next `line` of CoNLL-U text."""
+
+        line = line.strip()
+        self._line_number += 1
+
+        if line and not line.startswith('#'):
+            parts = line.split('\t')
+            self._check_token(parts)
+
+            if self.document is not None:
+                self.document.add_token(parts)
+            # end if
+        else:
+            self._previous_id = 0
+
+            if self.document is not None:
+                self.document.add_line(line)
+            # end if
+        # end if
+
+    def _check_token(self, parts: list[str]):
+        if self._number_of_fields == 0:
+            self._number_of_fields = len(parts)
+        elif self._number_of_fields != len(parts):
+            # A line with a different number of fields.
+            # CoNLL-U isn't valid.
+            raise CoNLLUError('different number of fields', self._line_number)
+        # end if
+
+        if not _token_id_rx.fullmatch(parts[0]):
+            # There is no ID as the first token of the line
+            # CoNLL-U isn't valid.
+            raise CoNLLUError('no ID as the first token', self._line_number)
+        # end if
+
+        tid = int(parts[0])
+
+        if self._previous_id == 0 and tid != 1:
+            # First ID in the sentence is not 1
+            # CoNLL-U isn't valid.
+            raise CoNLLUError('first id is not 1', self._line_number)
+        elif self._previous_id > 0 and self._previous_id + 1 != tid:
+            # IDs are not consecutive.
+            # CoNLL-U isn't valid.
+            raise CoNLLUError('ids not consecutive', self._line_number)
+        # end if
+
+        self._previous_id = tid
+
+    def close(self) -> CoNLLUDocument | None:
+        """Ends the input and returns the document."""
+
+        if self.document is not None:
+            self.document.end_sentence()
+        # end if
+
+        return self.document
+
+
+def parse_conllu_lines(lines: Iterable[str]) -> CoNLLUDocument:
+    """Parses and checks CoNLL-U lines in a single pass.
+    Raises `CoNLLUError` with the line number of the first format error."""
+
+    parser = CoNLLUParser()
+
+    for line in lines:
+        parser.add_line(line)
+    # end for
+
+    return parser.close()
+
+
+def iter_conllu_sentences(lines: Iterable[str]) -> Iterator[CoNLLUDocument]:
+    """Parses and checks CoNLL-U lines, one sentence at a time.
+    Generates a small `CoNLLUDocument` for each sentence, with the comments before it.
+    Comments after the last sentence come in a document without sentences.
+    Raises `CoNLLUError` when the first format error is reached."""
+
+    parser = CoNLLUParser()
+
+    for line in lines:
+        parser.add_line(line)
+        document = parser.document
+
+        if document.sentence_count > 0 and not document.in_sentence:
+            yield document
+            parser.document = CoNLLUDocument()
+        # end if
+    # end for
+
+    document = parser.close()
+
+    if document.sentence_count > 0 or document.comments(0):
+        yield document
+    # end if
+
+
+def read_conllu_document(input_file: str) -> CoNLLUDocument:
+    """Reads, checks and parses a CoNLL-U file, in a single pass.
+    Raises `CoNLLUError` with the line number of the first format error.
     It will IGNORE all UTF-8 related encodings errors!"""
 
-    number_of_fields = 0
-    previous_id = 0
-    lnum = 0
+    with open(file=input_file, mode='r', encoding='utf-8', errors='ignore') as f:
+        return parse_conllu_lines(lines=f)
+    # end with
+
+
+def is_file_conllu(input_file: str) -> bool:
+    """Takes an input file path and verifies if it is a CoNLL-U file,
+    see `CoNLLUParser` for the rules. Use `read_conllu_document()` if the
+    file is to be read afterwards.
+    It will IGNORE all UTF-8 related encodings errors!"""
 
     with open(file=input_file, mode='r', encoding='utf-8', errors='ignore') as f:
-        for line in f:
-            line = line.strip()
-            lnum += 1
-
-            if line and not line.startswith('#'):
-                parts = line.split('\t')
-
-                if number_of_fields == 0:
-                    number_of_fields = len(parts)
-                elif number_of_fields != len(parts):
-                    # A line with a different number of fields.
-                    # CoNLL-U isn't valid.
-                    print("CONLLUP Error: different number of fields in line ",lnum)
-                    return False
-                # end if
+        return are_lines_conllu(lines=f)
+    # end with
 
-                if _token_id_rx.fullmatch(parts[0]):
-                    tid = int(parts[0])
 
-                    if previous_id == 0:
-                        if tid != 1:
-                            # First ID in the sentence is not 1
-                            # CoNLL-U isn't valid.
-                            print("CONLLUP Error: first id is not 1 in line ",lnum)
-                            return False
-                        else:
-                            previous_id = 1
-                        # end if
-                    elif previous_id + 1 != tid:
-                        # IDs are not consecutive.
-                        # CoNLL-U isn't valid.
-                        print("CONLLUP Error: ids not consecutive in line ",lnum)
-                        return False
-                    else:
-                        previous_id = tid
-                    # end if
-                else:
-                    # There is no ID as the first token of the line
-                    # CoNLL-U isn't valid.
-                    print("CONLLUP Error: no ID as the first token in line ",lnum)
-                    return False
-                # end if
-            else:
-                previous_id = 0
-            # end if
+def are_lines_conllu(lines: Iterable[str]) -> bool:
+    """Does the same checks as `is_file_conllu()` but on CoNLL-U lines
+    that are already in memory."""
+
+    parser = CoNLLUParser(build=False)
+
+    try:
+        for line in lines:
+            parser.add_line(line)
         # end for
-    # end with
+    except CoNLLUError as e:
+        print("CONLLUP Error:", e)
+        return False
+    # end try
 
     return True
 
 
+class SentenceOffsets(object):
+    """The character offsets of the tokens of one sentence, built once per sentence,
+    to map an annotation (start_offset, end_offset) to the token lines it covers
+    with two binary searches instead of a walk over the sentence."""
+
+    __slots__ = ('_starts', '_ends')
+
+    def __init__(self, s_words: list[str]):
+        """`s_words` are the words of the sentence, as returned by
+        `CoNLLUFileAnnotator._get_text_from_conllu_sentence()`."""
+
+        self._starts = array('I')
+        self._ends = array('I')
+        offset = 0
+
+        for word in s_words:
+            self._starts.append(offset)
+            offset += len(word)
+            self._ends.append(offset)
+        # end for
+
+    def token_range(self, offset: tuple[int, int]) -> tuple[int, int] | None:
+        """Given a start_offset, end_offset `offset` tuple, retrieves the range
+        of the index(es) of the line(s) in the CoNLL-U sentence which
+        should receive the NER annotation: all the tokens that overlap it.
+        Returns `None` if there is no such token."""
+
+        # First token that ends after the start of the annotation
+        left_i = bisect_right(self._ends, offset[0])
+
+        if left_i < len(self._starts) and self._starts[left_i] < offset[1]:
+            # Tokens that start before the end of the annotation, right_i excluded.
+            # Offsets are sorted, so all tokens in between overlap it.
+            right_i = bisect_left(self._starts, offset[1])
+            return (left_i, right_i)
+        else:
+            return None
+        # end if
+
+
+# The annotator that the worker processes of the parallel mode inherit when they are forked
+_parallel_annotator = None
+
+
+def _provide_chunk_annotations(chunk: tuple[list[str], list[str]]) -> list[list[tuple[int, int, str]]]:
+    """Runs in a worker process. Takes the texts of the look-back sentences before
+    the chunk and the texts of the chunk sentences, returns the annotations of each sentence."""
+
+    context, sentences = chunk
+    annotator = _parallel_annotator
+    annotator._previous_sentences = deque(context, maxlen=annotator.look_back)
+    chunk_annotations = []
+
+    for sentence in sentences:
+        chunk_annotations.append(annotator.provide_annotations(sentence))
+        annotator._previous_sentences.append(sentence)
+    # end for
+
+    return chunk_annotations
+
+
 class CoNLLUFileAnnotator(object):
     """This class represents a CoNLL-U file for an NER annotator,
     which takes the CoNLL-U file, extracts the text, runs the annotator
     and then inserts the annotations back into the CoNLL-U file, on the last column.
     Sub-classes have to implement the `annotate()` method."""
 
-    _int_rx = re.compile(r'^\d+\s')
+    # How many of the previous sentences `provide_annotations()` needs to see.
+    # The last `look_back` sentence texts are kept in `self._previous_sentences`.
+    look_back = 0
+    # Number of sentences sent to a worker process at once, in the parallel mode
+    chunk_size = 64
+
+    def __init__(self, input_file: str = '', document: CoNLLUDocument | None = None,
+                 streaming: bool = False, workers: int = 1):
+        """Takes a CoNLL-U `input_file`, checks and parses it in one pass,
+        raising `CoNLLUError` if it is not valid. If `document` is given,
+        a copy of it is annotated instead and `input_file` is not read.
+        The `document` is expected to come from `read_conllu_document()`
+        or from another module, so it is not checked again.
+        With `streaming`, the `input_file` is read one sentence at a time
+        by `annotate()`, so memory does not grow with the size of the file.
+        With `workers` > 1, `provide_annotations()` runs in that many processes,
+        on chunks of `chunk_size` sentences, each chunk with its `look_back` sentences
+        before it. Only for annotators that keep no other state between sentences.
+        The streaming mode is always sequential."""
+
+        self._input_file = input_file
+        self._streaming = streaming and document is None
+        self._workers = workers
+        self._previous_sentences = deque(maxlen=self.look_back)
+        self._document = None
+
+        if not self._streaming:
+            if document is None:
+                document = read_conllu_document(input_file)
+            else:
+                document = document.copy()
+            # end if
 
-    def __init__(self, input_file: str):
-        """Takes a CoNLL-U `input_file` and parses it."""
-        if not is_file_conllu(input_file):
-            raise RuntimeError(f'File [{input_file}] is not a valid CoNLL-U file.')
+            # That's for NER info
+            # All tokens are 'O'utside any annotation,
+            # to begin with
+            document.append_column('O')
+            self._document = document
         # end if
 
-        self._conllu_sentences = read_conllu_file(file=input_file)
-    
+    @property
+    def document(self) -> CoNLLUDocument:
+        """The annotated document, complete after `annotate()` returns.
+        It is `None` in the streaming mode."""
+        return self._document
+
     def _no_space_after(self, words: list[str], index: int):
         """Modifies the list in place, making sure there is no space
         between `index` and `index + 1`. `words[index]` has a space appended."""
@@ -138,18 +340,23 @@ class CoNLLUFileAnnotator(object):
         # end if
 
     def _get_text_from_conllu_sentence(self,
-                                       conllu_sentence: list[str | list[str]]) -> list[str]:
-        """Takes one sentence as returned by function `read_conllu_file()` and returns the list
+                                       conllu_sentence: list[CoNLLUToken]) -> list[str]:
+        """Takes one sentence of the CoNLL-U document and returns the list
         of words, one word per sentence token, with/without a space after it.
-        Joining this sentence with the empty string yields the sentence text."""
+        Joining this sentence with the empty string yields the sentence text.
+        The START and END offsets written by TextExtractor are used if the
+        sentence has them, the `_no_space_after()` heuristics otherwise."""
+
+        words = self._get_text_from_offsets(conllu_sentence)
+
+        if words is not None:
+            return words
+        # end if
 
         words = []
 
-        for i, line in enumerate(conllu_sentence):
-            if isinstance(line, list):
-                word = line[1]
-                words.append(word + ' ')
-            # end if
+        for token in conllu_sentence:
+            words.append(token.form + ' ')
         # end for
 
         # Normalize text: no space between comma and previous word
@@ -159,6 +366,51 @@ class CoNLLUFileAnnotator(object):
 
         return words
 
+    def _get_text_from_offsets(self,
+                               conllu_sentence: list[CoNLLUToken]) -> list[str] | None:
+        """Same as `_get_text_from_conllu_sentence()`, but a token is followed
+        by a space only if there is a gap between its END offset and the START offset
+        of the next token. Returns `None` if the sentence has no START and END columns
+        or if the offsets are not in order, e.g. when TextExtractor could not align a token."""
+
+        starts = []
+        ends = []
+
+        for token in conllu_sentence:
+            # The NER column was appended after END
+            if len(token) <= END + 1:
+                return None
+            # end if
+
+            start = token[START]
+            end = token[END]
+
+            if not start.isdigit() or not end.isdigit():
+                return None
+            # end if
+
+            starts.append(int(start))
+            ends.append(int(end))
+        # end for
+
+        words = []
+
+        for i, token in enumerate(conllu_sentence):
+            if i + 1 < len(starts):
+                if starts[i + 1] < ends[i] or ends[i] < starts[i]:
+                    return None
+                # end if
+
+                space_after = starts[i + 1] > ends[i]
+            else:
+                space_after = True
+            # end if
+
+            words.append(token.form + ' ' if space_after else token.form)
+        # end for
+
+        return words
+
     def _add_iob_to_label(self, label: str) -> bool:
         return not label.startswith('B-') and \
             not label.startswith('I-') and \
@@ -169,105 +421,184 @@ class CoNLLUFileAnnotator(object):
         and writes the resulting file to `output_file`."""
 
         with open(output_file, mode='w', encoding='utf-8') as f:
-            # Go sentence by sentence
-            for conllu_sentence in self._conllu_sentences:
-                snt_words = \
-                    self._get_text_from_conllu_sentence(conllu_sentence)
-                sentence = ''.join(snt_words)
-                annotations = self.provide_annotations(sentence)
-
-                # Insert the annotations on the last column
-                # 'O' is the 'outside' default
-                for soff, eoff, label in annotations:
-                    if soff >= 0 and eoff >= 0 and label != 'O':
-                        wli_info = self._get_ner_line_indexes_in_sentence(
-                            offset=(soff, eoff),
-                            s_words=snt_words)
-
-                        if wli_info:
-                            from_wli, to_wli = wli_info
-
-                            # Also do the BIO annotation here,
-                            # as here we have consecutive tokens.
-                            for i in range(from_wli, to_wli):
-                                if isinstance(conllu_sentence[i], list):
-                                    if i == from_wli: 
-                                        if self._add_iob_to_label(label):
-                                            conllu_sentence[i][-1] = f'B-{label}'
-                                        else:
-                                            conllu_sentence[i][-1] = label
-                                        # end if
-                                    else:
-                                        if self._add_iob_to_label(label):
-                                            conllu_sentence[i][-1] = f'I-{label}'
-                                        else:
-                                            conllu_sentence[i][-1] = label
-                                        # end if
-                                    # end if
-                                # end if
-                            # end for
-                        # end if
-                    # end if
-                # end for annotations in sentence
-                
-                for line in conllu_sentence:
-                    if isinstance(line, list):
-                        print('\t'.join(line), file=f)
-                    else:
-                        # EOL is already included
-                        print(line, file=f, end='')
-                    # end if
+            self.annotate_to(f)
+        # end with
+
+    def annotate_to(self, f: TextIO):
+        """Does the annotation, using the abstract method `provide_annotations()`
+        and writes the resulting CoNLL-U lines to the opened text stream `f`."""
+
+        if self._streaming:
+            self._annotate_stream_to(f)
+            return
+        # end if
+
+        for snt_index in self._annotated_sentences():
+            # Comments, token lines and the EOS mark
+            f.writelines(self._document.sentence_lines(snt_index))
+        # end for
+
+        f.writelines(self._document.trailing_lines())
+
+    def _annotate_stream_to(self, f: TextIO):
+        """Reads, annotates and writes one sentence at a time.
+        Only the current sentence and the look-back sentences are kept in memory."""
+
+        with open(self._input_file, mode='r', encoding='utf-8', errors='ignore') as input_f:
+            for snt_document in iter_conllu_sentences(input_f):
+                snt_document.append_column('O')
+
+                for snt_index in range(snt_document.sentence_count):
+                    self._annotate_sentence(snt_document, snt_index)
                 # end for
-                
-                # Print EOS mark
-                print(file=f)
-            # end for sentence
+
+                f.writelines(snt_document.lines())
+            # end for
         # end with
 
-    def provide_annotations(self, sentence: str) -> list[tuple[int, int, str]]:
-        """This is the specific annotator method. To be implemented in sub-classes.
-        Takes the next `sentence` from CoNLL-U file to annotate and returns a list of
-        (start_offset, end_offset, label) annotations relative to `sentence`."""
+    def annotate_document(self) -> CoNLLUDocument:
+        """Does the annotation, using the abstract method `provide_annotations()`
+        and returns the annotated document, without serializing it."""
 
-        raise NotImplementedError('Do not know how to supply the annotations. Please implement me!')
+        if self._streaming:
+            raise RuntimeError('The whole document is not available in the streaming mode.')
+        # end if
 
-    def _get_ner_line_indexes_in_sentence(self,
-                                          offset: tuple[int, int],
-                                          s_words: list[str]) -> tuple[int, int] | None:
-        """Given a start_offset, end_offset `offset` tuple, retrieves the range
-        of the index(es) of the line(s) in the CoNLL-U sentence which
-        should receive the NER annotation."""
+        for _ in self._annotated_sentences():
+            pass
+        # end for
 
-        tok_offset_start = 0
-        tok_offset_end = 0
-        left_i = -1
-        right_i = -1
+        return self._document
 
-        for i, tok in enumerate(s_words):
-            tok_offset_end = tok_offset_start + len(tok)
+    def sentence_texts(self) -> list[str]:
+        """The text of each sentence of the document, as given to `provide_annotations()`,
+        for annotators that compute the annotations of many sentences, or documents, at once.
+        See `annotate_document_with()`."""
 
-            if not (tok_offset_end <= offset[0] or \
-                    offset[1] <= tok_offset_start):
-                if left_i == -1:
-                    left_i = i
-                # end if
-                    
-                right_i = i
-            elif offset[1] <= tok_offset_start:
-                break
-            # end if
+        if self._streaming:
+            raise RuntimeError('The whole document is not available in the streaming mode.')
+        # end if
+
+        return [''.join(self._get_text_from_conllu_sentence(conllu_sentence))
+                for conllu_sentence in self._document.sentences()]
 
-            tok_offset_start = tok_offset_end
+    def annotate_document_with(self, annotations: list[list[tuple[int, int, str]]]) -> CoNLLUDocument:
+        """Same as `annotate_document()`, with the annotations of each
+        sentence of `sentence_texts()` already computed."""
+
+        for snt_index, snt_annotations in enumerate(annotations):
+            conllu_sentence = self._document.sentence(snt_index)
+            snt_words = self._get_text_from_conllu_sentence(conllu_sentence)
+            self._insert_annotations(conllu_sentence, snt_words, snt_annotations)
         # end for
-            
-        if right_i == -1:
-            # s_words has the same length as th CoNLL-U sentence
-            right_i = len(s_words)
-        # end
-            
-        if left_i >= 0 and left_i <= right_i:
-            # Lines found, right_i excluded, always
-            return (left_i, right_i + 1)
-        else:
-            return None
+
+        return self._document
+
+    def _annotated_sentences(self) -> Iterator[int]:
+        """Annotates the sentences of the document, in order,
+        and generates the index of each sentence once it is done."""
+
+        document = self._document
+
+        if self._workers <= 1 or document.sentence_count <= self.chunk_size or \
+                'fork' not in multiprocessing.get_all_start_methods():
+            for snt_index in range(document.sentence_count):
+                self._annotate_sentence(document, snt_index)
+                yield snt_index
+            # end for
+
+            return
         # end if
+
+        all_words = [self._get_text_from_conllu_sentence(conllu_sentence)
+                     for conllu_sentence in document.sentences()]
+        texts = [''.join(snt_words) for snt_words in all_words]
+        chunks = []
+
+        for start in range(0, len(texts), self.chunk_size):
+            # The context overlaps the end of the previous chunk
+            context = texts[max(0, start - self.look_back):start]
+            chunks.append((context, texts[start:start + self.chunk_size]))
+        # end for
+
+        global _parallel_annotator
+        _parallel_annotator = self
+
+        try:
+            with multiprocessing.get_context('fork').Pool(processes=self._workers) as pool:
+                snt_index = 0
+
+                # imap() keeps the order of the chunks
+                for chunk_annotations in pool.imap(_provide_chunk_annotations, chunks):
+                    for annotations in chunk_annotations:
+                        self._insert_annotations(document.sentence(snt_index), all_words[snt_index], annotations)
+                        yield snt_index
+                        snt_index += 1
+                    # end for
+                # end for
+            # end with
+        finally:
+            _parallel_annotator = None
+        # end try
+
+        self._previous_sentences.extend(texts[-self.look_back:] if self.look_back > 0 else [])
+
+    def _annotate_sentence(self, document: CoNLLUDocument, snt_index: int):
+        """Sets the last column of the tokens of sentence `snt_index` of `document`."""
+
+        conllu_sentence = document.sentence(snt_index)
+        snt_words = \
+            self._get_text_from_conllu_sentence(conllu_sentence)
+        sentence = ''.join(snt_words)
+        annotations = self.provide_annotations(sentence)
+        self._previous_sentences.append(sentence)
+        self._insert_annotations(conllu_sentence, snt_words, annotations)
+
+    def _insert_annotations(self, conllu_sentence: list[CoNLLUToken],
+                            snt_words: list[str], annotations: list[tuple[int, int, str]]):
+        """Sets the last column of the tokens of `conllu_sentence` from
+        the `annotations` of its text, made of `snt_words`."""
+
+        snt_offsets = None
+
+        # Insert the annotations on the last column
+        # 'O' is the 'outside' default
+        for soff, eoff, label in annotations:
+            if soff >= 0 and eoff >= 0 and label != 'O':
+                if snt_offsets is None:
+                    snt_offsets = SentenceOffsets(snt_words)
+                # end if
+
+                wli_info = snt_offsets.token_range(offset=(soff, eoff))
+
+                if wli_info:
+                    from_wli, to_wli = wli_info
+
+                    # Also do the BIO annotation here,
+                    # as here we have consecutive tokens.
+                    for i in range(from_wli, to_wli):
+                        if i == from_wli: 
+                            if self._add_iob_to_label(label):
+                                conllu_sentence[i][-1] = f'B-{label}'
+                            else:
+                                conllu_sentence[i][-1] = label
+                            # end if
+                        else:
+                            if self._add_iob_to_label(label):
+                                conllu_sentence[i][-1] = f'I-{label}'
+                            else:
+                                conllu_sentence[i][-1] = label
+                            # end if
+                        # end if
+                    # end for
+                # end if
+            # end if
+        # end for annotations in sentence
+
+    def provide_annotations(self, sentence: str) -> list[tuple[int, int, str]]:
+        """This is the specific annotator method. To be implemented in sub-classes.
+        Takes the next `sentence` from CoNLL-U file to annotate and returns a list of
+        (start_offset, end_offset, label) annotations relative to `sentence`.
+        The sentences before it are in `self._previous_sentences`, see `look_back`."""
+
+        raise NotImplementedError('Do not know how to supply the annotations. Please implement me!')
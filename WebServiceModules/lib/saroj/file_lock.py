@@ -0,0 +1,19 @@
+import fcntl
+from contextlib import contextmanager
+
+
+@contextmanager
+def file_lock(path: str):
+    """Holds an exclusive lock on `path` for the block, between processes, e.g. the gunicorn
+    workers of a module that read and update the same case map. The lock is taken on a
+    `path.lock` file next to it, so `path` itself can be replaced or truncated meanwhile."""
+
+    with open(f'{path}.lock', mode='a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        # end try
+    # end with
@@ -1,13 +1,96 @@
+import argparse
+import gc
+import os
+import sys
+from typing import Callable
+
 import gunicorn.app.base
 
+# Environment variables that size the thread pools of the numeric libraries: OpenMP, which PyTorch uses
+# for its intra-op threads, MKL, in PyTorch and some numpy builds, and OpenBLAS, in the numpy wheels.
+# Each library reads them once, when it is loaded.
+THREAD_VARIABLES = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')
+
+
+def default_worker_threads(workers: int) -> int:
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def limit_threads_from_argv(argv: list[str] | None = None):
+    """Sets `THREAD_VARIABLES` from the `--THREADS` and `--WORKERS` arguments of the command line,
+    as `StandaloneApplication` computes `worker_threads`. Call it in the master process, before numpy,
+    PyTorch or spaCy are imported: these libraries size their thread pools when they are loaded,
+    and the workers forked from the master inherit the pools as they are."""
+
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--WORKERS', type=int, default=1)
+    parser.add_argument('--THREADS', type=int)
+    args, _ = parser.parse_known_args(argv)
+    threads = args.THREADS or default_worker_threads(args.WORKERS)
+
+    for variable in THREAD_VARIABLES:
+        os.environ[variable] = str(threads)
+    # end for
+
+
+def limit_worker_threads(threads: int):
+    """Limits the thread pools of the numeric libraries of this worker process to `threads`,
+    so that N workers do not start N times as many threads as there are cores.
+    The environment variables only size the libraries loaded after the fork, see
+    `limit_threads_from_argv()` for the ones the master loads; the threads of PyTorch
+    are set here whenever it was loaded."""
+
+    for variable in THREAD_VARIABLES:
+        os.environ[variable] = str(threads)
+    # end for
+
+    torch = sys.modules.get('torch')
+
+    if torch is not None:
+        torch.set_num_threads(threads)
+
+        try:
+            torch.set_num_interop_threads(threads)
+        except RuntimeError:
+            # Only possible before the first parallel work
+            pass
+        # end try
+    # end if
+
+
+def _freeze_heap(server, worker):
+    """Moves everything the master process allocated, e.g. the dictionaries and
+    the regex tables, out of reach of the garbage collector. The collector of a
+    worker then does not write to these pages, which stay shared with the master."""
+    gc.freeze()
+
+
 class StandaloneApplication(gunicorn.app.base.BaseApplication):
+    """Runs a Flask `app` with gunicorn, with `options` from its settings, e.g. `bind` and `workers`.
+
+    The resources a module loads before calling `run()` are loaded once, in the master process,
+    and shared copy-on-write by the workers. Resources that cannot be forked, like PyTorch models,
+    are loaded by `worker_init()`, in each worker, once its numeric libraries are limited
+    to `worker_threads` threads (default: the CPU cores divided by the workers)."""
 
-    def __init__(self, app, options=None):
+    def __init__(self, app, options=None, worker_init: Callable[[], None] | None = None,
+                 worker_threads: int | None = None):
         self.options = options or {}
         self.options['timeout'] = 60*60
         self.application = app
+        self._worker_init = worker_init
+        self._worker_threads = worker_threads or default_worker_threads(self.options.get('workers', 1))
+        self.options.setdefault('pre_fork', _freeze_heap)
+        self.options.setdefault('post_fork', self._post_fork)
         super().__init__()
 
+    def _post_fork(self, server, worker):
+        limit_worker_threads(self._worker_threads)
+
+        if self._worker_init is not None:
+            self._worker_init()
+        # end if
+
     def load_config(self):
         config = {key: value for key, value in self.options.items()
                   if key in self.cfg.settings and value is not None}
@@ -1,6 +1,18 @@
+import base64
+import binascii
+import gzip
 import json
+import os
+import shutil
+import sys
+import tempfile
+import traceback
 from flask import request, jsonify
-from .conllu_utils import is_file_conllu
+
+from .metrics import timer
+
+# RNER imports this module on Python 3.7: the modules it uses, conllu_utils included, must import
+# there as well, see tests/test_python37.py
 
 
 def get_input_data(expected_values):
@@ -25,8 +37,272 @@ def get_input_data(expected_values):
     return True, data, None
 
 
+# Encodings of a document sent in the request, or asked for in the response, instead of a file path.
+# "binary" is the compact form of `CoNLLUDocument.to_bytes()`, for CoNLL-U documents only.
+CONTENT_ENCODINGS = ("identity", "gzip", "binary")
+
+
+def is_inline(value):
+    """True if `value`, a file field of the input JSON, is a document sent in the request instead of a path:
+    {"content": "<base64>", "encoding": "gzip"}, or {"file": "<part name>", "encoding": "gzip"} for a part
+    of a multipart request, which saves the base64 step. For the "output" field, {"encoding": "gzip"} asks
+    for the output document in the "output" field of the response, in the same form, instead of a file."""
+    return isinstance(value, dict)
+
+
+def get_content_encoding(value):
+    encoding = value.get("encoding", "identity")
+    if encoding not in CONTENT_ENCODINGS:
+        raise ValueError("Unknown content encoding {encoding}".format(encoding=encoding))
+    return encoding
+
+
+def read_content(value):
+    """Returns the bytes of the inline document `value`, un-gzipped.
+    Raises ValueError if it cannot be read."""
+    encoding = get_content_encoding(value)
+
+    if "file" in value:
+        part = request.files.get(value["file"])
+        if part is None:
+            raise ValueError("Missing file part {name}".format(name=value["file"]))
+        data = part.read()
+    elif "content" in value:
+        try:
+            data = base64.b64decode(value["content"], validate=True)
+        except (binascii.Error, TypeError):
+            raise ValueError("Invalid base64 content")
+    else:
+        raise ValueError("Inline document without content or file")
+
+    if encoding == "gzip":
+        try:
+            data = gzip.decompress(data)
+        except (OSError, EOFError):
+            raise ValueError("Invalid gzip content")
+
+    return data
+
+
+def read_conllu_content(value):
+    """Reads and checks the inline CoNLL-U document `value`, in any of the `CONTENT_ENCODINGS`."""
+    from .conllu_document import CoNLLUDocument
+    from .conllu_utils import parse_conllu_lines
+    data = read_content(value)
+
+    if get_content_encoding(value) == "binary":
+        return CoNLLUDocument.from_bytes(data)
+
+    return parse_conllu_lines(data.decode("utf-8", errors="ignore").splitlines(keepends=True))
+
+
+def encode_content(data, output):
+    """Returns the "output" field of the response for the bytes of an output document,
+    as asked by the inline `output` field of the request."""
+    encoding = get_content_encoding(output)
+    if encoding == "gzip":
+        data = gzip.compress(data, compresslevel=1)
+
+    return {"output": {"encoding": encoding, "content": base64.b64encode(data).decode("ascii")}}
+
+
+def write_conllu_output(document, output):
+    """Writes `document` to the `output` path, or encodes it for the response if `output` is inline.
+    Returns the fields to add to the response."""
+    with timer("write"):
+        if not is_inline(output):
+            document.write(output)
+            return {}
+
+        if get_content_encoding(output) == "binary":
+            data = document.to_bytes()
+        else:
+            data = "".join(document.lines()).encode("utf-8")
+        return encode_content(data, output)
+
+
+def encode_conllu_text(text, output):
+    """Same as `write_conllu_output` for a document that is still CoNLL-U text, and an inline `output`."""
+    if get_content_encoding(output) == "binary":
+        from .conllu_document import CoNLLUDocument
+        return encode_content(CoNLLUDocument.from_lines(text.splitlines()).to_bytes(), output)
+    return encode_content(text.encode("utf-8"), output)
+
+
+class FileTransport(object):
+    """For the modules that work on files, e.g. to unzip a docx: the inline inputs are written to
+    a private temporary folder and the inline outputs are written there and read back for the
+    response. The folder is removed on exit. Paths are passed through unchanged.
+    Only `conllu` documents can be sent, or asked for, in the "binary" encoding."""
+
+    def __init__(self):
+        self._folder = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if self._folder is not None:
+            shutil.rmtree(self._folder, ignore_errors=True)
+            self._folder = None
+
+    def _path(self, name):
+        if self._folder is None:
+            self._folder = tempfile.mkdtemp(prefix="saroj-")
+        return os.path.join(self._folder, name)
+
+    @staticmethod
+    def _is_binary(value, conllu):
+        if get_content_encoding(value) != "binary":
+            return False
+        if not conllu:
+            raise ValueError("The binary encoding is only for CoNLL-U documents")
+        return True
+
+    def input(self, value, name, conllu=False):
+        """Returns the path of the input `value`, named `name` if it is inline."""
+        if not is_inline(value):
+            return value
+
+        data = read_content(value)
+        if self._is_binary(value, conllu):
+            from .conllu_document import CoNLLUDocument
+            data = "".join(CoNLLUDocument.from_bytes(data).lines()).encode("utf-8")
+
+        path = self._path(name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def output(self, value, name):
+        """Returns the path to write the output `value` to, named `name` if it is inline."""
+        return self._path(name) if is_inline(value) else value
+
+    def output_fields(self, value, path, conllu=False):
+        """Returns the fields to add to the response for the output `value`, once written to `path`."""
+        if not is_inline(value):
+            return {}
+
+        if self._is_binary(value, conllu):
+            from .conllu_document import CoNLLUDocument
+            return encode_content(CoNLLUDocument.read(path).to_bytes(), value)
+
+        with open(path, "rb") as f:
+            return encode_content(f.read(), value)
+
+def get_batch_input_data(expected_values):
+    """Same as `get_input_data`, for `/process_batch`: the input parameter is a JSON list of jobs,
+    or an object with a "jobs" list, each job being the input of one `/process` call.
+    Returns (status, jobs, error), `jobs` being a list of (job, message) where
+    message is the error of an invalid job and None for a valid one."""
+    if "input" not in request.values:
+        return False, None, jsonify({"status": "ERROR", "message": "Missing input parameter"})
+
+    try:
+        data = json.loads(request.values["input"])
+    except json.JSONDecodeError:
+        return False, None, jsonify({"status": "ERROR", "message": "Invalid JSON provided in the input parameter"})
+
+    if isinstance(data, dict):
+        data = data.get("jobs")
+
+    if not isinstance(data, list):
+        return False, None, jsonify(
+            {"status": "ERROR", "message": "Invalid input JSON provided in the input parameter. Expected a list of jobs"})
+
+    jobs = []
+    for job in data:
+        message = None
+        if not isinstance(job, dict):
+            message = "Invalid job, expected a JSON object"
+        else:
+            for v in expected_values:
+                if v not in job:
+                    message = "Invalid job. Missing field {value}".format(value=v)
+                    break
+        jobs.append((job, message))
+
+    return True, jobs, None
+
+
+def get_job_status(result):
+    """Returns the {"status", "message"} of one job from what a `/process` handler
+    returns, a `jsonify` response, or from a dictionary."""
+    if isinstance(result, dict):
+        return result
+    data = result.get_json(silent=True)
+    if not isinstance(data, dict) or "status" not in data:
+        return {"status": "ERROR", "message": "Invalid result"}
+    return data
+
+
+def process_batch(expected_values, process_job=None, process_jobs=None):
+    """Handles a `/process_batch` request, see `get_batch_input_data`.
+    Valid jobs are run one at a time with `process_job(job)`, the code of the `/process` handler,
+    or all at once with `process_jobs(jobs)`, for modules that batch the work of several documents,
+    which returns a result per job. Returns the status of each job, in order, in "jobs";
+    the batch status is OK only if all jobs are."""
+    status, jobs, error = get_batch_input_data(expected_values)
+    if not status:
+        return error
+
+    results = [{"status": "ERROR", "message": message} for _, message in jobs]
+    valid = [i for i, (_, message) in enumerate(jobs) if message is None]
+
+    if process_jobs is not None:
+        try:
+            for i, result in zip(valid, process_jobs([jobs[i][0] for i in valid])):
+                results[i] = get_job_status(result)
+        except Exception as e:
+            traceback.print_exc(file=sys.stdout)
+            for i in valid:
+                results[i] = {"status": "ERROR", "message": str(e)}
+    else:
+        for i in valid:
+            try:
+                results[i] = get_job_status(process_job(jobs[i][0]))
+            except Exception as e:
+                traceback.print_exc(file=sys.stdout)
+                results[i] = {"status": "ERROR", "message": str(e)}
+
+    failed = sum(1 for r in results if r.get("status") != "OK")
+    return jsonify({"status": "OK" if failed == 0 else "ERROR",
+                    "message": "" if failed == 0 else "{failed} of {total} jobs failed".format(
+                        failed=failed, total=len(results)),
+                    "jobs": results})
+
+
 def are_files_conllu(input_files):
+    from .conllu_utils import is_file_conllu
     for file_path in input_files:
         if not is_file_conllu(file_path):
             return False
     return True
+
+
+def get_conllu_document(input_file):
+    """Reads and checks the CoNLL-U input file in a single pass, or the document
+    sent in the request if `input_file` is inline, see `is_inline`.
+    Returns (status, document, error) like `get_input_data`, the error
+    message has the line number of the first format error."""
+    from .conllu_utils import read_conllu_document, CoNLLUError
+    try:
+        with timer("parse"):
+            if is_inline(input_file):
+                return True, read_conllu_content(input_file), None
+            return True, read_conllu_document(input_file), None
+    except CoNLLUError as e:
+        print("CONLLUP Error:", e)
+        return False, None, jsonify({"status": "ERROR", "message": "Input file is not conllup: {error}".format(error=e)})
+    except ValueError as e:
+        return False, None, jsonify({"status": "ERROR", "message": "Invalid input document: {error}".format(error=e)})
+
+
+def get_conllu_documents(input_files):
+    documents = []
+    for file_path in input_files:
+        status, document, error = get_conllu_document(file_path)
+        if not status:
+            return False, None, error
+        documents.append(document)
+    return True, documents, None
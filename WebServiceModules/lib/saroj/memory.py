@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Callable
+
+from flask import jsonify, request
+
+# Also imported by RNER, which runs on Python 3.7.
+
+# Frames kept for each allocation, when tracing is started from the endpoint
+TRACE_FRAMES = 10
+# Allocation sites listed in the report
+TOP_SITES = 25
+
+
+def rss() -> dict:
+    """Current and peak resident set size of this process, in bytes."""
+
+    result = {'rss': None, 'peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}
+
+    try:
+        with open('/proc/self/status', mode='r', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    result['rss'] = int(line.split()[1]) * 1024
+                elif line.startswith('VmHWM:'):
+                    result['peak_rss'] = int(line.split()[1]) * 1024
+                # end if
+            # end for
+        # end with
+    except OSError:
+        pass
+    # end try
+
+    return result
+
+
+def container_size(container) -> dict:
+    """Entries and bytes of a dict, list or set, with the bytes of the keys and of the values
+    one level down, e.g. the lists of names of a replacement dictionary."""
+
+    size = sys.getsizeof(container)
+    items = container.items() if isinstance(container, dict) else ((v, None) for v in container)
+
+    for key, value in items:
+        size += sys.getsizeof(key)
+
+        if value is not None:
+            size += sys.getsizeof(value)
+
+            if isinstance(value, (list, tuple, set, dict)):
+                size += sum(sys.getsizeof(v) for v in value)
+            # end if
+        # end if
+    # end for
+
+    return {'entries': len(container), 'bytes': size}
+
+
+def model_size(*models) -> dict:
+    """Parameters and bytes of the parameters and buffers of PyTorch `models`, None if not loaded."""
+
+    parameters = 0
+    size = 0
+
+    for model in models:
+        if model is None:
+            continue
+        # end if
+
+        for tensor in model.parameters():
+            parameters += tensor.numel()
+            size += tensor.numel() * tensor.element_size()
+        # end for
+
+        for tensor in model.buffers():
+            size += tensor.numel() * tensor.element_size()
+        # end for
+    # end for
+
+    return {'parameters': parameters, 'bytes': size}
+
+
+def _format_stats(stats, limit: int) -> list[dict]:
+    return [{'site': ' <- '.join(f'{frame.filename}:{frame.lineno}' for frame in stat.traceback[:3]),
+             'size': stat.size, 'size_diff': getattr(stat, 'size_diff', None),
+             'count': stat.count, 'count_diff': getattr(stat, 'count_diff', None)}
+            for stat in stats[:limit]]
+
+
+class MemoryMonitor(object):
+    """Memory report of one module process: RSS, the sizes of the resident structures given in
+    `resources` (name -> function that returns their size), and, while `tracemalloc` traces,
+    the top allocation sites. With a `snapshot_interval`, a thread takes a snapshot every that
+    many seconds and keeps the difference between the last two, to find what keeps growing."""
+
+    def __init__(self, module: str, resources: dict[str, Callable[[], object]] | None = None):
+        self.module = module
+        self.resources = dict(resources or {})
+        self.snapshot_interval = 0
+        self._lock = threading.Lock()
+        self._diff = None
+        self._diff_at = None
+        self._previous = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start_tracing(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+        # end if
+
+    def stop_tracing(self):
+        self.set_snapshot_interval(0)
+        tracemalloc.stop()
+
+        with self._lock:
+            self._previous = None
+            self._diff = None
+        # end with
+
+    def set_snapshot_interval(self, seconds: float):
+        """Starts, with `seconds` > 0, or stops the periodic snapshots. Starts tracing if needed."""
+
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        # end if
+
+        self.snapshot_interval = seconds
+
+        if seconds > 0:
+            self.start_tracing()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True, name='memory-snapshots')
+            self._thread.start()
+        # end if
+
+    def _run(self):
+        self.take_snapshot()
+
+        while not self._stop.wait(self.snapshot_interval):
+            self.take_snapshot()
+        # end while
+
+    def take_snapshot(self):
+        if not tracemalloc.is_tracing():
+            return
+        # end if
+
+        snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+        with self._lock:
+            if self._previous is not None:
+                self._diff = snapshot.compare_to(self._previous, 'lineno')
+                self._diff_at = time.time()
+            # end if
+
+            self._previous = snapshot
+        # end with
+
+    def resource_sizes(self) -> dict:
+        sizes = {}
+
+        for name, size in self.resources.items():
+            try:
+                sizes[name] = size()
+            except Exception as e:
+                sizes[name] = f'error: {e}'
+            # end try
+        # end for
+
+        return sizes
+
+    def report(self, limit: int = TOP_SITES) -> dict:
+        report = {'module': self.module, 'pid': os.getpid(), **rss(), 'resources': self.resource_sizes(),
+                  'tracemalloc': {'tracing': tracemalloc.is_tracing(), 'snapshot_interval': self.snapshot_interval}}
+
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+            report['tracemalloc'].update({'traced': current, 'traced_peak': peak,
+                                          'top': _format_stats(snapshot.statistics('lineno'), limit)})
+
+            with self._lock:
+                if self._diff is not None:
+                    report['tracemalloc']['diff'] = _format_stats(self._diff, limit)
+                    report['tracemalloc']['diff_age'] = round(time.time() - self._diff_at, 1)
+                # end if
+            # end with
+        # end if
+
+        return report
+
+
+def install_memory_debug(app, module: str, resources: dict[str, Callable[[], object]] | None = None) -> MemoryMonitor:
+    """Adds the `/debug/memory` endpoint to the Flask `app`, reporting on the worker that answers.
+    Parameters: `trace=start|stop` starts or stops `tracemalloc`, which slows the module down while it runs;
+    `interval=<seconds>` starts the periodic snapshot diff, `interval=0` stops it; `top=<n>` sites to list."""
+
+    monitor = MemoryMonitor(module, resources)
+
+    @app.route('/debug/memory', methods=['GET', 'POST'])
+    def _debug_memory():
+        trace = request.values.get('trace')
+
+        try:
+            if trace == 'start':
+                monitor.start_tracing()
+            elif trace == 'stop':
+                monitor.stop_tracing()
+            # end if
+
+            if 'interval' in request.values:
+                monitor.set_snapshot_interval(float(request.values['interval']))
+            # end if
+
+            return jsonify({'status': 'OK', 'message': '',
+                            'memory': monitor.report(int(request.values.get('top', TOP_SITES)))})
+        except ValueError as e:
+            return jsonify({'status': 'ERROR', 'message': str(e)})
+        # end try
+
+    return monitor
@@ -0,0 +1,288 @@
+from __future__ import annotations
+
+import atexit
+import bisect
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+
+# Also imported by RNER, which runs on Python 3.7.
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+# Document size buckets, by the bytes of the input documents of a request
+SIZE_BUCKETS = ((16 << 10, 'xs'), (128 << 10, 's'), (1 << 20, 'm'), (8 << 20, 'l'))
+LARGEST_SIZE = 'xl'
+# Endpoints that are not documents to process, a module adds its own with `install_metrics()`
+_SERVICE_ENDPOINTS = ('/metrics', '/checkHealth', '/debug/memory')
+# The endpoint label of the requests that match no route, e.g. scans of random paths
+UNMATCHED_ENDPOINT = 'unmatched'
+
+# The metrics of the module served by this process, see `install_metrics()`
+_metrics = None
+
+
+def size_bucket(size: int) -> str:
+    for limit, name in SIZE_BUCKETS:
+        if size < limit:
+            return name
+        # end if
+    # end for
+
+    return LARGEST_SIZE
+
+
+def _field_size(value) -> int:
+    """Bytes of a document field of the input JSON: a path, a list of paths or an inline document."""
+
+    if isinstance(value, list):
+        return sum(_field_size(v) for v in value)
+    elif isinstance(value, dict):
+        if 'content' in value:
+            return len(value['content']) * 3 // 4
+        elif 'file' in value and value['file'] in request.files:
+            return request.files[value['file']].content_length or 0
+        # end if
+    elif isinstance(value, str) and value:
+        try:
+            return os.path.getsize(value)
+        except OSError:
+            return 0
+        # end try
+    # end if
+
+    return 0
+
+
+def request_size() -> int:
+    """Bytes of the input documents of the current `/process` or `/process_batch` request."""
+
+    try:
+        data = json.loads(request.values.get('input', 'null'))
+    except ValueError:
+        return 0
+    # end try
+
+    if isinstance(data, dict) and 'jobs' in data:
+        data = data['jobs']
+    # end if
+
+    jobs = data if isinstance(data, list) else [data]
+    return sum(_field_size(job.get('input')) for job in jobs if isinstance(job, dict))
+
+
+class Metrics(object):
+    """The request counters and the per-phase latency histograms of one module, labelled by
+    phase and document size bucket, served in the Prometheus text format by `render()`.
+
+    Each gunicorn worker counts its own requests and writes them to `folder`, created before the
+    workers are forked, after every request, so that any worker can serve the totals of all."""
+
+    def __init__(self, module: str, folder: str | None = None):
+        self.module = module
+        self._folder = folder or tempfile.mkdtemp(prefix=f'saroj-metrics-{module}-')
+        self._owner = os.getpid()
+        self._lock = threading.Lock()
+        # (phase, size) -> [count per bucket, then +Inf], sum, count
+        self._histograms = {}
+        # (endpoint, status) -> count
+        self._requests = {}
+
+    def observe(self, phase: str, size: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get((phase, size))
+
+            if histogram is None:
+                histogram = self._histograms[(phase, size)] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0, 0]
+            # end if
+
+            histogram[0][bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+        # end with
+
+    def count_request(self, endpoint: str, status: str):
+        with self._lock:
+            key = (endpoint, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+        # end with
+
+    def _state(self) -> dict:
+        with self._lock:
+            return {'histograms': [[phase, size, h[0], h[1], h[2]] for (phase, size), h in self._histograms.items()],
+                    'requests': [[endpoint, status, n] for (endpoint, status), n in self._requests.items()]}
+        # end with
+
+    def flush(self):
+        """Writes the counts of this process for the other workers."""
+
+        path = os.path.join(self._folder, f'{os.getpid()}.json')
+
+        try:
+            with open(f'{path}.tmp', mode='w', encoding='utf-8') as f:
+                json.dump(self._state(), f)
+            # end with
+
+            os.replace(f'{path}.tmp', path)
+        except OSError:
+            pass
+        # end try
+
+    def _totals(self) -> tuple[dict, dict]:
+        """Sums the counts of all the workers, this one included."""
+
+        states = [self._state()]
+        own = f'{os.getpid()}.json'
+
+        try:
+            names = [n for n in os.listdir(self._folder) if n.endswith('.json') and n != own]
+        except OSError:
+            names = []
+        # end try
+
+        for name in names:
+            try:
+                with open(os.path.join(self._folder, name), mode='r', encoding='utf-8') as f:
+                    states.append(json.load(f))
+                # end with
+            except (OSError, ValueError):
+                pass
+            # end try
+        # end for
+
+        histograms = {}
+        requests = {}
+
+        for state in states:
+            for phase, size, buckets, total, count in state['histograms']:
+                h = histograms.setdefault((phase, size), [[0] * len(buckets), 0.0, 0])
+                h[0] = [a + b for a, b in zip(h[0], buckets)]
+                h[1] += total
+                h[2] += count
+            # end for
+
+            for endpoint, status, n in state['requests']:
+                requests[(endpoint, status)] = requests.get((endpoint, status), 0) + n
+            # end for
+        # end for
+
+        return histograms, requests
+
+    def render(self) -> str:
+        histograms, requests = self._totals()
+        module = self.module
+        lines = ['# HELP saroj_requests_total Requests handled, by endpoint and status.',
+                 '# TYPE saroj_requests_total counter']
+
+        for (endpoint, status), n in sorted(requests.items()):
+            lines.append(f'saroj_requests_total{{module="{module}",endpoint="{endpoint}",status="{status}"}} {n}')
+        # end for
+
+        lines.append('# HELP saroj_phase_seconds Time spent in each phase of a request, by document size.')
+        lines.append('# TYPE saroj_phase_seconds histogram')
+
+        for (phase, size), (buckets, total, count) in sorted(histograms.items()):
+            labels = f'module="{module}",phase="{phase}",size="{size}"'
+            cumulative = 0
+
+            for limit, n in zip(LATENCY_BUCKETS, buckets):
+                cumulative += n
+                lines.append(f'saroj_phase_seconds_bucket{{{labels},le="{limit}"}} {cumulative}')
+            # end for
+
+            lines.append(f'saroj_phase_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'saroj_phase_seconds_sum{{{labels}}} {total:.6f}')
+            lines.append(f'saroj_phase_seconds_count{{{labels}}} {count}')
+        # end for
+
+        return '\n'.join(lines) + '\n'
+
+    def close(self):
+        """Removes the folder, in the process that created it; the workers inherit this call at exit."""
+
+        if os.getpid() == self._owner:
+            shutil.rmtree(self._folder, ignore_errors=True)
+        # end if
+
+
+@contextmanager
+def timer(phase: str):
+    """Times the block as `phase` (e.g. parse, annotate, write) of the current request.
+    Does nothing outside of a request of a module with `install_metrics()`, e.g. in the in-process pipeline."""
+
+    if _metrics is None or not has_request_context():
+        yield
+        return
+    # end if
+
+    start = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        _metrics.observe(phase, g.get('saroj_size', LARGEST_SIZE), time.perf_counter() - start)
+    # end try
+
+
+def request_endpoint() -> str:
+    """The route of the current request, e.g. `/process`, so that the endpoint label has as many
+    values as the module has routes, whatever paths are requested."""
+
+    return request.url_rule.rule if request.url_rule is not None else UNMATCHED_ENDPOINT
+
+
+def install_metrics(app, module: str, service_endpoints: tuple[str, ...] = ()) -> Metrics:
+    """Times every request of the Flask `app` as the `request` phase, counts the requests
+    by their JSON status and adds the `/metrics` endpoint. Call it before the workers are forked.
+    The requests of `service_endpoints`, the routes of the module that do not process documents
+    (e.g. `/admin/dictionary`), are counted but not timed, as `/checkHealth` is."""
+
+    global _metrics
+    _metrics = metrics = Metrics(module)
+    atexit.register(metrics.close)
+    untimed = _SERVICE_ENDPOINTS + (UNMATCHED_ENDPOINT,) + tuple(service_endpoints)
+
+    @app.before_request
+    def _start_request():
+        if request_endpoint() not in untimed:
+            g.saroj_size = size_bucket(request_size())
+            g.saroj_start = time.perf_counter()
+        # end if
+
+    @app.after_request
+    def _end_request(response):
+        endpoint = request_endpoint()
+
+        if endpoint == '/metrics':
+            return response
+        # end if
+
+        if 'saroj_start' in g:
+            metrics.observe('request', g.saroj_size, time.perf_counter() - g.saroj_start)
+        # end if
+
+        status = 'HTTP_' + str(response.status_code)
+
+        if response.is_json:
+            data = response.get_json(silent=True)
+
+            if isinstance(data, dict) and 'status' in data:
+                status = str(data['status'])
+            # end if
+        # end if
+
+        metrics.count_request(endpoint, status)
+        metrics.flush()
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def _serve_metrics():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    return metrics
@@ -0,0 +1,871 @@
+import argparse
+import base64
+import importlib
+import json
+import os
+import queue
+import shlex
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager, nullcontext
+
+from .conllu_document import CoNLLUDocument
+from .file_lock import file_lock
+
+# The folder with all the modules: TextExtractor, RegexAnnotator, etc.
+MODULES_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+
+class PipelineError(RuntimeError):
+    """Raised when one step of the anonymization pipeline fails.
+    The message is the one that ends up in the task file."""
+    pass
+
+
+def parse_module_commands(commands: list[str]) -> dict[int, tuple[str, list[str]]]:
+    """Takes the `modules` list from the `config.json` of the Web Service, e.g.
+    `source /venv/bin/activate ; cd /modules/RegexAnnotator ; python annotator_api.py 8002 2>&1 | ...`
+    and returns a dictionary from the port of each module to the module folder name
+    and the command line arguments of its Python script."""
+
+    modules = {}
+
+    for command in commands:
+        module_name = ''
+        module_argv = []
+
+        for part in command.split(';'):
+            # Drop the logging part, e.g. '2>&1 | /usr/bin/rotatelogs ...'
+            words = shlex.split(part.split('|')[0])
+
+            if len(words) >= 2 and words[0] == 'cd':
+                module_name = os.path.basename(os.path.normpath(words[1]))
+            elif words and words[0].startswith('python') and len(words) >= 2:
+                module_argv = [w for w in words[2:] if w != '2>&1']
+            # end if
+        # end for
+
+        if module_name:
+            # The port is the first bare number, not the value of an option, e.g. `--WORKERS 2`
+            for i, w in enumerate(module_argv):
+                if w.isdigit() and (i == 0 or not module_argv[i - 1].startswith('--')):
+                    modules[int(w)] = (module_name, module_argv)
+                    break
+                # end if
+            # end for
+        # end if
+    # end for
+
+    return modules
+
+
+class PipelineContext(object):
+    """Holds the state of one document going through the pipeline:
+    the named values of the task (e.g. `DOCX`, `CASEMAP`, `OUTPUT`, as in `runTask()`
+    from `start.php`) and the in-memory documents produced by the in-process stages.
+    Documents are `CoNLLUDocument` objects, handed from stage to stage without re-parsing."""
+
+    def __init__(self, values: dict[str, str], run_dir: str):
+        self.values = dict(values)
+        # The files of the task, e.g. `DOCX` and `OUTPUT`, the other names are intermediary documents
+        self.task_names = frozenset(values)
+        self.documents = {}
+        self.run_dir = run_dir
+        # Seconds spent in each step, by step index
+        self.step_times = {}
+        # Steps running in parallel may read or write the same document
+        self._lock = threading.RLock()
+        # In-memory documents that are already written to their file
+        self._written = set()
+
+    def value(self, name: str) -> str:
+        """Returns the value of `name`. Unknown names are file paths
+        in the run folder, like in `runTask()`."""
+
+        if name not in self.values:
+            self.values[name] = os.path.join(self.run_dir, name)
+        # end if
+
+        return self.values[name]
+
+    def document(self, name: str) -> CoNLLUDocument:
+        """Returns the document called `name`, reading it from its file
+        if a previous stage did not leave it in memory."""
+
+        with self._lock:
+            if name not in self.documents:
+                self.documents[name] = CoNLLUDocument.read(self.value(name))
+                self._written.add(name)
+            # end if
+
+            return self.documents[name]
+        # end with
+
+    def set_document(self, name: str, document: CoNLLUDocument):
+        with self._lock:
+            self.documents[name] = document
+            self._written.discard(name)
+        # end with
+
+    def drop_document(self, name: str):
+        """Forgets the in-memory copy of `name`, after a module wrote its file."""
+
+        with self._lock:
+            self.documents.pop(name, None)
+            self._written.discard(name)
+        # end with
+
+    def materialize(self, name: str) -> str:
+        """Writes the in-memory document `name` to its file, if there is one.
+        Returns the path of the file."""
+
+        with self._lock:
+            path = self.value(name)
+
+            if name in self.documents and name not in self._written:
+                self.documents[name].write(path)
+                self._written.add(name)
+            # end if
+
+            return path
+        # end with
+
+
+@contextmanager
+def _module_environment(module_dir: str, script: str, argv: list[str]):
+    """Makes a module importable as a library: its folder goes first on `sys.path`
+    and `sys.argv` is the command line the module would have been started with,
+    as the `*_config.py` files parse it at import time."""
+
+    old_argv = sys.argv
+    sys.argv = [script] + argv
+    sys.path.insert(0, module_dir)
+
+    try:
+        yield
+    finally:
+        sys.argv = old_argv
+        sys.path.remove(module_dir)
+    # end try
+
+
+class Stage(object):
+    """One step of the pipeline. Sub-classes implement `process()`,
+    which takes the `key` -> `value` arguments of the step from the `anonymization`
+    list of `config.json` and the context of the current document.
+    In-process stages use module globals, so the runner only lets one
+    document at a time through a stage that is not `thread_safe`."""
+
+    thread_safe = False
+
+    def process(self, step_args: dict[str, str | list[str]], ctx: PipelineContext):
+        raise NotImplementedError('Do not know how to run this stage. Please implement me!')
+
+
+def _multipart_body(fields: dict[str, str], files: dict[str, bytes]) -> tuple[bytes, str]:
+    """Returns the body and the content type of a multipart/form-data request."""
+
+    boundary = uuid.uuid4().hex
+    parts = []
+
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'.encode('utf-8'))
+        parts.append(value.encode('utf-8') + b'\r\n')
+    # end for
+
+    for name, data in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{name}"\r\n'
+                     'Content-Type: application/octet-stream\r\n\r\n'.encode('utf-8'))
+        parts.append(data + b'\r\n')
+    # end for
+
+    parts.append(f'--{boundary}--\r\n'.encode('utf-8'))
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class HTTPStage(Stage):
+    """Runs a step by calling the `/process` endpoint of the module, exactly as
+    `start.php` does. Used for the modules that are not run in-process
+    (BERTAnnotator, RNER).
+
+    With `inline`, the intermediary documents are sent in the request, in the binary
+    form of `CoNLLUDocument.to_bytes()`, and the output comes back in the response,
+    so the module needs no access to the run folder, e.g. in another container.
+    The files of the task and the case map are still passed as paths."""
+
+    thread_safe = True
+
+    def __init__(self, port: int, host: str = '127.0.0.1', inline: bool = False):
+        self._port = port
+        self._host = host
+        self._inline = inline
+
+    def _call(self, request: urllib.request.Request | str) -> dict:
+        try:
+            with urllib.request.urlopen(request) as response:
+                result = json.loads(response.read().decode('utf-8'))
+            # end with
+        except OSError:
+            raise PipelineError(f'No answer on port {self._port}')
+        except json.JSONDecodeError:
+            raise PipelineError(f'Invalid JSON on port {self._port}')
+        # end try
+
+        if not isinstance(result, dict) or 'status' not in result:
+            raise PipelineError(f'Invalid JSON on port {self._port}')
+        elif result['status'] != 'OK':
+            raise PipelineError(f'Error on port {self._port}: {result.get("message", "")}')
+        # end if
+
+        return result
+
+    def _process_inline(self, step_args: dict[str, str | list[str]], ctx: PipelineContext):
+        step_data = {}
+        files = {}
+
+        def inline_input(name: str) -> dict:
+            if name in ctx.task_names:
+                return ctx.materialize(name)
+            # end if
+
+            part = f'document{len(files)}'
+            files[part] = ctx.document(name).to_bytes()
+            return {'file': part, 'encoding': 'binary'}
+
+        for key, value in step_args.items():
+            if key == 'output' and isinstance(value, str) and value not in ctx.task_names:
+                step_data[key] = {'encoding': 'binary'}
+            elif key == 'input' and isinstance(value, list):
+                step_data[key] = [inline_input(v) for v in value]
+            elif key == 'input':
+                step_data[key] = inline_input(value)
+            elif isinstance(value, list):
+                step_data[key] = [ctx.materialize(v) for v in value]
+            else:
+                step_data[key] = ctx.materialize(value)
+            # end if
+        # end for
+
+        body, content_type = _multipart_body({'input': json.dumps(step_data)}, files)
+        result = self._call(urllib.request.Request(f'http://{self._host}:{self._port}/process', data=body,
+                                                   headers={'Content-Type': content_type}))
+
+        if isinstance(step_data.get('output'), dict):
+            output = result.get('output')
+
+            try:
+                document = CoNLLUDocument.from_bytes(base64.b64decode(output['content']))
+            except (TypeError, KeyError, ValueError) as e:
+                raise PipelineError(f'Invalid output document on port {self._port}: {e}')
+            # end try
+
+            ctx.set_document(step_args['output'], document)
+        elif 'output' in step_args and not isinstance(step_args['output'], list):
+            ctx.drop_document(step_args['output'])
+        # end if
+
+    def process(self, step_args: dict[str, str | list[str]], ctx: PipelineContext):
+        if self._inline:
+            self._process_inline(step_args, ctx)
+            return
+        # end if
+
+        step_data = {}
+
+        for key, value in step_args.items():
+            if isinstance(value, list):
+                step_data[key] = [ctx.materialize(v) for v in value]
+            else:
+                step_data[key] = ctx.materialize(value)
+            # end if
+        # end for
+
+        url = f'http://{self._host}:{self._port}/process?input=' + \
+            urllib.parse.quote(json.dumps(step_data))
+        self._call(url)
+
+        # The output was written by the module, drop any stale in-memory copy
+        if 'output' in step_args and not isinstance(step_args['output'], list):
+            ctx.drop_document(step_args['output'])
+        # end if
+
+
+def _input_type(step_args: dict[str, str | list[str]], ctx: PipelineContext) -> str:
+    """The document type of a TextExtractor or TextReconstruction step, read as their `/process`
+    handlers do: the `type` argument, lowercase, and `docx` if there is none or it is unknown."""
+
+    input_type = ctx.value(step_args['type']).lower() if 'type' in step_args else 'docx'
+
+    if input_type not in ('txt', 'docx', 'html'):
+        input_type = 'docx'
+    # end if
+
+    return input_type
+
+
+class TextExtractorStage(Stage):
+    def __init__(self, module_dir: str, argv: list[str]):
+        with _module_environment(module_dir, 'textExtractor_api.py', argv):
+            process = importlib.import_module('textExtractor_process')
+            helpers = importlib.import_module('textExtractor_helpers')
+            config = importlib.import_module('textExtractor_config')
+        # end with
+
+        self._process = process
+        self._args = config.args
+        self._model = None
+
+        # Same as in the __main__ of textExtractor_api.py
+        if self._args.udpipe_model:
+            self._model = process.ud.Model.load(self._args.udpipe_model)
+        # end if
+
+        if not self._args.RUN_ANALYSIS:
+            import spacy
+            self._model = spacy.load("ro_core_news_sm")
+        # end if
+
+        self._allowed_file = helpers.allowed_file
+        self._regex, self._replacements = helpers.create_replacement_regex()
+
+    def process(self, step_args: dict[str, str | list[str]], ctx: PipelineContext):
+        input_type = _input_type(step_args, ctx)
+        input_file = ctx.value(step_args['input'])
+
+        # Same check as in convert_job() of textExtractor_api.py
+        if input_type == 'docx' and not self._allowed_file(input_file):
+            raise PipelineError('Invalid file format.')
+        # end if
+
+        conllup_text = self._process.docx_to_conllup_text(
+            self._model, input_file, ctx.value(step_args['output']),
+            self._regex, self._replacements, input_type, self._args.dtw, self._args.align2)
+        ctx.set_document(step_args['output'], CoNLLUDocument.from_lines(conllup_text.splitlines()))
+
+
+class RegexAnnotatorStage(Stage):
+    def __init__(self, module_dir: str, argv: list[str]):
+        with _module_environment(module_dir, 'annotator_api.py', argv):
+            self._annotator = importlib.import_module('annotator')
+        # end with
+
+    def process(self, step_args: dict[str, str | list[str]], ctx: PipelineContext):
+        ann = self._annotator.RegExAnnotator(document=ctx.document(step_args['input']))
+        ctx.set_document(step_args['output'], ann.annotate_document())
+
+
+class EntityEncodingStage(Stage):
+    def __init__(self, module_dir: str, argv: list[str]):
+        with _module_environment(module_dir, 'entityEncoding_api.py', argv):
+            self._process = importlib.import_module('entityEncoding_process')
+        # end with
+
+    def process(self, step_args: dict[str, str | list[str]], ctx: PipelineContext):
+        document = ctx.document(step_args['input'])
+        mapping_path = ctx.value(step_args['mapping'])
+        tokens = self._process.read_tokens_from_document(document)
+
+        # The module processes, or other pipelines, may update the same case map
+        with file_lock(mapping_path):
+            mapping = self._process.read_mapping(mapping_path)
+            updated_mapping = self._process.update_mapping(tokens, mapping, mapping_path)
+        # end with
+
+        ctx.set_document(step_args['output'],
+                         self._process.update_ner_tags(document, updated_mapping, tokens))
+
+
+class EntityMappingStage(Stage):
+    def __init__(self, module_dir: str, argv: list[str]):
+        with _module_environment(module_dir, 'entityMapping_api.py', argv):
+            self._process = importlib.import_module('entityMapping_process')
+            config = importlib.import_module('entityMapping_config')
+        # end with
+
+        args = config.args
+        # Same as in the __main__ of entityMapping_api.py
+        self._dicts = {
+            "replacement": self._process.read_replacement_dictionary(args.DICTIONARY) if args.DICTIONARY else {},
+            "config": self._process.read_config_file(args.CONFIG) if args.CONFIG else {}
+        }
+
+    def process(self, step_args: dict[str, str | list[str]], ctx: PipelineContext):
+        document = ctx.document(step_args['input'])
+        mapping_path = ctx.value(step_args['mapping'])
+
+        # The module processes, or other pipelines, may update the same case map
+        with file_lock(mapping_path):
+            ctx.set_document(step_args['output'], self._process.anonymize_document(document, mapping_path, self._dicts))
+        # end with
+
+
+class DictionaryStage(Stage):
+    def __init__(self, module_dir: str, argv: list[str]):
+        with _module_environment(module_dir, 'dictionary_api.py', argv):
+            self._process = importlib.import_module('dictionary_process')
+            store = importlib.import_module('dictionary_store')
+            config = importlib.import_module('dictionary_config')
+        # end with
+
+        # Same as in the __main__ of dictionary_api.py, with the changes made through its /admin/dictionary
+        self._store = store.DictionaryStore(config.args.DICTIONARY, config.args.SNAPSHOT)
+
+    def process(self, step_args: dict[str, str | list[str]], ctx: PipelineContext):
+        snapshot = self._store.sync()
+        ctx.set_document(step_args['output'], self._process.assign_ner_to_document(
+            ctx.document(step_args['input']), snapshot.matcher, snapshot.max_count))
+
+
+class VotingStage(Stage):
+    def __init__(self, module_dir: str, argv: list[str]):
+        with _module_environment(module_dir, 'voting_api.py', argv):
+            self._process = importlib.import_module('voting_process')
+            config = importlib.import_module('voting_config')
+        # end with
+
+        self._algorithm = config.args.ALGORITHM
+
+    def process(self, step_args: dict[str, str | list[str]], ctx: PipelineContext):
+        inputs = step_args['input']
+
+        if not isinstance(inputs, list):
+            inputs = [inputs]
+        # end if
+
+        document = self._process.vote_documents(self._algorithm, [ctx.document(name) for name in inputs])
+
+        if document is None:
+            raise PipelineError(f'Unknown voting algorithm {self._algorithm}')
+        # end if
+
+        ctx.set_document(step_args['output'], document)
+
+
+class TextReconstructionStage(Stage):
+    def __init__(self, module_dir: str, argv: list[str]):
+        with _module_environment(module_dir, 'textReconstruction_api.py', argv):
+            self._process = importlib.import_module('textReconstruction_process')
+        # end with
+
+        self._save_internal_files = '--SAVE_INTERNAL_FILES' in argv or '-s' in argv
+
+    def process(self, step_args: dict[str, str | list[str]], ctx: PipelineContext):
+        input_type = _input_type(step_args, ctx)
+        conllup_data = self._process.check_conllup(ctx.document(step_args['input']))
+        self._process.anonymize(conllup_data, ctx.value(step_args['original']),
+                                ctx.value(step_args['output']), self._save_internal_files, input_type)
+
+
+# Modules that can be imported and run in the same process as the pipeline
+IN_PROCESS_STAGES = {
+    'TextExtractor': TextExtractorStage,
+    'RegexAnnotator': RegexAnnotatorStage,
+    'EntityEncoding': EntityEncodingStage,
+    'EntityMapping': EntityMappingStage,
+    'Dictionary': DictionaryStage,
+    'Voting': VotingStage,
+    'TextReconstruction': TextReconstructionStage,
+}
+
+
+def _step_names(step_args: dict[str, str | list[str]]) -> tuple[set[str], set[str]]:
+    """Returns the names a step reads and the names it writes: its `output`,
+    and the case map, which EntityEncoding and EntityMapping both update."""
+
+    reads = set()
+    writes = set()
+
+    for key, value in step_args.items():
+        names = value if isinstance(value, list) else [value]
+        (writes if key == 'output' else reads).update(names)
+    # end for
+
+    if 'CASEMAP' in reads:
+        writes.add('CASEMAP')
+    # end if
+
+    return reads, writes
+
+
+def step_dependencies(steps: list[dict]) -> list[set[int]]:
+    """Returns, for each step of the `anonymization` list, the indexes of the earlier steps
+    it has to wait for: the steps that write what it reads, read what it writes
+    or write the same name, and the steps listed in its optional `after` key,
+    by their `id` key or port. Running the steps in this order gives the same
+    result as running them one after the other, so independent annotators
+    that read the same tokenized file can run at the same time, e.g.
+
+    `{"port": 8011, "id": "voting", "after": [8002, "bert"], "args": [...]}`"""
+
+    names = []
+    dependencies = []
+
+    for j, step in enumerate(steps):
+        reads, writes = _step_names({arg['key']: arg['value'] for arg in step['args']})
+        after = {str(a) for a in step.get('after', [])}
+        depends = set()
+
+        for i, (i_reads, i_writes) in enumerate(names):
+            if i_writes & (reads | writes) or writes & i_reads or \
+                    str(steps[i].get('id', steps[i]['port'])) in after or str(steps[i]['port']) in after:
+                depends.add(i)
+            # end if
+        # end for
+
+        names.append((reads, writes))
+        dependencies.append(depends)
+    # end for
+
+    return dependencies
+
+
+class PipelineRunner(object):
+    """Runs the `anonymization` steps of the Web Service `config.json` on one document.
+    Modules from `IN_PROCESS_STAGES` are imported as libraries and the CoNLL-U documents
+    are passed from stage to stage in memory. The other modules are called over HTTP,
+    as `start.php` does, with their input files written to disk just before the call.
+
+    With `parallel`, each step starts as soon as the steps it depends on are done
+    (see `step_dependencies()`) instead of after the previous step of the list,
+    so that the annotators run at the same time and Voting waits for all of them.
+
+    With `inline_transport`, the modules called over HTTP get the intermediary documents in the
+    request instead of a path in the run folder, see `HTTPStage`. A step can name the `host`
+    of its module, for modules that run elsewhere."""
+
+    def __init__(self, config: dict, modules_dir: str = MODULES_DIR, in_process: bool = True,
+                 parallel: bool = False, inline_transport: bool = False):
+        self._steps = config['anonymization']
+        self._step_args = [{arg['key']: arg['value'] for arg in step['args']} for step in self._steps]
+        self._dependencies = step_dependencies(self._steps)
+        self._parallel = parallel
+        self._stages = {}
+        self._stage_locks = {}
+        self._modules = modules = parse_module_commands(config.get('modules', []))
+
+        for step in self._steps:
+            port = int(step['port'])
+
+            if port in self._stages:
+                continue
+            # end if
+
+            if in_process and port in modules and modules[port][0] in IN_PROCESS_STAGES:
+                module_name, module_argv = modules[port]
+                self._stages[port] = IN_PROCESS_STAGES[module_name](
+                    os.path.join(modules_dir, module_name), module_argv)
+                self._stage_locks[port] = threading.Lock()
+            else:
+                self._stages[port] = HTTPStage(port, step.get('host', '127.0.0.1'), inline=inline_transport)
+            # end if
+        # end for
+
+    @staticmethod
+    def uses_case_map(step_args: dict[str, str | list[str]]) -> bool:
+        """True if the step reads or writes the case map file, e.g. EntityEncoding and EntityMapping."""
+
+        for value in step_args.values():
+            if value == 'CASEMAP' or (isinstance(value, list) and 'CASEMAP' in value):
+                return True
+            # end if
+        # end for
+
+        return False
+
+    def step_names(self) -> list[str]:
+        """The name of each step, `<module>:<port>`, or the port for modules not in the `modules` list."""
+
+        names = []
+
+        for step in self._steps:
+            port = int(step['port'])
+            names.append(f'{self._modules[port][0]}:{port}' if port in self._modules else str(port))
+        # end for
+
+        return names
+
+    def is_in_process(self, index: int) -> bool:
+        return not isinstance(self._stages[int(self._steps[index]['port'])], HTTPStage)
+
+    def run_step(self, index: int, ctx: PipelineContext, case_map_lock=None):
+        """Runs the step `index` of the `anonymization` list on the document of `ctx`,
+        whose previous steps must be done, and records its time in `ctx.step_times`."""
+
+        port = int(self._steps[index]['port'])
+        step_args = self._step_args[index]
+        map_lock = case_map_lock if case_map_lock is not None and self.uses_case_map(step_args) \
+            else nullcontext()
+
+        try:
+            with map_lock, self._stage_locks.get(port, nullcontext()):
+                start = time.perf_counter()
+                self._stages[port].process(step_args, ctx)
+                ctx.step_times[index] = time.perf_counter() - start
+            # end with
+        except PipelineError:
+            raise
+        except Exception as e:
+            raise PipelineError(f'Error on port {port}: {e}') from e
+        # end try
+
+    def _run_parallel(self, ctx: PipelineContext, case_map_lock):
+        waiting = dict(enumerate(self._dependencies))
+        done = set()
+        running = {}
+        error = None
+
+        with ThreadPoolExecutor(max_workers=len(self._steps)) as executor:
+            while running or (waiting and error is None):
+                if error is None:
+                    for index in [i for i, depends in waiting.items() if depends <= done]:
+                        del waiting[index]
+                        running[executor.submit(self.run_step, index, ctx, case_map_lock)] = index
+                    # end for
+                # end if
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+
+                for future in finished:
+                    index = running.pop(future)
+
+                    # The steps already started are let to finish, no other step is started
+                    if future.exception() is not None:
+                        if error is None:
+                            error = future.exception()
+                        # end if
+                    else:
+                        done.add(index)
+                    # end if
+                # end for
+            # end while
+        # end with
+
+        if error is not None:
+            raise error
+        # end if
+
+    def run(self, values: dict[str, str], run_dir: str, case_map_lock=None) -> PipelineContext:
+        """Runs all the steps for the document described by `values`,
+        e.g. `{'DOCX': ..., 'TYPE': 'docx', 'CASEMAP': ..., 'OUTPUT': ...}`.
+        The steps that use the case map run while holding `case_map_lock`, if given,
+        so that documents can go through the other steps at the same time.
+        Raises `PipelineError` if a step fails."""
+
+        ctx = PipelineContext(values, run_dir)
+
+        if self._parallel:
+            self._run_parallel(ctx, case_map_lock)
+        else:
+            for index in range(len(self._steps)):
+                self.run_step(index, ctx, case_map_lock)
+            # end for
+        # end if
+
+        # Outputs requested by the caller, e.g. OUTPUTANN, must end up on disk
+        for name in values:
+            ctx.materialize(name)
+        # end for
+
+        return ctx
+
+
+class _StageLane(object):
+    """The queue and the workers of one step of a `PipelinedRunner`, with their statistics."""
+
+    def __init__(self, name: str, workers: int, queue_size: int):
+        self.name = name
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.threads = []
+        self.lock = threading.Lock()
+        self.active = 0
+        self.processed = 0
+        self.failed = 0
+        # Seconds spent running the step, and waiting for room in the next queue
+        self.busy_time = 0.0
+        self.blocked_time = 0.0
+
+    def stats(self, elapsed: float) -> dict:
+        with self.lock:
+            return {
+                'stage': self.name,
+                'workers': self.workers,
+                'queued': self.queue.qsize(),
+                'active': self.active,
+                'processed': self.processed,
+                'failed': self.failed,
+                'busy_time': round(self.busy_time, 3),
+                'blocked_time': round(self.blocked_time, 3),
+                'utilization': round(self.busy_time / (elapsed * self.workers), 3) if elapsed > 0 else 0.0,
+            }
+        # end with
+
+
+class PipelinedRunner(PipelineRunner):
+    """Runs the steps of many documents at the same time, like an assembly line:
+    every step has its own queue and its own workers, so that a document can be in
+    TextReconstruction while the next one is in BERTAnnotator. A document goes
+    through the steps in the order of the `anonymization` list.
+
+    The queues hold at most `queue_size` documents. A worker that finishes a document
+    waits until there is room in the queue of the next step, and `run()` waits for room
+    in the first one, so a slow step holds back the steps before it instead of
+    letting documents pile up in memory.
+
+    The number of workers of a step is `stage_workers[port]`, else the `workers` key
+    of the step in `config.json`, else 1. Use more for the expensive steps, e.g. BERT,
+    and one for the steps that are not `thread_safe`, which run one document at a time anyway."""
+
+    def __init__(self, config: dict, modules_dir: str = MODULES_DIR, in_process: bool = True,
+                 stage_workers: dict[int, int] | None = None, queue_size: int = 2, inline_transport: bool = False):
+        super().__init__(config, modules_dir=modules_dir, in_process=in_process, inline_transport=inline_transport)
+        self._started_at = time.monotonic()
+        self._lanes = []
+
+        for step, name in zip(self._steps, self.step_names()):
+            port = int(step['port'])
+            workers = max(1, int((stage_workers or {}).get(port, step.get('workers', 1))))
+
+            if workers > 1 and not self._stages[port].thread_safe:
+                print(f'Stage on port {port} is not thread safe, using 1 worker instead of {workers}', flush=True)
+                workers = 1
+            # end if
+
+            self._lanes.append(_StageLane(name, workers, queue_size))
+        # end for
+
+        for index, lane in enumerate(self._lanes):
+            for _ in range(lane.workers):
+                thread = threading.Thread(target=self._stage_worker, args=(index,), daemon=True,
+                                          name=f'stage-{lane.name}')
+                thread.start()
+                lane.threads.append(thread)
+            # end for
+        # end for
+
+    def _stage_worker(self, index: int):
+        lane = self._lanes[index]
+
+        while True:
+            job = lane.queue.get()
+
+            if job is None:
+                break
+            # end if
+
+            ctx, case_map_lock, future = job
+            start = time.monotonic()
+
+            with lane.lock:
+                lane.active += 1
+            # end with
+
+            try:
+                self.run_step(index, ctx, case_map_lock)
+                error = None
+            except Exception as e:
+                error = e
+            # end try
+
+            end = time.monotonic()
+
+            with lane.lock:
+                lane.active -= 1
+                lane.busy_time += end - start
+
+                if error is None:
+                    lane.processed += 1
+                else:
+                    lane.failed += 1
+                # end if
+            # end with
+
+            if error is not None:
+                future.set_exception(error)
+            elif index + 1 < len(self._lanes):
+                self._lanes[index + 1].queue.put(job)
+
+                with lane.lock:
+                    lane.blocked_time += time.monotonic() - end
+                # end with
+            else:
+                future.set_result(ctx)
+            # end if
+        # end while
+
+    def submit(self, values: dict[str, str], run_dir: str, case_map_lock=None) -> Future:
+        """Queues the document described by `values` and returns a `Future` with
+        its `PipelineContext`. Blocks while the queue of the first step is full."""
+
+        future = Future()
+        self._lanes[0].queue.put((PipelineContext(values, run_dir), case_map_lock, future))
+        return future
+
+    def run(self, values: dict[str, str], run_dir: str, case_map_lock=None) -> PipelineContext:
+        """Same as `PipelineRunner.run()`, to be called from many threads at the same time."""
+
+        ctx = self.submit(values, run_dir, case_map_lock).result()
+
+        for name in values:
+            ctx.materialize(name)
+        # end for
+
+        return ctx
+
+    def stats(self) -> list[dict]:
+        """Returns, for each step, the documents waiting in its queue and being processed,
+        how many were done, and its utilization: the time its workers were busy
+        over the time they were available."""
+
+        elapsed = time.monotonic() - self._started_at
+        return [lane.stats(elapsed) for lane in self._lanes]
+
+    def close(self):
+        """Stops the workers once the queued documents are done."""
+
+        for lane in self._lanes:
+            for _ in range(lane.workers):
+                lane.queue.put(None)
+            # end for
+
+            for thread in lane.threads:
+                thread.join()
+            # end for
+        # end for
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs the anonymization pipeline in-process on one document.')
+    parser.add_argument('CONFIG', type=str, help='the config.json file of the Web Service')
+    parser.add_argument('INPUT', type=str, help='the document to anonymize')
+    parser.add_argument('OUTPUT', type=str, help='where to write the anonymized document')
+    parser.add_argument('--type', type=str, default='docx', help='document type: docx, txt or html')
+    parser.add_argument('--caseid', type=str, default='case', help='case ID, selects the case map file')
+    parser.add_argument('--docid', type=str, default='doc', help='document ID')
+    parser.add_argument('--cases-dir', type=str, default='/data/cases', help='folder with the case map files')
+    parser.add_argument('--run-dir', type=str, default='/data/tasks/run', help='folder for the intermediary files')
+    parser.add_argument('--http', action='store_true', help='call all modules over HTTP, as start.php does')
+    parser.add_argument('--parallel', action='store_true', help='run the steps that do not depend on each other at the same time')
+    parser.add_argument('--inline-transport', action='store_true',
+                        help='send the intermediary documents to the HTTP modules in the request, not as paths')
+    args = parser.parse_args()
+
+    with open(args.CONFIG, mode='r', encoding='utf-8') as f:
+        config = json.load(f)
+    # end with
+
+    runner = PipelineRunner(config, in_process=not args.http, parallel=args.parallel,
+                            inline_transport=args.inline_transport)
+    runner.run(values={
+        'CASEID': args.caseid,
+        'DOCID': args.docid,
+        'DOCX': os.path.abspath(args.INPUT),
+        'TYPE': args.type,
+        'CASEMAP': os.path.join(args.cases_dir, f'{args.caseid}.map'),
+        'OUTPUT': os.path.abspath(args.OUTPUT),
+    }, run_dir=args.run_dir)
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from flask import g, request
+
+# Also imported by RNER, which runs on Python 3.7.
+
+# Seconds between two samples of the stack of the request thread
+SAMPLE_INTERVAL = 0.005
+# Functions listed in the top functions report
+TOP_FUNCTIONS = 40
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f'{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}'
+
+
+class StackSampler(object):
+    """A sampling profiler: a thread that takes the Python stack of `thread_id` every `interval`
+    seconds. Native code, e.g. UDPipe or PyTorch, shows as the Python function that called it.
+    Work done in other processes, e.g. RegexAnnotator with --PROCESSES, is not seen."""
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self._thread_id = thread_id
+        self._interval = interval
+        self._stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name='profile-sampler')
+        self.samples = 0
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            frame = sys._current_frames().get(self._thread_id)
+
+            if frame is None:
+                continue
+            # end if
+
+            stack = []
+
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            # end while
+
+            self._stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+        # end while
+
+    def collapsed(self) -> str:
+        """The stacks in the collapsed format of `flamegraph.pl` and speedscope: `root;...;leaf count`."""
+        return ''.join(f'{stack} {n}\n' for stack, n in self._stacks.most_common())
+
+    def top(self, limit: int = TOP_FUNCTIONS) -> str:
+        """The functions with the most samples, on top of the stack (self) and anywhere in it (total)."""
+
+        own = Counter()
+        total = Counter()
+
+        for stack, n in self._stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += n
+
+            for name in set(frames):
+                total[name] += n
+            # end for
+        # end for
+
+        samples = max(1, self.samples)
+        lines = [f'{self.samples} samples, every {self._interval * 1000:.1f} ms\n\n',
+                 f'{"self %":>8}{"total %":>9}  function\n']
+
+        for name, n in own.most_common(limit):
+            lines.append(f'{100 * n / samples:>8.1f}{100 * total[name] / samples:>9.1f}  {name}\n')
+        # end for
+
+        lines.append(f'\n{"total %":>8}  function\n')
+
+        for name, n in total.most_common(limit):
+            lines.append(f'{100 * n / samples:>8.1f}  {name}\n')
+        # end for
+
+        return ''.join(lines)
+
+
+def _profile_prefix() -> str:
+    """Where to write the profile of the current request: next to its output file,
+    or in the temporary folder if the output is not a file, e.g. with `/process_batch`."""
+
+    try:
+        data = json.loads(request.values.get('input', 'null'))
+    except ValueError:
+        data = None
+    # end try
+
+    output = data.get('output') if isinstance(data, dict) else None
+
+    if isinstance(output, str) and output and os.path.isdir(os.path.dirname(os.path.abspath(output))):
+        return output
+    # end if
+
+    return os.path.join(tempfile.gettempdir(), f'saroj-{os.getpid()}-{int(time.time() * 1000)}')
+
+
+def _write_profile(prefix: str, reports: dict[str, str]) -> list[str]:
+    paths = []
+
+    for suffix, text in reports.items():
+        path = f'{prefix}.{suffix}'
+
+        try:
+            with open(path, mode='w', encoding='utf-8') as f:
+                f.write(text)
+            # end with
+
+            paths.append(path)
+        except OSError as e:
+            print(f'Cannot write the profile [{path}]: {e}', file=sys.stderr, flush=True)
+        # end try
+    # end for
+
+    return paths
+
+
+def install_profiling(app):
+    """Profiles the requests of the Flask `app` that have the `profile` parameter, e.g.
+    `/process?profile=true&input=...`: `true` (or `sample`) samples the stack of the request
+    and writes `<output>.collapsed` and `<output>.top.txt`; `cprofile` runs the deterministic
+    profiler, slower but exact, and writes `<output>.pstats` and `<output>.top.txt`.
+    The paths are added to the JSON response, in "profile". Other requests only pay
+    for the lookup of the parameter."""
+
+    @app.before_request
+    def _start_profile():
+        mode = request.args.get('profile') or request.form.get('profile')
+
+        if not mode or mode.lower() in ('false', '0', 'no'):
+            return
+        # end if
+
+        if mode.lower() == 'cprofile':
+            g.saroj_profiler = cProfile.Profile()
+            g.saroj_profiler.enable()
+        else:
+            g.saroj_profiler = StackSampler(threading.get_ident())
+            g.saroj_profiler.start()
+        # end if
+
+    @app.after_request
+    def _end_profile(response):
+        profiler = g.pop('saroj_profiler', None)
+
+        if profiler is None:
+            return response
+        # end if
+
+        prefix = _profile_prefix()
+
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            paths = []
+
+            try:
+                profiler.dump_stats(f'{prefix}.pstats')
+                paths.append(f'{prefix}.pstats')
+            except OSError as e:
+                print(f'Cannot write the profile [{prefix}.pstats]: {e}', file=sys.stderr, flush=True)
+            # end try
+
+            text = io.StringIO()
+            pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+            text.write('\n')
+            pstats.Stats(profiler, stream=text).sort_stats('tottime').print_stats(TOP_FUNCTIONS)
+            paths += _write_profile(prefix, {'top.txt': text.getvalue()})
+        else:
+            profiler.stop()
+            paths = _write_profile(prefix, {'collapsed': profiler.collapsed(), 'top.txt': profiler.top()})
+        # end if
+
+        data = response.get_json(silent=True) if response.is_json else None
+
+        if isinstance(data, dict):
+            data['profile'] = paths
+            response.set_data(json.dumps(data))
+        # end if
+
+        return response
+
+    @app.teardown_request
+    def _drop_profile(error):
+        # The view failed before `_end_profile()`
+        profiler = g.pop('saroj_profiler', None)
+
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+        elif profiler is not None:
+            profiler.stop()
+        # end if
@@ -0,0 +1,701 @@
+import argparse
+import base64
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .pipeline import PipelineRunner, PipelinedRunner, PipelineError
+
+# Same folders as in WebService/web/lib/lib.php
+TASK_DIR = '/data/tasks/'
+MAP_DIR = '/data/cases/'
+CONFIG_FILE = '/data/config.json'
+
+# From <sys/inotify.h>
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+
+# Relative cost of one decoded byte of each document type, for the queue order:
+# html files carry a lot of markup for the text that is annotated; the markup of
+# a docx file is zip compressed, so that one of its bytes is about one byte of text
+TYPE_COSTS = {'txt': 1.0, 'docx': 1.0, 'html': 0.3}
+# Cost of the module calls and conversions of any task, in the same unit
+TASK_COST = 20000
+
+
+class PollingWatcher(object):
+    """Wakes the scheduler up every `interval` seconds,
+    like the `sleep(1)` loop of `start.php`, or when `wake()` is called."""
+
+    def __init__(self, interval: float = 1.0):
+        self._interval = interval
+        self._event = threading.Event()
+
+    def wait(self, timeout: float):
+        self._event.wait(min(timeout, self._interval))
+        self._event.clear()
+
+    def wake(self):
+        self._event.set()
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(object):
+    """Wakes the scheduler up as soon as a file is written to, or moved into,
+    one of the watched folders, or when `wake()` is called. Linux only,
+    through the C library, so there is no extra dependency."""
+
+    def __init__(self, folders: list[str]):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1() failed')
+        # end if
+
+        for folder in folders:
+            if libc.inotify_add_watch(self._fd, os.fsencode(folder), _IN_CLOSE_WRITE | _IN_MOVED_TO) < 0:
+                errno = ctypes.get_errno()
+                os.close(self._fd)
+                raise OSError(errno, f'inotify_add_watch() failed for [{folder}]')
+            # end if
+        # end for
+
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+
+    def wait(self, timeout: float):
+        ready, _, _ = select.select([self._fd, self._wake_r], [], [], timeout)
+
+        # The events themselves are not needed, the folders are scanned again
+        for fd in ready:
+            try:
+                while os.read(fd, 65536):
+                    pass
+                # end while
+            except BlockingIOError:
+                pass
+            # end try
+        # end for
+
+    def wake(self):
+        os.write(self._wake_w, b'.')
+
+    def close(self):
+        os.close(self._fd)
+        os.close(self._wake_r)
+        os.close(self._wake_w)
+
+
+def make_watcher(folders: list[str], poll: bool = False, interval: float = 1.0):
+    """Returns an `InotifyWatcher` for `folders` or a `PollingWatcher`
+    if `poll` is set or inotify is not available."""
+
+    if not poll:
+        try:
+            return InotifyWatcher(folders)
+        except (OSError, AttributeError) as e:
+            print(f'inotify is not available ({e}), polling every {interval} seconds', flush=True)
+        # end try
+    # end if
+
+    return PollingWatcher(interval)
+
+
+def write_task_file(path: str, task: dict):
+    """Replaces the task file at once, so that `getResult.php`
+    never reads a partially written file."""
+
+    folder, name = os.path.split(path)
+    tmp_path = os.path.join(folder, f'.{name}.tmp')
+
+    with open(tmp_path, mode='w', encoding='utf-8') as f:
+        json.dump(task, f)
+    # end with
+
+    os.replace(tmp_path, path)
+
+
+def estimate_cost(task: dict) -> int:
+    """Estimates the processing cost of a task from the size of its decoded document and
+    its type, in bytes of plain text. Only relative values matter, to order the queue."""
+
+    document = task.get('document')
+    size = len(document) * 3 // 4 if isinstance(document, str) else 0
+    return TASK_COST + int(size * TYPE_COSTS.get(task.get('type'), TYPE_COSTS['docx']))
+
+
+class QueuedTask(object):
+    """A task file waiting in, or taken from, one of the task lanes."""
+
+    __slots__ = ('lane', 'name', 'queued_at', 'caseid', 'cost', 'large')
+
+    def __init__(self, lane: str, name: str, queued_at: float, caseid: str | None, cost: int):
+        self.lane = lane
+        self.name = name
+        # When the task file was written, as the time it was queued
+        self.queued_at = queued_at
+        # None if the task file could not be read
+        self.caseid = caseid
+        # From estimate_cost(), 0 if the task file could not be read
+        self.cost = cost
+        # True if the task runs in the pool for large documents
+        self.large = False
+
+
+class CaseStats(object):
+    """Queue depth and wait time statistics of the tasks of one case."""
+
+    __slots__ = ('waiting', 'running', 'started', 'wait_total', 'wait_max', 'last_wait', 'last_active')
+
+    def __init__(self):
+        self.waiting = 0
+        self.running = 0
+        self.started = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.last_wait = 0.0
+        self.last_active = 0.0
+
+    def add_wait(self, wait: float):
+        self.started += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.last_wait = wait
+
+    def to_dict(self) -> dict:
+        return {
+            'waiting': self.waiting,
+            'running': self.running,
+            'started': self.started,
+            'wait_avg': round(self.wait_total / self.started, 3) if self.started else 0.0,
+            'wait_max': round(self.wait_max, 3),
+            'wait_last': round(self.last_wait, 3),
+        }
+
+
+class TaskScheduler(object):
+    """Runs the anonymization tasks created by `startAnonymization.php`.
+    It replaces the task loop of `WebService/web/startup/start.php`, with the same task
+    file contract, and runs up to `workers` tasks at the same time. Tasks from the
+    `prio/` folder are always started before the ones from the `new/` folder.
+
+    By default, the pipeline steps that use the case map run one at a time and the
+    other steps of different tasks run concurrently. With `case_affinity`, tasks of the
+    same case run one after the other, in queue order, while tasks of different
+    cases run fully in parallel, as each case has its own map file.
+
+    Within a lane, tasks are started shortest job first, by the `estimate_cost()` of their
+    document minus `aging` for each second they have waited, so that large documents
+    do not wait forever; `sjf=False` starts them in queue order. The tasks of a case are
+    still started in queue order, a task never goes before an older task of its case.
+    With `large_workers`, tasks that cost `large_threshold` or more only run in a separate
+    pool of that size, and the other `workers` are left to the smaller tasks.
+
+    With `stage_workers`, the steps run in a `PipelinedRunner`, each with its own workers,
+    and `workers` is the number of tasks that are in the pipeline at the same time.
+
+    Per-case queue depth and wait times are returned by `stats()` and written
+    to `stats_file`, if given, each time the task folders are scanned."""
+
+    # Seconds to wait for a task file that was created but not completely written
+    write_grace = 5.0
+    # Seconds between folder scans when no file events come, as a safety net
+    rescan_interval = 30.0
+    # Idle cases kept in the statistics
+    max_idle_cases = 1000
+
+    def __init__(self, config: dict, task_dir: str = TASK_DIR, map_dir: str = MAP_DIR,
+                 workers: int = 1, in_process: bool = False, poll: bool = False,
+                 poll_interval: float = 1.0, keep_run_dirs: bool = False,
+                 case_affinity: bool = False, stats_file: str | None = None, sjf: bool = True,
+                 aging: float = 20000.0, large_workers: int = 0, large_threshold: int = 500000,
+                 parallel_steps: bool = False, stage_workers: dict[int, int] | None = None,
+                 inline_transport: bool = False):
+        self._config = config
+        self._new_dir = os.path.join(task_dir, 'new')
+        self._prio_dir = os.path.join(task_dir, 'prio')
+        self._done_dir = os.path.join(task_dir, 'done')
+        self._run_dir = os.path.join(task_dir, 'run')
+        self._map_dir = map_dir
+        self._workers = workers
+        self._large_workers = large_workers
+        self._large_threshold = large_threshold
+        self._sjf = sjf
+        self._aging = aging
+        self._keep_run_dirs = keep_run_dirs
+
+        if stage_workers is not None:
+            self._runner = PipelinedRunner(config, in_process=in_process, stage_workers=stage_workers,
+                                           inline_transport=inline_transport)
+        else:
+            self._runner = PipelineRunner(config, in_process=in_process, parallel=parallel_steps,
+                                          inline_transport=inline_transport)
+        # end if
+
+        self._poll = poll
+        self._poll_interval = poll_interval
+        self._watcher = None
+        self._case_affinity = case_affinity
+        self._case_map_lock = None if case_affinity else threading.Lock()
+        self._stats_file = stats_file
+        self._lock = threading.Lock()
+        # Task file name -> task, for the tasks given to a worker
+        self._running: dict[str, QueuedTask] = {}
+        # Task file name -> time before which it is not retried, for files not completely written
+        self._retry_after = {}
+        # Task file name -> ((mtime, size), (caseid, cost)), so that a waiting task file is read once
+        self._task_infos = {}
+        self._case_stats: dict[str, CaseStats] = {}
+        self._stopping = False
+
+    def create_folders(self):
+        for folder in (self._new_dir, self._prio_dir, self._done_dir, self._run_dir, self._map_dir):
+            os.makedirs(folder, exist_ok=True)
+
+            try:
+                shutil.chown(folder, user='www-data', group='www-data')
+            except (LookupError, PermissionError):
+                pass
+            # end try
+        # end for
+
+    def _task_info(self, path: str, stat: os.stat_result) -> tuple[str | None, int]:
+        """Returns the case ID and the estimated cost of the task file at `path`,
+        or (None, 0) if it cannot be read (yet)."""
+
+        name = os.path.basename(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        cached = self._task_infos.get(name)
+
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        # end if
+
+        try:
+            with open(path, mode='r', encoding='utf-8') as f:
+                task = json.load(f)
+            # end with
+
+            caseid = task.get('caseid')
+            info = (str(caseid) if caseid is not None else None, estimate_cost(task))
+        except (OSError, ValueError, AttributeError):
+            return None, 0
+        # end try
+
+        self._task_infos[name] = (key, info)
+        return info
+
+    def _pending_tasks(self) -> tuple[list[QueuedTask], bool]:
+        """Returns the tasks waiting to run, priority lane first, in the order
+        they should start in each lane, and whether some task files were
+        skipped as they are still being written."""
+
+        tasks = []
+        deferred = False
+        now = time.time()
+        seen = set()
+
+        for lane in (self._prio_dir, self._new_dir):
+            lane_tasks = []
+
+            with os.scandir(lane) as it:
+                for entry in it:
+                    if entry.name.startswith('.') or entry.name in self._running or not entry.is_file():
+                        continue
+                    # end if
+
+                    stat = entry.stat()
+
+                    # tempnam() creates the file before the task is written in it
+                    if (stat.st_size == 0 and now - stat.st_mtime < self.write_grace) or \
+                            self._retry_after.get(entry.name, 0) > now:
+                        deferred = True
+                        continue
+                    # end if
+
+                    seen.add(entry.name)
+                    lane_tasks.append(QueuedTask(lane, entry.name, stat.st_mtime, *self._task_info(entry.path, stat)))
+                # end for
+            # end with
+
+            lane_tasks.sort(key=lambda t: (t.queued_at, t.name))
+
+            if self._sjf:
+                # The key of a task is at least the one of the older tasks of its case,
+                # so that shortest job first only reorders the tasks of different cases
+                keys = {}
+                case_keys = {}
+
+                for t in lane_tasks:
+                    key = t.cost - self._aging * (now - t.queued_at)
+
+                    if t.caseid is not None:
+                        key = max(key, case_keys.get(t.caseid, key))
+                        case_keys[t.caseid] = key
+                    # end if
+
+                    keys[t.name] = key
+                # end for
+
+                lane_tasks.sort(key=lambda t: (keys[t.name], t.queued_at, t.name))
+            # end if
+
+            tasks.extend(lane_tasks)
+        # end for
+
+        # Forget the task files that are gone
+        for name in [n for n in self._task_infos if n not in seen and n not in self._running]:
+            del self._task_infos[name]
+        # end for
+
+        return tasks, deferred
+
+    def _dispatch(self, executor: ThreadPoolExecutor) -> bool:
+        """Gives waiting tasks to the free workers. Returns True if
+        the folders should be scanned again soon."""
+
+        with self._lock:
+            tasks, deferred = self._pending_tasks()
+            running_large = sum(1 for t in self._running.values() if t.large)
+            # Free workers in the pool for small tasks and in the pool for large tasks
+            free = [self._workers - (len(self._running) - running_large), self._large_workers - running_large]
+            busy_cases = {t.caseid for t in self._running.values()} if self._case_affinity else set()
+
+            for task in tasks:
+                if free[0] <= 0 and free[1] <= 0:
+                    break
+                # end if
+
+                # A task file that cannot be read has no case, run_task() will deal with it
+                if task.caseid is not None and task.caseid in busy_cases:
+                    continue
+                # end if
+
+                task.large = self._large_workers > 0 and task.cost >= self._large_threshold
+
+                if free[task.large] <= 0:
+                    continue
+                # end if
+
+                if self._case_affinity:
+                    busy_cases.add(task.caseid)
+                # end if
+
+                self._running[task.name] = task
+                free[task.large] -= 1
+                executor.submit(self._run_worker, task)
+            # end for
+
+            self._update_stats(tasks)
+            return deferred
+
+    def _update_stats(self, waiting: list[QueuedTask]):
+        """Recounts the waiting and running tasks of each case and saves the statistics."""
+
+        now = time.time()
+
+        for stats in self._case_stats.values():
+            stats.waiting = 0
+            stats.running = 0
+        # end for
+
+        for task in waiting:
+            if task.caseid is not None and task.name not in self._running:
+                self._case_stats.setdefault(task.caseid, CaseStats()).waiting += 1
+            # end if
+        # end for
+
+        for task in self._running.values():
+            if task.caseid is not None:
+                stats = self._case_stats.setdefault(task.caseid, CaseStats())
+                stats.running += 1
+                stats.last_active = now
+            # end if
+        # end for
+
+        idle = [c for c, s in self._case_stats.items() if s.waiting == 0 and s.running == 0]
+
+        if len(idle) > self.max_idle_cases:
+            idle.sort(key=lambda c: self._case_stats[c].last_active)
+
+            for caseid in idle[:len(idle) - self.max_idle_cases]:
+                del self._case_stats[caseid]
+            # end for
+        # end if
+
+        if self._stats_file:
+            try:
+                write_task_file(self._stats_file, self._stats())
+            except OSError as e:
+                print(f'Cannot write {self._stats_file}: {e}', flush=True)
+            # end try
+        # end if
+
+    def _stats(self) -> dict:
+        return {
+            'time': round(time.time(), 3),
+            'workers': self._workers,
+            'large_workers': self._large_workers,
+            'case_affinity': self._case_affinity,
+            'waiting': sum(s.waiting for s in self._case_stats.values()),
+            'running': len(self._running),
+            'running_large': sum(1 for t in self._running.values() if t.large),
+            'cases': {c: s.to_dict() for c, s in self._case_stats.items()},
+            'stages': self._runner.stats() if isinstance(self._runner, PipelinedRunner) else [],
+        }
+
+    def stats(self) -> dict:
+        """Returns the number of waiting and running tasks and,
+        for each case, the queue depth and the wait times in seconds."""
+
+        with self._lock:
+            return self._stats()
+        # end with
+
+    def _run_worker(self, task: QueuedTask):
+        name = task.name
+        wait = time.time() - task.queued_at
+
+        try:
+            if task.caseid is not None:
+                with self._lock:
+                    self._case_stats.setdefault(task.caseid, CaseStats()).add_wait(wait)
+                # end with
+            # end if
+
+            if task.lane == self._prio_dir:
+                print(f'Running PRIORITY task {name} (case {task.caseid}, cost {task.cost}, waited {wait:.1f} s)',
+                      flush=True)
+            else:
+                print(f'Running task {name} (case {task.caseid}, cost {task.cost}, waited {wait:.1f} s)', flush=True)
+            # end if
+
+            done = self.run_task(os.path.join(task.lane, name), os.path.join(self._done_dir, name))
+
+            # _pending_tasks() reads it in the scheduler thread
+            with self._lock:
+                if done:
+                    self._retry_after.pop(name, None)
+                else:
+                    self._retry_after[name] = time.time() + self._poll_interval
+                # end if
+            # end with
+
+            if done:
+                print(f'Done {name}', flush=True)
+            # end if
+        except Exception as e:
+            print(f'Task {name} failed: {e}', flush=True)
+        finally:
+            with self._lock:
+                del self._running[name]
+            # end with
+
+            self._watcher.wake()
+        # end try
+
+    def run_task(self, path_new: str, path_done: str) -> bool:
+        """Same as `runTask()` in `start.php`, in a run folder of its own.
+        Returns False if the task file is not valid JSON yet because
+        it may still be written, to be tried again later."""
+
+        if os.path.isfile(path_done) and os.path.getsize(path_done) > 0:
+            print('Was already executed; remove', flush=True)
+            self._remove(path_new)
+            return True
+        # end if
+
+        try:
+            with open(path_new, mode='r', encoding='utf-8') as f:
+                task = json.load(f)
+            # end with
+        except FileNotFoundError:
+            return True
+        except (OSError, ValueError):
+            if time.time() - os.path.getmtime(path_new) < self.write_grace:
+                return False
+            # end if
+
+            task = None
+        # end try
+
+        if not isinstance(task, dict) or not all(k in task for k in ('caseid', 'docid', 'document', 'status')):
+            print('Invalid task file', flush=True)
+            write_task_file(path_done, {'status': 'ERROR', 'message': 'Invalid task file'})
+            self._remove(path_new)
+            return True
+        # end if
+
+        task['status'] = 'RUNNING'
+        task['version'] = self._config['version']
+        task.setdefault('type', 'docx')
+        write_task_file(path_new, task)
+
+        run_dir = os.path.join(self._run_dir, os.path.basename(path_new))
+        os.makedirs(run_dir, exist_ok=True)
+        path_docx = os.path.join(run_dir, 'input.docx')
+        path_output = os.path.join(run_dir, 'output.docx')
+        path_output_ann = os.path.join(run_dir, 'output.ann')
+
+        try:
+            with open(path_docx, mode='wb') as f:
+                f.write(base64.b64decode(task['document']))
+            # end with
+
+            values = {
+                'CASEID': task['caseid'],
+                'DOCID': task['docid'],
+                'DOCX': path_docx,
+                'TYPE': task['type'],
+                'CASEMAP': os.path.join(self._map_dir, f'{task["caseid"]}.map'),
+                'OUTPUT': path_output,
+                'OUTPUTANN': path_output_ann,
+            }
+
+            try:
+                self._runner.run(values, run_dir, case_map_lock=self._case_map_lock)
+            except PipelineError as e:
+                task['status'] = 'ERROR'
+                task['message'] = str(e)
+            # end try
+
+            if task['status'] != 'ERROR':
+                if not os.path.isfile(path_output):
+                    task['status'] = 'ERROR'
+                    task['message'] = 'Output file was not generated'
+                else:
+                    with open(path_output, mode='rb') as f:
+                        task['output'] = base64.b64encode(f.read()).decode('ascii')
+                    # end with
+
+                    task['status'] = 'DONE'
+
+                    if os.path.isfile(path_output_ann):
+                        with open(path_output_ann, mode='rb') as f:
+                            task['outputann'] = base64.b64encode(f.read()).decode('ascii')
+                        # end with
+                    # end if
+                # end if
+            # end if
+        finally:
+            if not self._keep_run_dirs:
+                shutil.rmtree(run_dir, ignore_errors=True)
+            # end if
+        # end try
+
+        write_task_file(path_done, task)
+        self._remove(path_new)
+        return True
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        # end try
+
+    def stop(self):
+        self._stopping = True
+
+        if self._watcher is not None:
+            self._watcher.wake()
+        # end if
+
+    def run(self):
+        """Runs tasks until `stop()` is called."""
+
+        self._watcher = make_watcher([self._prio_dir, self._new_dir], self._poll, self._poll_interval)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self._workers + self._large_workers) as executor:
+                while not self._stopping:
+                    rescan_soon = self._dispatch(executor)
+                    self._watcher.wait(self._poll_interval if rescan_soon else self.rescan_interval)
+                # end while
+            # end with
+        finally:
+            self._watcher.close()
+        # end try
+
+
+def start_modules(commands: list[str]):
+    """Starts the modules from the `modules` list of `config.json`, as `start.php` does."""
+
+    for command in commands:
+        print(f'   Running [{command}]', flush=True)
+        subprocess.Popen(['/bin/bash', '-c', command], stdout=subprocess.DEVNULL,
+                         stderr=subprocess.DEVNULL, start_new_session=True)
+    # end for
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs the anonymization tasks of the Web Service.')
+    parser.add_argument('--config', type=str, default=CONFIG_FILE, help='the config.json file of the Web Service')
+    parser.add_argument('--task-dir', type=str, default=TASK_DIR, help='folder with the new/, prio/, done/ and run/ folders')
+    parser.add_argument('--cases-dir', type=str, default=MAP_DIR, help='folder with the case map files')
+    parser.add_argument('--workers', type=int, default=1, help='how many tasks can run at the same time')
+    parser.add_argument('--poll', action='store_true', help='scan the task folders periodically, do not use inotify')
+    parser.add_argument('--poll-interval', type=float, default=1.0, help='seconds between scans, with --poll')
+    parser.add_argument('--in-process', action='store_true', help='run the modules that allow it in this process')
+    parser.add_argument('--parallel-steps', action='store_true',
+                        help='run the steps of a task that do not depend on each other at the same time')
+    parser.add_argument('--pipelined', action='store_true',
+                        help='give each step its own workers, so that the tasks move from step to step '
+                             'like on an assembly line; --workers is then the number of tasks in the pipeline')
+    parser.add_argument('--stage-workers', type=str, nargs='*', default=[],
+                        help='with --pipelined, workers of the step on a port, e.g. 8003=4')
+    parser.add_argument('--inline-transport', action='store_true',
+                        help='send the intermediary documents to the modules in the request, not through the run folder')
+    parser.add_argument('--no-start-modules', action='store_true', help='the modules are already running')
+    parser.add_argument('--keep-run-dirs', action='store_true', help='keep the intermediary files of each task')
+    parser.add_argument('--case-affinity', action='store_true',
+                        help='run the tasks of the same case one at a time and the tasks of different cases in parallel')
+    parser.add_argument('--fifo', action='store_true', help='start the tasks in queue order, not the smallest first')
+    parser.add_argument('--aging', type=float, default=20000.0,
+                        help='cost taken off a waiting task per second, so that large tasks do not starve')
+    parser.add_argument('--large-workers', type=int, default=0,
+                        help='separate pool for the large tasks, which then do not use the other workers')
+    parser.add_argument('--large-threshold', type=int, default=500000,
+                        help='estimated cost from which a task is large, about bytes of text')
+    parser.add_argument('--stats-file', type=str, default=None,
+                        help='where to write the per-case queue statistics, default stats.json in the task folder')
+    args = parser.parse_args()
+
+    with open(args.config, mode='r', encoding='utf-8') as f:
+        config = json.load(f)
+    # end with
+
+    if not all(k in config for k in ('version', 'modules', 'anonymization')):
+        print('Invalid config.json file', file=sys.stderr, flush=True)
+        sys.exit(1)
+    # end if
+
+    if not args.no_start_modules:
+        print('Starting modules', flush=True)
+        start_modules(config['modules'])
+        print('All modules started', flush=True)
+    # end if
+
+    scheduler = TaskScheduler(config, task_dir=args.task_dir, map_dir=args.cases_dir, workers=args.workers,
+                              in_process=args.in_process, poll=args.poll, poll_interval=args.poll_interval,
+                              keep_run_dirs=args.keep_run_dirs, case_affinity=args.case_affinity,
+                              stats_file=args.stats_file or os.path.join(args.task_dir, 'stats.json'),
+                              sjf=not args.fifo, aging=args.aging, large_workers=args.large_workers,
+                              large_threshold=args.large_threshold, parallel_steps=args.parallel_steps,
+                              stage_workers={int(p): int(n) for p, n in (w.split('=') for w in args.stage_workers)}
+                              if args.pipelined else None, inline_transport=args.inline_transport)
+    scheduler.create_folders()
+    print('\n\nExecuting tasks....', flush=True)
+    scheduler.run()
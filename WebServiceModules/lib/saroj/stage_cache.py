@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+# Also imported by RNER, which runs on Python 3.7: keep this module free
+# of other dependencies and of newer syntax.
+
+# Bytes read at a time when hashing files
+_CHUNK_SIZE = 1 << 20
+
+
+def code_fingerprint(module_dir: str) -> str:
+    """Hashes the Python sources of a module folder, with its sub-folders, and of `lib/saroj`,
+    so that the cached outputs of a stage are dropped when its code changes."""
+
+    lib_dir = os.path.dirname(os.path.realpath(__file__))
+    digest = hashlib.sha256()
+
+    for folder in (module_dir, lib_dir):
+        sources = sorted(os.path.join(d, n) for d, _, names in os.walk(folder) for n in names if n.endswith('.py'))
+
+        for source in sources:
+            with open(source, mode='rb') as f:
+                digest.update(os.path.relpath(source, folder).encode('utf-8'))
+                digest.update(f.read())
+            # end with
+        # end for
+    # end for
+
+    return digest.hexdigest()
+
+
+def files_fingerprint(paths: list[str]) -> str:
+    """Fingerprints model folders or dictionary files by the path, size and
+    modification time of every file in them, without reading gigabytes of weights."""
+
+    digest = hashlib.sha256()
+
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(d, n) for d, _, names in os.walk(path) for n in names)
+        else:
+            files = [path]
+        # end if
+
+        for file in files:
+            try:
+                stat = os.stat(file)
+                digest.update(f'{file}\t{stat.st_size}\t{stat.st_mtime_ns}\n'.encode('utf-8'))
+            except OSError:
+                digest.update(f'{file}\t-\n'.encode('utf-8'))
+            # end try
+        # end for
+    # end for
+
+    return digest.hexdigest()
+
+
+class StageCache(object):
+    """A content-addressed disk cache of the output files of one stage, e.g. RegexAnnotator.
+    The key of an output is a hash of the stage name, its code `version`, the `fingerprint`
+    of its model or dictionary, the parameters of the call and the bytes of the input files,
+    so the same document sent again, under another `docid`, is not processed again.
+
+    Outputs are kept in `cache_dir/stage/` and the least recently used ones are removed
+    when the folder grows over `max_bytes`. Several processes can share the folder.
+    Cache errors are only printed: a failed lookup or store is a cache miss.
+
+    Do not use it for stages that read or update the case map, as their output
+    depends on the documents processed before."""
+
+    def __init__(self, cache_dir: str, stage: str, version: str, fingerprint: str = '',
+                 max_bytes: int = 1 << 30):
+        self.stage = stage
+        self.version = version
+        # Can be changed, e.g. when the dictionary is reloaded
+        self.fingerprint = fingerprint
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._folder = os.path.join(cache_dir, stage)
+        self._lock = threading.Lock()
+        # Bytes in the folder, None until it is first needed
+        self._size = None
+        os.makedirs(self._folder, exist_ok=True)
+
+    def key(self, input_files: list[str], params: dict | None = None) -> str:
+        """Returns the key of the output of this stage for `input_files` and `params`."""
+
+        digest = hashlib.sha256()
+        header = [self.stage, self.version, self.fingerprint, params or {}]
+        digest.update(json.dumps(header, sort_keys=True).encode('utf-8'))
+
+        for input_file in input_files:
+            with open(input_file, mode='rb') as f:
+                digest.update(b'\0')
+
+                for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                # end for
+            # end with
+        # end for
+
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._folder, key)
+
+    def get(self, key: str, output_file: str) -> bool:
+        """Copies the output stored under `key` to `output_file`.
+        Returns False if there is none."""
+
+        path = self._path(key)
+
+        try:
+            shutil.copyfile(path, output_file)
+            # The modification time is the last use, for the eviction
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+        except OSError as e:
+            print(f'Stage cache [{self.stage}]: cannot read {key}: {e}', flush=True)
+            self.misses += 1
+            return False
+        # end try
+
+        self.hits += 1
+        return True
+
+    def put(self, key: str, output_file: str):
+        """Stores a copy of `output_file` under `key`."""
+
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+        try:
+            shutil.copyfile(output_file, tmp_path)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            print(f'Stage cache [{self.stage}]: cannot store {key}: {e}', flush=True)
+
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            # end try
+
+            return
+        # end try
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._folder_size()
+            else:
+                self._size += size
+            # end if
+
+            if self._size > self.max_bytes:
+                self._evict()
+            # end if
+        # end with
+
+    def _folder_size(self) -> int:
+        size = 0
+
+        with os.scandir(self._folder) as it:
+            for entry in it:
+                try:
+                    size += entry.stat().st_size
+                except OSError:
+                    pass
+                # end try
+            # end for
+        # end with
+
+        return size
+
+    def _evict(self):
+        """Removes the least recently used outputs until the folder
+        is under 90% of `max_bytes`, leaving room for the next ones."""
+
+        entries = []
+
+        with os.scandir(self._folder) as it:
+            for entry in it:
+                if entry.name.endswith('.tmp'):
+                    continue
+                # end if
+
+                try:
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                except OSError:
+                    pass
+                # end try
+            # end for
+        # end with
+
+        entries.sort()
+        # Other processes may have written here as well
+        size = sum(e[1] for e in entries)
+        limit = self.max_bytes * 0.9
+
+        for _, entry_size, path in entries:
+            if size <= limit:
+                break
+            # end if
+
+            try:
+                os.unlink(path)
+                size -= entry_size
+            except OSError:
+                pass
+            # end try
+        # end for
+
+        self._size = size
+
+    def stats(self) -> dict:
+        return {'stage': self.stage, 'hits': self.hits, 'misses': self.misses, 'max_bytes': self.max_bytes}
+
+
+def open_stage_cache(cache_dir: str | None, stage: str, module_dir: str, resources: list[str] | None = None,
+                     max_mb: int = 1024) -> StageCache | None:
+    """Returns the cache of `stage` in `cache_dir`, fingerprinting the code in `module_dir` and
+    the model folders or dictionary files in `resources`, or None if `cache_dir` is not set."""
+
+    if not cache_dir:
+        return None
+    # end if
+
+    return StageCache(cache_dir, stage, code_fingerprint(module_dir), files_fingerprint(resources or []),
+                      max_bytes=max_mb << 20)
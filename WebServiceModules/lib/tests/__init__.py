@@ -0,0 +1,5 @@
+import os
+import sys
+
+# lib is imported as lib.saroj, from the folder with all the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+flask = pytest.importorskip('flask')
+
+from lib.saroj import metrics
+from lib.saroj.metrics import LATENCY_BUCKETS, Metrics, install_metrics, size_bucket, timer
+
+
+def test_size_bucket():
+    assert [size_bucket(n) for n in [0, 16 << 10, (1 << 20) - 1, 8 << 20, 1 << 30]] == ['xs', 's', 'm', 'xl', 'xl']
+
+
+def test_render(tmp_path):
+    m = Metrics('Test', str(tmp_path))
+
+    for seconds in [0.003, 0.02, 0.02, 500.0]:
+        m.observe('parse', 's', seconds)
+    # end for
+
+    m.count_request('/process', 'OK')
+    m.count_request('/process', 'OK')
+    m.count_request('/process', 'ERROR')
+    lines = m.render().splitlines()
+
+    assert 'saroj_requests_total{module="Test",endpoint="/process",status="ERROR"} 1' in lines
+    assert 'saroj_requests_total{module="Test",endpoint="/process",status="OK"} 2' in lines
+
+    labels = 'module="Test",phase="parse",size="s"'
+    buckets = [line for line in lines if line.startswith(f'saroj_phase_seconds_bucket{{{labels},')]
+    # Cumulative counts, the last one is +Inf
+    assert len(buckets) == len(LATENCY_BUCKETS) + 1
+    assert buckets[0].endswith('le="0.005"} 1') and buckets[2].endswith('le="0.025"} 3')
+    assert buckets[-2].endswith('le="300.0"} 3') and buckets[-1].endswith('le="+Inf"} 4')
+    assert f'saroj_phase_seconds_sum{{{labels}}} 500.043000' in lines
+    assert f'saroj_phase_seconds_count{{{labels}}} 4' in lines
+
+
+def test_totals_of_all_workers(tmp_path):
+    m = Metrics('Test', str(tmp_path))
+    m.count_request('/process', 'OK')
+    m.observe('request', 'xs', 0.1)
+    m.flush()
+
+    # The file another worker wrote
+    other = Metrics('Test', str(tmp_path))
+    other.count_request('/process', 'OK')
+    other.observe('request', 'xs', 1.0)
+
+    with open(tmp_path / '1.json', mode='w', encoding='utf-8') as f:
+        json.dump(other._state(), f)
+    # end with
+
+    lines = m.render().splitlines()
+    assert 'saroj_requests_total{module="Test",endpoint="/process",status="OK"} 2' in lines
+    assert 'saroj_phase_seconds_count{module="Test",phase="request",size="xs"} 2' in lines
+
+    m.close()
+    assert not tmp_path.exists()
+
+
+def test_metrics_endpoint(monkeypatch):
+    monkeypatch.setattr(metrics, '_metrics', None)
+    app = flask.Flask(__name__)
+
+    @app.route('/process', methods=['GET', 'POST'])
+    def process():
+        with timer('parse'):
+            data = json.loads(flask.request.values['input'])
+        # end with
+
+        return flask.jsonify({'status': 'OK' if data['input'] else 'ERROR', 'message': ''})
+
+    @app.route('/documents/<name>', methods=['GET'])
+    def document(name):
+        return flask.jsonify({'status': 'OK', 'message': name})
+
+    @app.route('/admin/test', methods=['GET'])
+    def admin():
+        return flask.jsonify({'status': 'OK', 'message': ''})
+
+    m = install_metrics(app, 'Test', ('/admin/test',))
+
+    try:
+        client = app.test_client()
+        client.get('/process', query_string={'input': json.dumps({'input': 'missing.txt', 'output': 'x'})})
+        client.get('/process', query_string={'input': json.dumps({'input': '', 'output': 'x'})})
+        client.get('/documents/a')
+        client.get('/documents/b')
+        client.get('/admin/test')
+        client.get('/no/such/path')
+        client.get('/another/path')
+
+        response = client.get('/metrics')
+        assert response.status_code == 200 and response.mimetype == 'text/plain'
+        lines = response.get_data(as_text=True).splitlines()
+    finally:
+        m.close()
+    # end try
+
+    requests = sorted(line for line in lines if line.startswith('saroj_requests_total{'))
+    assert requests == [
+        'saroj_requests_total{module="Test",endpoint="/admin/test",status="OK"} 1',
+        'saroj_requests_total{module="Test",endpoint="/documents/<name>",status="OK"} 2',
+        'saroj_requests_total{module="Test",endpoint="/process",status="ERROR"} 1',
+        'saroj_requests_total{module="Test",endpoint="/process",status="OK"} 1',
+        'saroj_requests_total{module="Test",endpoint="unmatched",status="HTTP_404"} 2',
+    ]
+    # Only the document requests are timed, /admin/test and the unmatched paths are not
+    assert 'saroj_phase_seconds_count{module="Test",phase="request",size="xs"} 4' in lines
+    assert 'saroj_phase_seconds_count{module="Test",phase="parse",size="xs"} 2' in lines
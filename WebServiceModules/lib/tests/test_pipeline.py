@@ -0,0 +1,284 @@
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from lib.saroj import pipeline
+from lib.saroj.conllu_document import CoNLLUDocument
+from lib.saroj.pipeline import PipelineContext, PipelineRunner, PipelinedRunner, Stage, parse_module_commands, \
+    step_dependencies
+
+TEXTS = ['Ion Popescu din Cluj', 'Maria Ionescu a plecat la Iași', 'SC Alfa SRL', 'Vasile']
+
+
+def step(port, output, step_id=None, after=None, **args):
+    step = {'port': port, 'args': [{'key': 'output', 'value': output}] +
+            [{'key': key, 'value': value} for key, value in args.items()]}
+
+    if step_id is not None:
+        step['id'] = step_id
+    # end if
+
+    if after is not None:
+        step['after'] = after
+    # end if
+
+    return step
+
+
+def wait_a_little():
+    # So that the steps running at the same time finish in any order
+    time.sleep(random.random() / 500)
+
+
+class TokenizerStage(Stage):
+    """Makes a CoNLL-U document of the words of a text file, one sentence."""
+
+    thread_safe = True
+
+    def __init__(self, module_dir, argv):
+        pass
+
+    def process(self, step_args, ctx):
+        with open(ctx.value(step_args['input']), 'r', encoding='utf-8') as f:
+            words = f.read().split()
+        # end with
+
+        wait_a_little()
+        ctx.set_document(step_args['output'], CoNLLUDocument.from_lines(
+            [f'{i + 1}\t{word}' for i, word in enumerate(words)]))
+
+
+class TaggerStage(Stage):
+    """Adds the name of its module and the length of each word as a column."""
+
+    thread_safe = True
+
+    def __init__(self, module_dir, argv):
+        self._name = os.path.basename(module_dir)
+
+    def process(self, step_args, ctx):
+        document = ctx.document(step_args['input']).copy()
+        wait_a_little()
+
+        for token in document.tokens():
+            token.append(f'{self._name}{len(token.form)}')
+        # end for
+
+        ctx.set_document(step_args['output'], document)
+
+
+class JoinStage(Stage):
+    """Adds the last column of each of its inputs, as Voting does."""
+
+    thread_safe = True
+
+    def __init__(self, module_dir, argv):
+        pass
+
+    def process(self, step_args, ctx):
+        inputs = [ctx.document(name) for name in step_args['input']]
+        document = inputs[0].copy()
+        wait_a_little()
+
+        for token in document.tokens():
+            token.append('+'.join(d.token(token.index)[-1] for d in inputs))
+        # end for
+
+        ctx.set_document(step_args['output'], document)
+
+
+class CaseMapStage(Stage):
+    """Numbers the words by the lines of the case map, which it appends to, as EntityEncoding does."""
+
+    def __init__(self, module_dir, argv):
+        pass
+
+    def process(self, step_args, ctx):
+        document = ctx.document(step_args['input']).copy()
+        mapping_path = ctx.value(step_args['mapping'])
+        lines = []
+
+        if os.path.isfile(mapping_path):
+            with open(mapping_path, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+            # end with
+        # end if
+
+        wait_a_little()
+
+        with open(mapping_path, 'a', encoding='utf-8') as f:
+            for token in document.tokens():
+                token.append(str(len(lines)))
+                lines.append(token.form)
+                f.write(token.form + '\n')
+            # end for
+        # end with
+
+        ctx.set_document(step_args['output'], document)
+
+
+STUB_STAGES = {'Tokenizer': TokenizerStage, 'TaggerA': TaggerStage, 'TaggerB': TaggerStage,
+               'Join': JoinStage, 'CaseMapA': CaseMapStage, 'CaseMapB': CaseMapStage}
+
+CONFIG = {
+    'modules': [f'cd /modules/{name} ; python api.py {port} 2>&1 | cat'
+                for port, name in enumerate(STUB_STAGES, 9001)],
+    'anonymization': [
+        step(9001, 'TOKENIZED', input='DOCX'),
+        step(9002, 'A', input='TOKENIZED'),
+        step(9003, 'B', input='TOKENIZED'),
+        step(9005, 'ENCODED', input='B', mapping='CASEMAP'),
+        step(9004, 'JOINED', input=['A', 'ENCODED']),
+        step(9006, 'OUTPUT', input='JOINED', mapping='CASEMAP'),
+    ],
+}
+
+
+@pytest.fixture
+def stub_stages(monkeypatch):
+    for name, stage in STUB_STAGES.items():
+        monkeypatch.setitem(pipeline.IN_PROCESS_STAGES, name, stage)
+    # end for
+
+
+def test_parse_module_commands():
+    commands = [
+        'source /venv/bin/activate ; cd /modules/RegexAnnotator ; python annotator_api.py 8002 2>&1 | cat',
+        'cd /modules/BERTAnnotator ; python annotator_api.py --WORKERS 2 8003 --THREADS 4 --CACHE_SIZE 1024 2>&1',
+        'cd /modules/Dictionary ; python dictionary_api.py --CACHE_SIZE 1024 ; echo 8010',
+    ]
+
+    assert parse_module_commands(commands) == {
+        8002: ('RegexAnnotator', ['8002']),
+        8003: ('BERTAnnotator', ['--WORKERS', '2', '8003', '--THREADS', '4', '--CACHE_SIZE', '1024'])}
+
+
+def test_dependencies():
+    steps = [
+        step(8001, 'TOKENIZED', input='DOCX'),
+        step(8002, 'A', input='TOKENIZED'),
+        step(8003, 'B', step_id='bert', input='TOKENIZED'),
+        step(8004, 'VOTED', input=['A', 'B']),
+        step(8005, 'ENCODED', input='TOKENIZED', mapping='CASEMAP'),
+        step(8006, 'OUTPUT', input='VOTED', mapping='CASEMAP'),
+        step(8007, 'OTHER', after=[8002, 'bert'], input='DOCX'),
+        # Writes what 8002 wrote and 8004 read
+        step(8008, 'A', input='TOKENIZED'),
+    ]
+
+    assert step_dependencies(steps) == [set(), {0}, {0}, {1, 2}, {0}, {3, 4}, {1, 2}, {0, 1, 3}]
+
+
+def test_case_map_is_written():
+    # Steps that read the case map also write it, so they run one after the other
+    steps = [step(8001, 'A', input='DOCX', mapping='CASEMAP'), step(8002, 'B', input='DOCX', mapping='CASEMAP')]
+
+    assert step_dependencies(steps) == [set(), {0}]
+    assert PipelineRunner.uses_case_map({'input': 'DOCX', 'mapping': 'CASEMAP'})
+    assert not PipelineRunner.uses_case_map({'input': ['A', 'B'], 'output': 'C'})
+
+
+def task_values(folder, i):
+    docx = os.path.join(folder, f'{i}.txt')
+
+    with open(docx, 'w', encoding='utf-8') as f:
+        f.write(TEXTS[i % len(TEXTS)])
+    # end with
+
+    return {'DOCX': docx, 'TYPE': 'txt', 'CASEMAP': os.path.join(folder, f'case{i}.map'),
+            'OUTPUT': os.path.join(folder, f'{i}.out')}
+
+
+def read_outputs(folder, count):
+    outputs = []
+
+    for i in range(count):
+        with open(os.path.join(folder, f'{i}.out'), 'r', encoding='utf-8') as f, \
+                open(os.path.join(folder, f'case{i}.map'), 'r', encoding='utf-8') as m:
+            outputs.append((f.read(), m.read()))
+        # end with
+    # end for
+
+    return outputs
+
+
+def run_documents(folder, run, count=8):
+    os.makedirs(folder)
+
+    for i in range(count):
+        run(task_values(folder, i), os.path.join(folder, f'run{i}'))
+    # end for
+
+    return read_outputs(folder, count)
+
+
+def test_sequential_run(tmp_path, stub_stages):
+    runner = PipelineRunner(CONFIG)
+    ctx = runner.run(task_values(str(tmp_path), 0), str(tmp_path / 'run'))
+
+    assert runner.step_names()[0] == 'Tokenizer:9001' and runner.is_in_process(0)
+    assert sorted(ctx.step_times) == list(range(len(CONFIG['anonymization'])))
+    assert [token.fields for token in ctx.document('OUTPUT').tokens()][1] == \
+        ['2', 'Popescu', 'TaggerA7', 'TaggerA7+1', '5']
+
+
+def test_parallel_same_as_sequential(tmp_path, stub_stages):
+    expected = run_documents(str(tmp_path / 'sequential'), PipelineRunner(CONFIG).run)
+
+    for n in range(5):
+        runner = PipelineRunner(CONFIG, parallel=True)
+        assert run_documents(str(tmp_path / f'parallel{n}'), runner.run) == expected
+    # end for
+
+
+def test_pipelined_same_as_sequential(tmp_path, stub_stages):
+    expected = run_documents(str(tmp_path / 'sequential'), PipelineRunner(CONFIG).run)
+    runner = PipelinedRunner(CONFIG, stage_workers={9002: 3, 9003: 2, 9005: 4}, queue_size=1)
+
+    try:
+        for n in range(5):
+            folder = str(tmp_path / f'pipelined{n}')
+            os.makedirs(folder)
+
+            # The documents go through the steps at the same time
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                futures = [executor.submit(runner.run, task_values(folder, i), os.path.join(folder, f'run{i}'))
+                           for i in range(8)]
+
+                for future in futures:
+                    future.result()
+                # end for
+            # end with
+
+            assert read_outputs(folder, 8) == expected
+        # end for
+    finally:
+        runner.close()
+    # end try
+
+    stats = runner.stats()
+    assert [s['processed'] for s in stats] == [40] * len(stats)
+    # CaseMapStage is not thread safe, it gets one worker
+    assert stats[1]['workers'] == 3 and stats[3]['workers'] == 1
+
+
+def test_failing_step(tmp_path, stub_stages):
+    values = task_values(str(tmp_path), 0)
+    os.remove(values['DOCX'])
+
+    for runner in [PipelineRunner(CONFIG), PipelineRunner(CONFIG, parallel=True)]:
+        with pytest.raises(pipeline.PipelineError, match='Error on port 9001'):
+            runner.run(values, str(tmp_path / 'run'))
+        # end with
+    # end for
+
+
+@pytest.mark.parametrize('step_args, expected', [
+    ({}, 'docx'), ({'type': 'TYPE'}, 'txt'), ({'type': 'KIND'}, 'html'), ({'type': 'UNKNOWN'}, 'docx')])
+def test_input_type(tmp_path, step_args, expected):
+    # As TextExtractor and TextReconstruction read the type of /process
+    ctx = PipelineContext({'TYPE': 'txt', 'KIND': 'HTML', 'UNKNOWN': 'pdf'}, str(tmp_path))
+    assert pipeline._input_type(step_args, ctx) == expected
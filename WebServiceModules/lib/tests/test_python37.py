@@ -0,0 +1,59 @@
+import ast
+import os
+import shutil
+import subprocess
+
+import pytest
+
+SAROJ_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'saroj')
+MODULES_DIR = os.path.dirname(os.path.dirname(SAROJ_DIR))
+# The modules RNER imports, on Python 3.7, directly or through input_data
+RNER_MODULES = ['input_data', 'metrics', 'stage_cache', 'memory', 'profiling', 'conllu_document', 'conllu_utils']
+# The ones that do not need Flask
+PLAIN_MODULES = ['stage_cache', 'conllu_document', 'conllu_utils']
+
+
+def annotations(tree):
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            args = node.args.posonlyargs + node.args.args + node.args.kwonlyargs + [node.args.vararg, node.args.kwarg]
+            yield from (arg.annotation for arg in args if arg is not None and arg.annotation is not None)
+
+            if node.returns is not None:
+                yield node.returns
+            # end if
+        elif isinstance(node, ast.AnnAssign):
+            yield node.annotation
+        # end if
+    # end for
+
+
+@pytest.mark.parametrize('module', RNER_MODULES)
+def test_python37_syntax(module):
+    with open(os.path.join(SAROJ_DIR, f'{module}.py'), mode='r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), feature_version=(3, 7))
+    # end with
+
+    future = any(isinstance(node, ast.ImportFrom) and node.module == '__future__' and
+                 any(alias.name == 'annotations' for alias in node.names) for node in tree.body)
+
+    # list[str] and X | None are only evaluated lazily with the annotations import
+    if not future:
+        for annotation in annotations(tree):
+            assert not any(isinstance(node, (ast.Subscript, ast.BinOp)) for node in ast.walk(annotation)), \
+                f'{module}.py line {annotation.lineno}'
+        # end for
+    # end if
+
+
+def test_python37_import():
+    python = shutil.which('python3.7')
+
+    # e.g. a pyenv shim without the version installed
+    if python is None or subprocess.run([python, '-c', ''], capture_output=True).returncode != 0:
+        pytest.skip('no Python 3.7')
+    # end if
+
+    imports = '; '.join(f'import lib.saroj.{module}' for module in PLAIN_MODULES)
+    result = subprocess.run([python, '-c', imports], cwd=MODULES_DIR, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,198 @@
+import base64
+import json
+import os
+import threading
+import time
+
+from lib.saroj.scheduler import TASK_COST, TYPE_COSTS, TaskScheduler, estimate_cost
+
+CONFIG = {'version': 'test', 'anonymization': []}
+
+
+def document(size):
+    return base64.b64encode(b'x' * size).decode('ascii')
+
+
+def test_estimate_cost():
+    assert estimate_cost({}) == TASK_COST
+    assert estimate_cost({'document': None, 'type': 'txt'}) == TASK_COST
+    assert estimate_cost({'document': document(3000), 'type': 'txt'}) == TASK_COST + 3000
+    assert estimate_cost({'document': document(3000), 'type': 'html'}) == TASK_COST + int(3000 * TYPE_COSTS['html'])
+    # No type, or an unknown one, is docx, as in run_task()
+    assert estimate_cost({'document': document(3000)}) == \
+        estimate_cost({'document': document(3000), 'type': 'pdf'}) == \
+        TASK_COST + int(3000 * TYPE_COSTS['docx'])
+
+
+def write_task(folder, name, caseid, size, age, now):
+    path = os.path.join(folder, name)
+
+    with open(path, mode='w', encoding='utf-8') as f:
+        json.dump({'caseid': caseid, 'docid': name, 'document': document(size), 'type': 'txt', 'status': 'NEW'}, f)
+    # end with
+
+    os.utime(path, (now - age, now - age))
+
+
+def pending_names(scheduler):
+    tasks, deferred = scheduler._pending_tasks()
+    assert not deferred
+    return [task.name for task in tasks]
+
+
+def test_shortest_job_first(tmp_path):
+    now = time.time()
+    scheduler = TaskScheduler(CONFIG, task_dir=str(tmp_path), map_dir=str(tmp_path / 'cases'), aging=0)
+    scheduler.create_folders()
+    new_dir = str(tmp_path / 'new')
+    write_task(new_dir, 'large', 'a', 100000, 60, now)
+    write_task(new_dir, 'medium', 'd', 10000, 30, now)
+    write_task(new_dir, 'small', 'b', 100, 10, now)
+    write_task(str(tmp_path / 'prio'), 'prio', 'c', 200000, 0, now)
+
+    # The priority lane first, then the cheapest tasks
+    assert pending_names(scheduler) == ['prio', 'small', 'medium', 'large']
+
+    # The cost goes down by `aging` per second of wait: the large task passes the small one
+    scheduler._aging = 2500
+    assert pending_names(scheduler) == ['prio', 'medium', 'large', 'small']
+
+    scheduler._sjf = False
+    assert pending_names(scheduler) == ['prio', 'large', 'medium', 'small']
+
+
+def test_queue_order_within_a_case(tmp_path):
+    now = time.time()
+    scheduler = TaskScheduler(CONFIG, task_dir=str(tmp_path), map_dir=str(tmp_path / 'cases'), aging=0)
+    scheduler.create_folders()
+    new_dir = str(tmp_path / 'new')
+    write_task(new_dir, 'a-large', 'a', 100000, 60, now)
+    write_task(new_dir, 'a-small', 'a', 100, 30, now)
+    write_task(new_dir, 'b-medium', 'b', 10000, 20, now)
+    write_task(new_dir, 'b-small', 'b', 100, 10, now)
+
+    # The cheap task of a case waits for the older, larger one; the other case goes first
+    assert pending_names(scheduler) == ['b-medium', 'b-small', 'a-large', 'a-small']
+
+    # With aging, the older case passes the other one, still in queue order
+    scheduler._aging = 2500
+    assert pending_names(scheduler) == ['a-large', 'a-small', 'b-medium', 'b-small']
+
+
+def run_scheduler(scheduler, run_task, count):
+    done = threading.Event()
+    finished = []
+
+    def run_and_count(path_new, path_done):
+        result = run_task(path_new, path_done)
+        os.replace(path_new, path_done)
+        finished.append(os.path.basename(path_done))
+
+        if len(finished) == count:
+            done.set()
+        # end if
+
+        return result
+
+    scheduler.run_task = run_and_count
+    thread = threading.Thread(target=scheduler.run, daemon=True)
+    thread.start()
+
+    try:
+        assert done.wait(30)
+    finally:
+        scheduler.stop()
+        thread.join(30)
+    # end try
+
+    return finished
+
+
+def test_case_affinity(tmp_path):
+    now = time.time()
+    scheduler = TaskScheduler(CONFIG, task_dir=str(tmp_path), map_dir=str(tmp_path / 'cases'), workers=3,
+                              poll=True, poll_interval=0.01, case_affinity=True, sjf=False)
+    scheduler.create_folders()
+    names = []
+
+    # The tasks of a case one after the other in the queue, which they would leave together without affinity
+    for caseid in ['a', 'b', 'c']:
+        for i in range(4):
+            names.append(f'{caseid}{i}')
+            write_task(str(tmp_path / 'new'), names[-1], caseid, 100, 100 - len(names), now)
+        # end for
+    # end for
+
+    lock = threading.Lock()
+    running = {}
+    overlaps = []
+    most_running = [0]
+
+    def run_task(path_new, path_done):
+        with open(path_new, mode='r', encoding='utf-8') as f:
+            caseid = json.load(f)['caseid']
+        # end with
+
+        with lock:
+            running[caseid] = running.get(caseid, 0) + 1
+
+            if running[caseid] > 1:
+                overlaps.append(os.path.basename(path_new))
+            # end if
+
+            most_running[0] = max(most_running[0], sum(running.values()))
+        # end with
+
+        time.sleep(0.05)
+
+        with lock:
+            running[caseid] -= 1
+        # end with
+
+        return True
+
+    finished = run_scheduler(scheduler, run_task, len(names))
+
+    # The tasks of a case run one at a time, in queue order, and the cases in parallel
+    assert overlaps == []
+    assert most_running[0] > 1
+
+    for caseid in ['a', 'b', 'c']:
+        assert [n for n in finished if n[0] == caseid] == [n for n in names if n[0] == caseid]
+    # end for
+
+    stats = scheduler.stats()
+    assert stats['running'] == stats['waiting'] == 0
+    assert {caseid: s['started'] for caseid, s in stats['cases'].items()} == {'a': 4, 'b': 4, 'c': 4}
+
+
+def test_workers_without_case_affinity(tmp_path):
+    now = time.time()
+    scheduler = TaskScheduler(CONFIG, task_dir=str(tmp_path), map_dir=str(tmp_path / 'cases'), workers=3,
+                              poll=True, poll_interval=0.01)
+    scheduler.create_folders()
+
+    for i in range(6):
+        write_task(str(tmp_path / 'new'), f'a{i}', 'a', 100, 10, now)
+    # end for
+
+    lock = threading.Lock()
+    running = [0, 0]
+
+    def run_task(path_new, path_done):
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+        # end with
+
+        time.sleep(0.05)
+
+        with lock:
+            running[0] -= 1
+        # end with
+
+        return True
+
+    run_scheduler(scheduler, run_task, 6)
+    # The tasks of the same case run at the same time, up to the number of workers
+    assert running[1] == 3
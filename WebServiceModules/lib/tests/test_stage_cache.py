@@ -0,0 +1,118 @@
+import os
+import time
+
+from lib.saroj.stage_cache import StageCache, code_fingerprint, files_fingerprint, open_stage_cache
+
+
+def write(path, data):
+    with open(path, mode='w', encoding='utf-8') as f:
+        f.write(data)
+    # end with
+
+    return str(path)
+
+
+def test_key(tmp_path):
+    a = write(tmp_path / 'a.txt', 'Ion Popescu')
+    b = write(tmp_path / 'b.txt', 'din Cluj')
+    cache = StageCache(str(tmp_path / 'cache'), 'Test', 'v1', 'resources')
+    key = cache.key([a, b], {'type': 'txt', 'dtw': True})
+
+    # The same input under another name, the same parameters in another order
+    assert cache.key([write(tmp_path / 'c.txt', 'Ion Popescu'), b], {'dtw': True, 'type': 'txt'}) == key
+
+    assert cache.key([b, a], {'type': 'txt', 'dtw': True}) != key
+    assert cache.key([write(tmp_path / 'ab.txt', 'Ion Popescudin Cluj')], {'type': 'txt', 'dtw': True}) != key
+    assert cache.key([a, b], {'type': 'docx', 'dtw': True}) != key
+    assert cache.key([a, b]) != key
+    assert StageCache(str(tmp_path / 'cache'), 'Other', 'v1', 'resources').key([a, b], {'type': 'txt', 'dtw': True}) != key
+    assert StageCache(str(tmp_path / 'cache'), 'Test', 'v2', 'resources').key([a, b], {'type': 'txt', 'dtw': True}) != key
+
+    # A reloaded dictionary
+    cache.fingerprint = 'other resources'
+    assert cache.key([a, b], {'type': 'txt', 'dtw': True}) != key
+
+    write(a, 'Ion Popescu.')
+    cache.fingerprint = 'resources'
+    assert cache.key([a, b], {'type': 'txt', 'dtw': True}) != key
+
+
+def test_code_fingerprint(tmp_path):
+    module_dir = tmp_path / 'Module'
+    (module_dir / 'sub').mkdir(parents=True)
+    write(module_dir / 'api.py', 'print(1)\n')
+    write(module_dir / 'README.md', 'A module\n')
+    fingerprint = code_fingerprint(str(module_dir))
+
+    # Only the Python sources count
+    write(module_dir / 'README.md', 'The module\n')
+    assert code_fingerprint(str(module_dir)) == fingerprint
+
+    write(module_dir / 'sub' / 'process.py', 'print(2)\n')
+    assert code_fingerprint(str(module_dir)) != fingerprint
+
+
+def test_files_fingerprint(tmp_path):
+    model_dir = tmp_path / 'model'
+    model_dir.mkdir()
+    weights = write(model_dir / 'weights.bin', '0123')
+    dictionary = write(tmp_path / 'd.dic', 'PER\tIon\n')
+    fingerprint = files_fingerprint([str(model_dir), dictionary])
+
+    assert files_fingerprint([str(model_dir), dictionary]) == fingerprint
+
+    # By size and modification time, the files are not read
+    os.utime(weights, ns=(0, 0))
+    assert files_fingerprint([str(model_dir), dictionary]) != fingerprint
+
+    fingerprint = files_fingerprint([str(model_dir), dictionary])
+    write(model_dir / 'labels.txt', 'PER\n')
+    assert files_fingerprint([str(model_dir), dictionary]) != fingerprint
+
+    fingerprint = files_fingerprint([str(model_dir), dictionary])
+    os.remove(dictionary)
+    assert files_fingerprint([str(model_dir), dictionary]) != fingerprint
+
+
+def test_get_and_put(tmp_path):
+    cache = open_stage_cache(str(tmp_path / 'cache'), 'Test', str(tmp_path), [])
+    input_file = write(tmp_path / 'in.txt', 'Ion Popescu')
+    key = cache.key([input_file])
+
+    assert not cache.get(key, str(tmp_path / 'out.txt'))
+    assert not os.path.exists(tmp_path / 'out.txt')
+
+    cache.put(key, write(tmp_path / 'out.txt', 'Ion\tB-PER\nPopescu\tI-PER\n'))
+    write(tmp_path / 'out.txt', 'changed')
+    assert cache.get(key, str(tmp_path / 'copy.txt'))
+
+    with open(tmp_path / 'copy.txt', mode='r', encoding='utf-8') as f:
+        assert f.read() == 'Ion\tB-PER\nPopescu\tI-PER\n'
+    # end with
+
+    assert cache.stats() == {'stage': 'Test', 'hits': 1, 'misses': 1, 'max_bytes': 1024 << 20}
+    assert open_stage_cache(None, 'Test', str(tmp_path)) is None
+
+
+def test_eviction(tmp_path):
+    cache = StageCache(str(tmp_path / 'cache'), 'Test', 'v1', max_bytes=1000)
+    output = write(tmp_path / 'out.txt', 'x' * 100)
+    keys = [f'{i:02}' for i in range(11)]
+    now = time.time()
+
+    for i, key in enumerate(keys[:10]):
+        cache.put(key, output)
+        # Used one second after the other
+        os.utime(os.path.join(tmp_path, 'cache', 'Test', key), (now - 100 + i, now - 100 + i))
+    # end for
+
+    # 1000 bytes, not more than max_bytes
+    assert sorted(os.listdir(tmp_path / 'cache' / 'Test')) == keys[:10]
+
+    # The oldest is used again
+    assert cache.get(keys[0], str(tmp_path / 'copy.txt'))
+    cache.put(keys[10], output)
+
+    # The least recently used go, down to 90% of max_bytes
+    assert sorted(os.listdir(tmp_path / 'cache' / 'Test')) == [keys[0]] + keys[3:]
+    assert not cache.get(keys[1], str(tmp_path / 'copy.txt'))
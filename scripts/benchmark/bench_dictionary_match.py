@@ -0,0 +1,203 @@
+"""Benchmark of the Dictionary module matcher.
+
+Compares the window scan that `assign_ner_to_document()` used to do, which sorts
+every prefix of a `max_count` tokens window and looks it up in the trie, with
+`DictionaryMatcher`, on synthetic decisions. The dictionary has the names of the
+decisions and many other entries, and, with `--long-entry`, one entry of that many
+tokens made of common words, which sets `max_count` and so the window size.
+Both must tag the documents the same way; `check()` also compares them on random
+token sequences with "-" tokens, permuted and lowercase names.
+
+Usage: python bench_dictionary_match.py [--pages 1 10 50] [--entries 50000] [--long-entry 150]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from collections import deque
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..', 'WebServiceModules'))
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..', 'WebServiceModules', 'Dictionary'))
+from dictionary_process import DictionaryMatcher, assign_ner_to_document, custom_sort, find_in_trie, parse_document
+from lib.saroj.conllu_document import CoNLLUDocument, CoNLLUDocumentWriter
+from lib.saroj.suffix_process import suffix_replace
+from synthetic_decisions import CITIES, COMPANIES, FIRST_NAMES, LAST_NAMES, DecisionGenerator
+
+LONG_ENTRY_WORDS = ['de', 'a', 'din', 'şi', 'la', 'în', 'instanţa', 'cererea', 'pentru', 'cu']
+
+
+def reference_assign_ner(document: CoNLLUDocument, trie_root, max_count: int) -> CoNLLUDocument:
+    """The previous window scan, kept here as the reference."""
+
+    def test_subsequences(tokens):
+        results = ()
+        cleaned_tokens = [token for token in tokens if token != '-']
+        sorted_tokens = sorted((token.lower() for token in cleaned_tokens), key=custom_sort)
+
+        for _ in range(len(cleaned_tokens), 0, -1):
+            found, ner = find_in_trie(trie_root, sorted_tokens)
+
+            if found:
+                results = (' '.join(cleaned_tokens), ner)
+                break
+            # end if
+
+            remove_token = cleaned_tokens.pop()
+            sorted_tokens.remove(remove_token.lower())
+        # end for
+
+        return results
+
+    def process_and_write():
+        r = test_subsequences(current_entities)
+
+        if r and r[0][0].isupper():
+            for i in range(len(r[0].split())):
+                output_buffer.write(current_line.popleft().strip() + '\t' + f"{'B' if i == 0 else 'I'}-{r[1]}" + '\n')
+                current_entities.popleft()
+            # end for
+        else:
+            if current_entities[0] != '':
+                output_buffer.write(current_line.popleft().strip() + '\tO\n')
+            else:
+                output_buffer.write(current_line.popleft())
+            # end if
+
+            current_entities.popleft()
+        # end if
+
+    output_buffer = CoNLLUDocumentWriter()
+    current_entities = deque(maxlen=max_count)
+    current_line = deque(maxlen=max_count)
+
+    for form, line in parse_document(document):
+        current_entities.append(suffix_replace(form)[0])
+        current_line.append(line)
+
+        if len(current_entities) >= max_count:
+            process_and_write()
+        # end if
+    # end for
+
+    while current_entities:
+        process_and_write()
+    # end while
+
+    return output_buffer.close()
+
+
+def make_dictionary(entries: int, long_entry: int, seed: int = 1) -> tuple[DictionaryMatcher, int]:
+    """Same keys as `load_dictionary_matcher()` makes from a dictionary file."""
+
+    rng = random.Random(seed)
+    dictionary = {}
+
+    for first in FIRST_NAMES:
+        for last in LAST_NAMES:
+            dictionary[f'{last} {first}'.lower()] = 'PER'
+        # end for
+    # end for
+
+    for city in CITIES:
+        dictionary[city.lower()] = 'LOC'
+    # end for
+
+    for company in COMPANIES:
+        dictionary[f'sc {company} srl'.lower()] = 'ORG'
+    # end for
+
+    letters = 'abcdefghijklmnopqrstuvwxyzăâîşţ'
+
+    while len(dictionary) < entries:
+        words = [''.join(rng.choice(letters) for _ in range(rng.randint(3, 9))) for _ in range(rng.randint(1, 4))]
+        dictionary[' '.join(words)] = rng.choice(['PER', 'LOC', 'ORG'])
+    # end while
+
+    if long_entry:
+        dictionary[' '.join(rng.choice(LONG_ENTRY_WORDS) for _ in range(long_entry))] = 'ORG'
+    # end if
+
+    matcher = DictionaryMatcher()
+
+    for key, value in dictionary.items():
+        matcher.add(sorted(key.split(), key=custom_sort), value)
+    # end for
+
+    matcher.compact()
+    return matcher, max(len(key.split()) for key in dictionary)
+
+
+def to_document(paragraphs: list[str]) -> CoNLLUDocument:
+    lines = []
+
+    for n, paragraph in enumerate(paragraphs):
+        lines.append(f'# sent_id = {n + 1}\n')
+
+        for i, form in enumerate(re.findall(r'\w+(?:-\w+)*|-|[^\w\s]', paragraph)):
+            lines.append(f'{i + 1}\t{form}\t_\t_\t_\t_\t_\t_\t_\t_\n')
+        # end for
+
+        lines.append('\n')
+    # end for
+
+    return CoNLLUDocument.from_lines(lines)
+
+
+def check(matcher: DictionaryMatcher, max_count: int, trials: int = 300, seed: int = 2):
+    """Both scans must tag random token sequences the same way."""
+
+    rng = random.Random(seed)
+    vocabulary = [w for name in FIRST_NAMES + LAST_NAMES + CITIES for w in name.split()] + \
+        ['-', 'din', 'şi', ',', 'SC', 'SRL', 'Alfa', 'Construct', 'ion', 'POPESCU'] + LONG_ENTRY_WORDS
+
+    for _ in range(trials):
+        lines = []
+
+        for i in range(rng.randint(0, 60)):
+            lines.append(f'{i + 1}\t{rng.choice(vocabulary)}\t_\n')
+        # end for
+
+        document = CoNLLUDocument.from_lines(['# sent_id = 1\n'] + lines + ['\n'])
+
+        for window in (max_count, 1, 2, 3):
+            expected = list(reference_assign_ner(document, matcher.trie_root, window).lines())
+            assert list(assign_ner_to_document(document, matcher, window).lines()) == expected, lines
+        # end for
+    # end for
+
+
+def time_it(function) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Dictionary matcher benchmark.')
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 10, 50], help='sizes of the decisions, in pages')
+    parser.add_argument('--entries', type=int, default=50000, help='entries of the dictionary')
+    parser.add_argument('--long-entry', type=int, nargs='+', default=[0, 150],
+                        help='tokens of the one long entry of the dictionary, 0 for none')
+    parser.add_argument('--density', type=float, default=0.3, help='share of the sentences with entities, 0 to 1')
+    args = parser.parse_args()
+
+    print(f'{"long entry":>10}{"max_count":>10}{"pages":>7}{"tokens":>8}{"window ms":>12}{"matcher ms":>12}{"speedup":>10}')
+
+    for long_entry in args.long_entry:
+        matcher, max_count = make_dictionary(args.entries, long_entry)
+        check(matcher, max_count)
+
+        for pages in args.pages:
+            document = to_document(DecisionGenerator(seed=pages, density=args.density).decision(pages))
+            expected = list(reference_assign_ner(document, matcher.trie_root, max_count).lines())
+            assert list(assign_ner_to_document(document, matcher, max_count).lines()) == expected
+
+            window = time_it(lambda: reference_assign_ner(document, matcher.trie_root, max_count))
+            hashed = time_it(lambda: assign_ner_to_document(document, matcher, max_count))
+            print(f'{long_entry:>10}{max_count:>10}{pages:>7}{len(document):>8}{window * 1000:>12.1f}'
+                  f'{hashed * 1000:>12.1f}{window / hashed:>9.1f}x')
+        # end for
+    # end for
@@ -0,0 +1,344 @@
+"""End-to-end benchmark of the anonymization pipeline on synthetic decisions.
+
+Generates decisions with `synthetic_decisions.py` and runs them through the
+`anonymization` steps of a Web Service `config.json`, in two passes:
+
+- stages: the steps one after the other, each one alone on the machine, timed
+  separately; this is the cost of each module in isolation;
+- pipeline: the whole pipeline on each document, as the task scheduler runs it,
+  with `--concurrency` documents at a time through a `PipelinedRunner`.
+
+For every stage, document type and size it reports documents/s, p50 and p99
+latency and peak RSS. In-process stages are measured in this process, with the
+peak reset before each step where the kernel allows it; modules called over
+HTTP report the peak of the worker that answered, from `/debug/memory`.
+The results are written as JSON, with the commit and the machine, so that
+runs can be compared with `--compare`.
+
+Usage: python bench_pipeline.py CONFIG [--pages 1 10 100] [--types docx txt] [--count 3]
+                                [--density 0.3] [--http] [--output results.json] [--compare old.json]
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..', 'WebServiceModules'))
+from lib.saroj.pipeline import PipelineContext, PipelineRunner, PipelinedRunner, PipelineError
+from synthetic_decisions import TYPES, generate
+
+RESULTS_VERSION = 1
+
+
+def peak_rss() -> int:
+    """Peak RSS of this process since the last `reset_peak_rss()`, in bytes."""
+
+    try:
+        with open('/proc/self/status', mode='r', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+                # end if
+            # end for
+        # end with
+    except OSError:
+        pass
+    # end try
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def reset_peak_rss():
+    """Sets the peak RSS back to the current RSS, Linux only; else the peak is that of the whole run."""
+
+    try:
+        with open('/proc/self/clear_refs', mode='w') as f:
+            f.write('5')
+        # end with
+    except OSError:
+        pass
+    # end try
+
+
+def module_peak_rss(host: str, port: int) -> int | None:
+    """Peak RSS of the worker of the module on `port` that answers, None if it has no `/debug/memory`."""
+
+    try:
+        with urllib.request.urlopen(f'http://{host}:{port}/debug/memory', timeout=10) as response:
+            return json.load(response)['memory']['peak_rss']
+        # end with
+    except (OSError, ValueError, KeyError):
+        return None
+    # end try
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Nearest-rank percentile; with few documents, p99 is the slowest one."""
+
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def summarize(stage: str, doc_type: str, pages: int, latencies: list[float], errors: int,
+              rss: list[int], elapsed: float | None = None) -> dict:
+    """`elapsed`, the wall time of the documents, when they overlap; else the sum of the latencies."""
+
+    total = elapsed if elapsed is not None else sum(latencies)
+    return {'stage': stage, 'type': doc_type, 'pages': pages, 'documents': len(latencies), 'errors': errors,
+            'docs_per_s': round(len(latencies) / total, 4) if latencies and total > 0 else None,
+            'p50': round(percentile(latencies, 50), 4) if latencies else None,
+            'p99': round(percentile(latencies, 99), 4) if latencies else None,
+            'mean': round(sum(latencies) / len(latencies), 4) if latencies else None,
+            'peak_rss': max(rss) if rss else None}
+
+
+def task_values(document: dict, work_dir: str, name: str) -> dict:
+    return {'CASEID': name, 'DOCID': name, 'DOCX': document['path'], 'TYPE': document['type'],
+            'CASEMAP': os.path.join(work_dir, 'cases', f'{name}.map'),
+            'OUTPUT': os.path.join(work_dir, 'output', f'{name}.{document["type"]}')}
+
+
+def warm_up(runner: PipelineRunner, documents: list[dict], work_dir: str):
+    """Loads the models and fills the lazy caches of the stages, not measured."""
+
+    run_dir = os.path.join(work_dir, 'run', 'warmup')
+    os.makedirs(run_dir, exist_ok=True)
+    runner.run(task_values(documents[0], work_dir, 'warmup'), run_dir)
+    shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def bench_stages(config: dict, documents: list[dict], work_dir: str, in_process: bool,
+                 inline_transport: bool) -> list[dict]:
+    """Runs the steps of each document one at a time, timing each one and taking its peak RSS."""
+
+    runner = PipelineRunner(config, in_process=in_process, inline_transport=inline_transport)
+    warm_up(runner, documents, work_dir)
+    names = runner.step_names()
+    steps = config['anonymization']
+    latencies = {}
+    rss = {}
+    errors = {}
+
+    for document in documents:
+        key = (document['type'], document['pages'])
+        name = 'stages-' + os.path.basename(document['path']).replace('.', '-')
+        run_dir = os.path.join(work_dir, 'run', name)
+        os.makedirs(run_dir, exist_ok=True)
+        ctx = PipelineContext(task_values(document, work_dir, name), run_dir)
+
+        for index, stage in enumerate(names):
+            reset_peak_rss()
+
+            try:
+                runner.run_step(index, ctx)
+            except PipelineError as e:
+                print(f'{stage} failed on {document["path"]}: {e}', file=sys.stderr, flush=True)
+                errors[(stage,) + key] = errors.get((stage,) + key, 0) + 1
+                break
+            # end try
+
+            latencies.setdefault((stage,) + key, []).append(ctx.step_times[index])
+
+            if runner.is_in_process(index):
+                peak = peak_rss()
+            else:
+                peak = module_peak_rss(steps[index].get('host', '127.0.0.1'), int(steps[index]['port']))
+            # end if
+
+            if peak is not None:
+                rss.setdefault((stage,) + key, []).append(peak)
+            # end if
+        # end for
+
+        shutil.rmtree(run_dir, ignore_errors=True)
+    # end for
+
+    results = []
+
+    for (stage, doc_type, pages) in sorted(set(latencies) | set(errors), key=lambda k: (names.index(k[0]), k[1], k[2])):
+        results.append(summarize(stage, doc_type, pages, latencies.get((stage, doc_type, pages), []),
+                                 errors.get((stage, doc_type, pages), 0), rss.get((stage, doc_type, pages), [])))
+    # end for
+
+    return results
+
+
+def module_peaks(runner: PipelineRunner, config: dict) -> list[int]:
+    """Peak RSS of each module called over HTTP."""
+
+    ports = {}
+
+    for index, step in enumerate(config['anonymization']):
+        if not runner.is_in_process(index):
+            ports[int(step['port'])] = step.get('host', '127.0.0.1')
+        # end if
+    # end for
+
+    return [peak for peak in (module_peak_rss(host, port) for port, host in ports.items()) if peak is not None]
+
+
+def bench_pipeline(config: dict, documents: list[dict], work_dir: str, in_process: bool,
+                   concurrency: int, inline_transport: bool) -> list[dict]:
+    """Runs the whole pipeline on the documents of each type and size, `concurrency` at a time.
+    The peak RSS is that of this process plus those of the modules called over HTTP."""
+
+    runner = PipelinedRunner(config, in_process=in_process, inline_transport=inline_transport,
+                             queue_size=max(2, concurrency))
+    groups = {}
+    results = []
+
+    for document in documents:
+        groups.setdefault((document['type'], document['pages']), []).append(document)
+    # end for
+
+    def run_one(document: dict) -> float | None:
+        name = 'pipeline-' + os.path.basename(document['path']).replace('.', '-')
+        run_dir = os.path.join(work_dir, 'run', name)
+        os.makedirs(run_dir, exist_ok=True)
+        start = time.perf_counter()
+
+        try:
+            runner.run(task_values(document, work_dir, name), run_dir)
+            return time.perf_counter() - start
+        except PipelineError as e:
+            print(f'Pipeline failed on {document["path"]}: {e}', file=sys.stderr, flush=True)
+            return None
+        finally:
+            shutil.rmtree(run_dir, ignore_errors=True)
+        # end try
+
+    try:
+        warm_up(runner, documents, work_dir)
+
+        for (doc_type, pages), group in sorted(groups.items()):
+            reset_peak_rss()
+            start = time.perf_counter()
+
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                times = list(executor.map(run_one, group))
+            # end with
+
+            elapsed = time.perf_counter() - start
+            latencies = [t for t in times if t is not None]
+            results.append(summarize('pipeline', doc_type, pages, latencies, len(times) - len(latencies),
+                                     [peak_rss() + sum(module_peaks(runner, config))], elapsed))
+        # end for
+    finally:
+        runner.close()
+    # end try
+
+    return results
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.realpath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    # end try
+
+
+def compare(results: list[dict], previous: dict):
+    """Prints the change of throughput and latency of each result against the `previous` run."""
+
+    before = {(r['stage'], r['type'], r['pages']): r for r in previous['results']}
+    print(f'\nCompared with {previous.get("commit") or "?"} of {previous.get("started", "?")}:')
+    print(f'{"stage":<28}{"type":<6}{"pages":>6}{"docs/s":>10}{"p50":>10}{"p99":>10}{"peak RSS":>10}')
+
+    def change(new, old) -> str:
+        return f'{(new - old) / old * 100:+.1f}%' if new is not None and old else '-'
+
+    for r in results:
+        old = before.get((r['stage'], r['type'], r['pages']))
+
+        if old is not None:
+            print(f'{r["stage"]:<28}{r["type"]:<6}{r["pages"]:>6}{change(r["docs_per_s"], old["docs_per_s"]):>10}'
+                  f'{change(r["p50"], old["p50"]):>10}{change(r["p99"], old["p99"]):>10}'
+                  f'{change(r["peak_rss"], old["peak_rss"]):>10}')
+        # end if
+    # end for
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='End-to-end benchmark of the anonymization pipeline.')
+    parser.add_argument('CONFIG', type=str, help='the config.json file of the Web Service')
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 10, 100], help='sizes of the decisions, in pages')
+    parser.add_argument('--types', type=str, nargs='+', default=list(TYPES), choices=TYPES, help='document types')
+    parser.add_argument('--count', type=int, default=3, help='decisions of each size and type')
+    parser.add_argument('--density', type=float, default=0.3, help='share of the sentences with entities, 0 to 1')
+    parser.add_argument('--seed', type=int, default=1, help='same seed, same decisions')
+    parser.add_argument('--passes', type=str, nargs='+', default=['stages', 'pipeline'], choices=['stages', 'pipeline'],
+                        help='benchmarks to run')
+    parser.add_argument('--http', action='store_true', help='call all modules over HTTP, as start.php does')
+    parser.add_argument('--inline-transport', action='store_true',
+                        help='send the intermediary documents to the HTTP modules in the request, not as paths')
+    parser.add_argument('--concurrency', type=int, default=1, help='documents in the pipeline at the same time')
+    parser.add_argument('--work-dir', type=str, default='/tmp/saroj-bench', help='folder for the documents and the runs')
+    parser.add_argument('--output', type=str, default=None,
+                        help='results file, default: bench-<date>.json in the work folder')
+    parser.add_argument('--compare', type=str, default=None, help='results file of a previous run to compare with')
+    args = parser.parse_args()
+
+    with open(args.CONFIG, mode='r', encoding='utf-8') as f:
+        config = json.load(f)
+    # end with
+
+    started = time.strftime('%Y-%m-%dT%H:%M:%S')
+    print(f'Generating {args.count} decisions of {args.pages} pages as {args.types}', flush=True)
+    documents = generate(os.path.join(args.work_dir, 'documents'), args.pages, args.types, args.count,
+                         args.density, args.seed)
+
+    for folder in ('cases', 'output', 'run'):
+        os.makedirs(os.path.join(args.work_dir, folder), exist_ok=True)
+    # end for
+
+    results = []
+
+    # Each pass loads its own stages, the in-process ones in this process
+    if 'stages' in args.passes:
+        results += bench_stages(config, documents, args.work_dir, not args.http, args.inline_transport)
+    # end if
+
+    if 'pipeline' in args.passes:
+        results += bench_pipeline(config, documents, args.work_dir, not args.http, args.concurrency,
+                                  args.inline_transport)
+    # end if
+
+    report = {'version': RESULTS_VERSION, 'started': started, 'commit': git_commit(),
+              'machine': {'platform': platform.platform(), 'python': platform.python_version(),
+                          'cpus': os.cpu_count()},
+              'options': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+              'documents': [{key: d[key] for key in ('type', 'pages', 'words', 'entities', 'bytes')}
+                            for d in documents],
+              'results': results}
+    output = args.output or os.path.join(args.work_dir, f'bench-{started.replace(":", "")}.json')
+
+    with open(output, mode='w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    # end with
+
+    print(f'{"stage":<28}{"type":<6}{"pages":>6}{"docs":>6}{"docs/s":>10}{"p50 s":>10}{"p99 s":>10}{"peak MB":>10}')
+
+    for r in results:
+        rss = f'{r["peak_rss"] / (1 << 20):.0f}' if r['peak_rss'] else '-'
+        print(f'{r["stage"]:<28}{r["type"]:<6}{r["pages"]:>6}{r["documents"]:>6}{r["docs_per_s"] or 0:>10.3f}'
+              f'{r["p50"] or 0:>10.3f}{r["p99"] or 0:>10.3f}{rss:>10}')
+    # end for
+
+    print(f'Results written to {output}')
+
+    if args.compare:
+        with open(args.compare, mode='r', encoding='utf-8') as f:
+            compare(results, json.load(f))
+        # end with
+    # end if
@@ -0,0 +1,125 @@
+"""Benchmark for mapping annotation spans to CoNLL-U token lines.
+
+Compares the linear walk over the sentence that `CoNLLUFileAnnotator` used to do
+for every annotation with the `SentenceOffsets` binary search index, on
+entity-dense sentences: address blocks and party lists.
+
+Usage: python bench_span_lookup.py [--tokens 50 200 800] [--repeat 5]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..', 'WebServiceModules'))
+from lib.saroj.conllu_utils import SentenceOffsets
+
+STREETS = ['Str.', 'Mihai', 'Eminescu', 'nr.', '12', ',', 'bl.', 'A3', ',', 'sc.', '2', ',', 'ap.', '14', ',',
+           'jud.', 'Mehedinţi', ',', 'mun.', 'Drobeta-Turnu', 'Severin', ';']
+PARTIES = ['reclamantul', 'Popescu', 'Ion', ',', 'CNP', '1550611123456', ',', 'şi', 'pârâta', 'SC', 'Alfa',
+           'Construct', 'SRL', ',', 'CUI', 'RO123456', ',']
+
+
+def linear_token_range(offset: tuple[int, int], s_words: list[str]) -> tuple[int, int] | None:
+    """The previous per-annotation walk, kept here as the reference."""
+
+    tok_offset_start = 0
+    left_i = -1
+    right_i = -1
+
+    for i, tok in enumerate(s_words):
+        tok_offset_end = tok_offset_start + len(tok)
+
+        if not (tok_offset_end <= offset[0] or offset[1] <= tok_offset_start):
+            if left_i == -1:
+                left_i = i
+            # end if
+
+            right_i = i
+        elif offset[1] <= tok_offset_start:
+            break
+        # end if
+
+        tok_offset_start = tok_offset_end
+    # end for
+
+    if left_i >= 0:
+        return (left_i, right_i + 1)
+    else:
+        return None
+    # end if
+
+
+def make_sentence(token_count: int, pattern: list[str]) -> tuple[list[str], list[tuple[int, int]]]:
+    """Returns the words of a sentence and one annotation span for every
+    non-punctuation token, like an annotator marking a dense party list."""
+
+    words = []
+    spans = []
+    offset = 0
+
+    for i in range(token_count):
+        form = pattern[i % len(pattern)]
+        word = form if form in ',;' else form + ' '
+        words.append(word)
+
+        if form not in ',;':
+            spans.append((offset, offset + len(form)))
+        # end if
+
+        offset += len(word)
+    # end for
+
+    return words, spans
+
+
+def time_it(function, repeat: int) -> float:
+    best = float('inf')
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    # end for
+
+    return best
+
+
+def check(words: list[str], trials: int = 2000):
+    """Both lookups must agree on random spans, including empty and out of range ones."""
+
+    index = SentenceOffsets(words)
+    length = sum(len(w) for w in words)
+
+    for _ in range(trials):
+        a = random.randint(0, length + 2)
+        b = random.randint(a, length + 3)
+        assert index.token_range((a, b)) == linear_token_range((a, b), words), (a, b)
+    # end for
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Span to token lookup benchmark.')
+    parser.add_argument('--tokens', type=int, nargs='+', default=[50, 200, 800],
+                        help='sentence lengths, in tokens')
+    parser.add_argument('--repeat', type=int, default=5, help='best of this many runs')
+    args = parser.parse_args()
+
+    print(f'{"sentence":<10}{"tokens":>8}{"spans":>8}{"linear ms":>12}{"bisect ms":>12}{"speedup":>10}')
+
+    for name, pattern in (('address', STREETS), ('parties', PARTIES)):
+        for token_count in args.tokens:
+            words, spans = make_sentence(token_count, pattern)
+            check(words)
+
+            linear = time_it(lambda: [linear_token_range(s, words) for s in spans], args.repeat)
+            # Includes building the index, done once per sentence
+            bisect = time_it(lambda: [ix.token_range(s) for ix in [SentenceOffsets(words)] for s in spans],
+                             args.repeat)
+
+            print(f'{name:<10}{token_count:>8}{len(spans):>8}{linear * 1000:>12.3f}{bisect * 1000:>12.3f}'
+                  f'{linear / bisect:>9.1f}x')
+        # end for
+    # end for
@@ -0,0 +1,164 @@
+"""Memory and speed of the Dictionary trie.
+
+Compares the object trie the Dictionary module used, one `TrieNode` object and one
+dict per node, with the array-backed `Trie` of `Dictionary/Trie.py`, on synthetic
+dictionaries of person and place names: one to four words drawn from a vocabulary
+with a Zipf distribution, so that entries share their first words as real names do.
+Each structure is built in its own process, which reports the build time, the memory
+allocated by the structure (tracemalloc) and the RSS growth, then the time of lookups
+of entries and of missing keys.
+
+Usage: python bench_trie.py [--entries 100000 1000000] [--lookups 200000]
+"""
+
+import argparse
+import gc
+import itertools
+import multiprocessing
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..', 'WebServiceModules', 'Dictionary'))
+import Trie
+
+VOCABULARY = 50000
+
+
+class TrieNode:
+    """The previous node, kept here as the reference."""
+
+    def __init__(self):
+        self.children = {}
+        self.is_end = False
+        self.value = None
+
+
+def node_add(root, words, value):
+    node = root
+    for word in words:
+        if word not in node.children:
+            node.children[word] = TrieNode()
+        node = node.children[word]
+    node.is_end = True
+    node.value = value
+
+
+def node_find(root, words):
+    node = root
+    for word in words:
+        if word not in node.children:
+            return False, None
+        node = node.children[word]
+    return node.is_end, node.value
+
+
+def make_entries(count: int, seed: int = 1) -> list[list[str]]:
+    rng = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyzăâîşţ'
+    vocabulary = [''.join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(VOCABULARY)]
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(VOCABULARY)))
+    entries = set()
+
+    while len(entries) < count:
+        words = rng.choices(vocabulary, cum_weights=cum_weights, k=rng.choice((1, 2, 2, 2, 3, 3, 4)))
+        entries.add(tuple(sorted(words, key=Trie.custom_sort)))
+    # end while
+
+    return [list(words) for words in sorted(entries)]
+
+
+def rss() -> int:
+    with open('/proc/self/status', mode='r', encoding='ascii') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+            # end if
+        # end for
+    # end with
+
+    return 0
+
+
+def measure(kind: str, count: int, lookups: int, results):
+    entries = make_entries(count)
+    rng = random.Random(2)
+    present = [rng.choice(entries) for _ in range(lookups)]
+    missing = [entry[:-1] + ['zzz' + entry[-1]] for entry in present]
+    gc.collect()
+
+    if kind == 'node':
+        root, add, find, compact = TrieNode(), node_add, node_find, None
+    else:
+        root, add, find, compact = Trie.Trie(), Trie.add_to_trie, Trie.find_in_trie, Trie.compact_trie
+    # end if
+
+    before = rss()
+    start = time.perf_counter()
+
+    for words in entries:
+        add(root, words, 'PER')
+    # end for
+
+    if compact is not None:
+        compact(root)
+    # end if
+
+    build = time.perf_counter() - start
+    gc.collect()
+    growth = rss() - before
+
+    start = time.perf_counter()
+    assert all(find(root, words)[0] for words in present)
+    hit = time.perf_counter() - start
+    start = time.perf_counter()
+    assert not any(find(root, words)[0] for words in missing)
+    miss = time.perf_counter() - start
+
+    # Allocated size, on a second structure built while tracing
+    del root
+    gc.collect()
+    root = TrieNode() if kind == 'node' else Trie.Trie()
+    tracemalloc.start()
+
+    for words in entries:
+        add(root, words, 'PER')
+    # end for
+
+    if compact is not None:
+        compact(root)
+    # end if
+
+    allocated, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results.put({'build': build, 'rss': growth, 'allocated': allocated, 'peak': peak,
+                 'hit_us': hit / lookups * 1e6, 'miss_us': miss / lookups * 1e6})
+
+
+def run(kind: str, count: int, lookups: int) -> dict:
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=measure, args=(kind, count, lookups, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Dictionary trie memory and speed.')
+    parser.add_argument('--entries', type=int, nargs='+', default=[100000, 1000000], help='entries of the dictionary')
+    parser.add_argument('--lookups', type=int, default=200000, help='lookups of entries and of missing keys')
+    args = parser.parse_args()
+
+    print(f'{"entries":>9}{"trie":>7}{"build s":>9}{"alloc MB":>10}{"peak MB":>9}{"RSS MB":>8}'
+          f'{"hit us":>8}{"miss us":>9}')
+
+    for count in args.entries:
+        for kind in ('node', 'array'):
+            r = run(kind, count, args.lookups)
+            print(f'{count:>9}{kind:>7}{r["build"]:>9.2f}{r["allocated"] / (1 << 20):>10.1f}'
+                  f'{r["peak"] / (1 << 20):>9.1f}{r["rss"] / (1 << 20):>8.1f}{r["hit_us"]:>8.2f}{r["miss_us"]:>9.2f}')
+        # end for
+    # end for
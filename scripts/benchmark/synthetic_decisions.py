@@ -0,0 +1,271 @@
+"""Synthetic Romanian court decisions, for the benchmarks.
+
+Writes decisions of a given number of pages as docx, txt or html, the three
+input types of TextExtractor. The text follows the layout of a civil sentence:
+the court header, the parties, the reasons and the ruling. `density` is the
+share of sentences that carry entities: person names with their CNP and
+address, companies, case numbers, dates and ECLI codes. Decisions with the
+same seed are the same, so runs of the benchmark can be compared.
+
+Usage: python synthetic_decisions.py OUTPUT_DIR [--pages 1 10 100] [--types docx txt html] [--density 0.3]
+"""
+
+import argparse
+import json
+import os
+import random
+import zipfile
+from xml.sax.saxutils import escape
+
+# Words of a printed page of a decision
+WORDS_PER_PAGE = 450
+TYPES = ('docx', 'txt', 'html')
+
+FIRST_NAMES = ['Ion', 'Maria', 'Gheorghe', 'Elena', 'Vasile', 'Ioana', 'Constantin', 'Ana', 'Mihai', 'Cristina',
+               'Andrei', 'Mihaela', 'Dumitru', 'Alexandra', 'Ştefan', 'Georgiana', 'Nicolae', 'Florentina']
+LAST_NAMES = ['Popescu', 'Ionescu', 'Popa', 'Dumitru', 'Stoica', 'Stan', 'Munteanu', 'Constantinescu', 'Dobre',
+              'Ştefănescu', 'Barbu', 'Nistor', 'Florea', 'Tănase', 'Moldovan', 'Lungu', 'Ţurcanu', 'Sârbu']
+CITIES = ['Bucureşti', 'Craiova', 'Cluj-Napoca', 'Iaşi', 'Timişoara', 'Constanţa', 'Braşov', 'Ploieşti',
+          'Drobeta-Turnu Severin', 'Târgu Mureş', 'Piteşti', 'Suceava']
+COUNTIES = ['Dolj', 'Cluj', 'Iaşi', 'Timiş', 'Constanţa', 'Braşov', 'Prahova', 'Mehedinţi', 'Mureş', 'Argeş',
+            'Suceava', 'Ilfov']
+STREETS = ['Mihai Eminescu', 'Unirii', 'Libertăţii', 'Republicii', 'Ştefan cel Mare', 'Independenţei',
+           'Victoriei', 'Tudor Vladimirescu', 'Nicolae Bălcescu', 'Avram Iancu']
+COMPANIES = ['Alfa Construct', 'Beta Trans', 'Agro Sud', 'Delta Invest', 'Nord Impex', 'Carpaţi Prod',
+             'Dunărea Logistic', 'Medicom Serv']
+MONTHS = ['ianuarie', 'februarie', 'martie', 'aprilie', 'mai', 'iunie', 'iulie', 'august', 'septembrie',
+          'octombrie', 'noiembrie', 'decembrie']
+
+# Sentences without entities, the bulk of the reasons of a decision
+PLAIN_SENTENCES = [
+    'Analizând actele şi lucrările dosarului, instanţa reţine următoarele.',
+    'Cererea a fost legal timbrată, conform dispoziţiilor legale în vigoare.',
+    'În drept, au fost invocate dispoziţiile art. 1350 şi următoarele din Codul civil.',
+    'Instanţa a încuviinţat pentru ambele părţi proba cu înscrisuri, apreciind-o ca fiind utilă soluţionării cauzei.',
+    'Pârâtul nu a formulat întâmpinare şi nu s-a prezentat în instanţă, deşi a fost legal citat.',
+    'Potrivit art. 453 alin. 1 din Codul de procedură civilă, partea care pierde procesul va fi obligată la plata cheltuielilor de judecată.',
+    'Din probele administrate rezultă că obligaţia de plată nu a fost executată la scadenţă.',
+    'Instanţa constată că sunt îndeplinite condiţiile răspunderii civile contractuale.',
+    'Apărările formulate nu pot fi primite, întrucât nu sunt susţinute de niciun mijloc de probă.',
+    'Pentru aceste considerente, instanţa urmează să admită în parte cererea de chemare în judecată.',
+    'Martorii audiaţi au declarat că nu cunosc împrejurările în care a fost încheiat contractul.',
+    'Raportul de expertiză tehnică judiciară a fost depus la dosar şi comunicat părţilor.',
+    'Excepţia prescripţiei dreptului material la acţiune urmează a fi respinsă ca neîntemeiată.',
+    'Cauza a rămas în pronunţare asupra fondului, după dezbaterile consemnate în încheierea de şedinţă.',
+]
+
+
+def cnp(rng: random.Random) -> str:
+    """A CNP with a valid control digit."""
+
+    digits = [rng.choice('1256'), *f'{rng.randint(50, 99):02d}{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}',
+              *f'{rng.randint(1, 46):02d}{rng.randint(1, 999):03d}']
+    total = sum(int(d) * int(k) for d, k in zip(digits, '279146358279'))
+    control = total % 11
+    return ''.join(digits) + str(1 if control == 10 else control)
+
+
+class DecisionGenerator(object):
+    """Generates the paragraphs of synthetic decisions, counting the entities it writes."""
+
+    def __init__(self, seed: int = 1, density: float = 0.3):
+        self.rng = random.Random(seed)
+        self.density = density
+        self.entities = 0
+
+    def person(self) -> str:
+        self.entities += 1
+        return f'{self.rng.choice(LAST_NAMES)} {self.rng.choice(FIRST_NAMES)}'
+
+    def address(self) -> str:
+        self.entities += 1
+        rng = self.rng
+        return (f'str. {rng.choice(STREETS)} nr. {rng.randint(1, 150)}, bl. {rng.choice("ABCDM")}{rng.randint(1, 20)}, '
+                f'ap. {rng.randint(1, 90)}, mun. {rng.choice(CITIES)}, jud. {rng.choice(COUNTIES)}')
+
+    def cnp(self) -> str:
+        self.entities += 1
+        return cnp(self.rng)
+
+    def company(self) -> str:
+        self.entities += 1
+        return f'SC {self.rng.choice(COMPANIES)} SRL'
+
+    def case_number(self) -> str:
+        self.entities += 1
+        return f'{self.rng.randint(100, 99999)}/{self.rng.randint(1, 330)}/{self.rng.randint(2010, 2023)}'
+
+    def date(self) -> str:
+        self.entities += 1
+        return f'{self.rng.randint(1, 28)} {self.rng.choice(MONTHS)} {self.rng.randint(2010, 2023)}'
+
+    def ecli(self) -> str:
+        self.entities += 1
+        return f'ECLI:RO:TB{self.rng.choice(["DJ", "CJ", "IS", "B"])}:{self.rng.randint(2010, 2023)}:{self.rng.randint(1, 9999):03d}.000{self.rng.randint(100, 999)}'
+
+    def entity_sentence(self) -> str:
+        kind = self.rng.randrange(6)
+
+        if kind == 0:
+            return (f'Prin cererea înregistrată pe rolul acestei instanţe la data de {self.date()}, reclamantul '
+                    f'{self.person()}, CNP {self.cnp()}, cu domiciliul în {self.address()}, a chemat în judecată '
+                    f'pe pârâta {self.company()}.')
+        elif kind == 1:
+            return (f'La termenul din {self.date()} s-a prezentat martorul {self.person()}, domiciliat în '
+                    f'{self.address()}, care a declarat că îl cunoaşte pe pârât.')
+        elif kind == 2:
+            return (f'Prin sentinţa civilă pronunţată în dosarul nr. {self.case_number()}, {self.ecli()}, '
+                    f'instanţa a admis cererea formulată de {self.person()}.')
+        elif kind == 3:
+            return (f'Contractul a fost încheiat la {self.date()} între {self.company()} şi {self.person()}, '
+                    f'CNP {self.cnp()}.')
+        elif kind == 4:
+            return f'Pârâtul {self.person()} a fost reprezentat de avocat {self.person()}, din Baroul {self.rng.choice(COUNTIES)}.'
+        else:
+            return f'Cauza a fost conexată la dosarul nr. {self.case_number()} al Tribunalului {self.rng.choice(COUNTIES)}.'
+        # end if
+
+    def sentence(self) -> str:
+        if self.rng.random() < self.density:
+            return self.entity_sentence()
+        # end if
+
+        return self.rng.choice(PLAIN_SENTENCES)
+
+    def decision(self, pages: int) -> list[str]:
+        """Returns the paragraphs of a decision of about `pages` pages."""
+
+        rng = self.rng
+        paragraphs = [
+            'R O M Â N I A',
+            f'TRIBUNALUL {rng.choice(COUNTIES).upper()}',
+            'SECŢIA I CIVILĂ',
+            f'Dosar nr. {self.case_number()}',
+            f'SENTINŢA CIVILĂ NR. {rng.randint(1, 3000)}',
+            f'Şedinţa publică din data de {self.date()}',
+            f'PREŞEDINTE: {self.person()}',
+            f'GREFIER: {self.person()}',
+        ]
+        words = sum(len(p.split()) for p in paragraphs)
+        target = pages * WORDS_PER_PAGE - 60
+
+        while words < target:
+            paragraph = ' '.join(self.sentence() for _ in range(rng.randint(3, 8)))
+            paragraphs.append(paragraph)
+            words += len(paragraph.split())
+        # end while
+
+        paragraphs += [
+            'PENTRU ACESTE MOTIVE,',
+            'ÎN NUMELE LEGII',
+            'HOTĂRĂŞTE:',
+            f'Admite în parte cererea formulată de reclamantul {self.person()}, CNP {self.cnp()}, '
+            f'cu domiciliul în {self.address()}, în contradictoriu cu pârâta {self.company()}.',
+            'Cu drept de apel în termen de 30 de zile de la comunicare.',
+            f'Pronunţată în şedinţă publică, azi, {self.date()}.',
+            'PREŞEDINTE,                GREFIER,',
+        ]
+
+        return paragraphs
+
+
+def write_txt(paragraphs: list[str], path: str):
+    with open(path, mode='w', encoding='utf-8') as f:
+        for paragraph in paragraphs:
+            f.write(paragraph + '\n')
+        # end for
+    # end with
+
+
+def write_html(paragraphs: list[str], path: str):
+    # One paragraph per line, as TextExtractor reads html line by line
+    with open(path, mode='w', encoding='utf-8') as f:
+        f.write('<html>\n<head><title>Hotărâre</title></head>\n<body>\n')
+
+        for paragraph in paragraphs:
+            f.write(f'<p>{escape(paragraph)}</p>\n')
+        # end for
+
+        f.write('</body>\n</html>\n')
+    # end with
+
+
+_CONTENT_TYPES = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                  '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                  '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                  '<Default Extension="xml" ContentType="application/xml"/>'
+                  '<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+                  '</Types>')
+_RELS = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+         '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+         '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>'
+         '</Relationships>')
+
+
+def write_docx(paragraphs: list[str], path: str):
+    """The smallest docx Word opens: one run per paragraph, split in two when
+    the paragraph is long, as editors split runs on formatting changes."""
+
+    body = []
+
+    for paragraph in paragraphs:
+        middle = paragraph.find(' ', len(paragraph) // 2) if len(paragraph) > 200 else -1
+        runs = [paragraph] if middle < 0 else [paragraph[:middle], paragraph[middle:]]
+        body.append('<w:p>' + ''.join(f'<w:r><w:t xml:space="preserve">{escape(run)}</w:t></w:r>' for run in runs)
+                    + '</w:p>\n')
+    # end for
+
+    document = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>\n'
+                + ''.join(body) + '</w:body></w:document>\n')
+
+    with zipfile.ZipFile(path, mode='w', compression=zipfile.ZIP_DEFLATED) as z:
+        z.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        z.writestr('_rels/.rels', _RELS)
+        z.writestr('word/document.xml', document)
+    # end with
+
+
+WRITERS = {'docx': write_docx, 'txt': write_txt, 'html': write_html}
+
+
+def generate(output_dir: str, pages: list[int], types: list[str] = TYPES, count: int = 1,
+             density: float = 0.3, seed: int = 1) -> list[dict]:
+    """Writes `count` decisions of each number of `pages` in each of the `types` to `output_dir`.
+    The same decision is written in all types. Returns, for each file, its path, type, pages,
+    words and entities."""
+
+    os.makedirs(output_dir, exist_ok=True)
+    documents = []
+
+    for page_count in pages:
+        for i in range(count):
+            generator = DecisionGenerator(seed=seed * 1000003 + page_count * 101 + i, density=density)
+            paragraphs = generator.decision(page_count)
+            words = sum(len(p.split()) for p in paragraphs)
+
+            for doc_type in types:
+                path = os.path.join(output_dir, f'decision-{page_count}p-{i}.{doc_type}')
+                WRITERS[doc_type](paragraphs, path)
+                documents.append({'path': path, 'type': doc_type, 'pages': page_count, 'words': words,
+                                  'entities': generator.entities, 'bytes': os.path.getsize(path)})
+            # end for
+        # end for
+    # end for
+
+    return documents
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Writes synthetic Romanian court decisions.')
+    parser.add_argument('OUTPUT_DIR', type=str, help='folder to write the decisions to')
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 10, 100], help='sizes of the decisions, in pages')
+    parser.add_argument('--types', type=str, nargs='+', default=list(TYPES), choices=TYPES, help='document types')
+    parser.add_argument('--count', type=int, default=1, help='decisions of each size')
+    parser.add_argument('--density', type=float, default=0.3, help='share of the sentences with entities, 0 to 1')
+    parser.add_argument('--seed', type=int, default=1, help='same seed, same decisions')
+    args = parser.parse_args()
+
+    for document in generate(args.OUTPUT_DIR, args.pages, args.types, args.count, args.density, args.seed):
+        print(json.dumps(document, ensure_ascii=False))
+    # end for